@@ -0,0 +1,428 @@
+import json
+import math
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Energy.Active.Import.Register units: Schneider/EVlink report Wh, other brands kWh
+WH_CHARGER_MARKERS = ("SCHNEIDER", "EVLINK")
+# Brands whose register is known; energy of other chargers is not counted (as before)
+ENERGY_CHARGER_MARKERS = WH_CHARGER_MARKERS + ("LIVOLTEK",)
+
+BREAKDOWNS = ("day", "hour", "charger", "user")
+HEAD_BYTES = 256  # first bytes of the log compared on refresh: a rewrite in place means a full reload
+ROLLUP_SECONDS = (60, 900, 3600)  # 1 min, 15 min, 1 h
+# Seconds of history kept per rollup (None: everything); longer ranges use a coarser rollup.
+# 64 bytes per bucket: 7 days of minutes ~650 KB and 90 days of quarters ~550 KB per charger
+ROLLUP_RETENTION = {60: 7 * 86400, 900: 90 * 86400, 3600: None}
+ROLLUP_OVERSAMPLE = 4  # rollup buckets read per requested point, at most
+
+_STRING = rb'"([^"\\]*(?:\\.[^"\\]*)*)"'  # JSON string body, escapes kept
+_SEP = rb'\s*:\s*'  # json.dumps writes ": ", compact encoders ":"
+_TIMESTAMP = re.compile(rb'"timestamp"' + _SEP + rb'"([^"]*)"')
+_CHARGER = re.compile(rb'"chargerName"' + _SEP + _STRING)
+_USER = re.compile(rb'"userName"' + _SEP + _STRING)
+_ID_TAG = re.compile(rb'"idTag"' + _SEP + _STRING)
+_ENERGY = re.compile(rb'"deliveredEnergy"' + _SEP + rb'(-?[0-9][0-9.eE+-]*|NaN)')
+_POWER = re.compile(rb'"totalPower"' + _SEP + rb'(-?[0-9][0-9.eE+-]*|NaN)')
+
+
+def energy_unit(charger_name):
+    """kWh per unit of deliveredEnergy for a charger."""
+    return 0.001 if any(marker in charger_name for marker in WH_CHARGER_MARKERS) else 1.0
+
+
+def counts_energy(charger_name):
+    """Whether a charger's register unit is known, so its energy is counted."""
+    return any(marker in charger_name for marker in ENERGY_CHARGER_MARKERS)
+
+
+def _decode(value):
+    if isinstance(value, bytes):
+        return json.loads(b'"' + value + b'"') if b"\\" in value else value.decode("utf-8")
+    return value
+
+
+def to_epoch_seconds(values):
+    """ISO 8601 timestamps (bytes or str; naive ones are UTC) as int64 epoch seconds, -1 where unparsable."""
+    arr = np.asarray(values)
+    if not len(arr):
+        return np.empty(0, dtype=np.int64)
+    zulu = b"Z" if arr.dtype.kind == "S" else "Z"
+    if np.char.endswith(arr, zulu).all() and (np.char.str_len(arr) >= 20).all():
+        # What the OCPP server writes: parse the "YYYY-MM-DDTHH:MM:SS" prefix without pandas
+        try:
+            return arr.astype("U19").astype("datetime64[s]").astype(np.int64)
+        except ValueError:
+            pass
+    parsed = pd.to_datetime(pd.Series([_decode(v) for v in values], dtype=object),
+                            utc=True, format="ISO8601", errors="coerce")
+    seconds = parsed.dt.tz_localize(None).to_numpy().astype("datetime64[s]").astype(np.int64)
+    return np.where(parsed.isna().to_numpy(), -1, seconds)
+
+
+def _iso(seconds):
+    return f"{np.datetime64(int(seconds), 's')}Z"
+
+
+def lttb(x, y, threshold):
+    """Indices of `threshold` points of (x, y) picked by Largest-Triangle-Three-Buckets."""
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+    if threshold < 3:
+        return np.array([0, n - 1][:max(threshold, 0)])
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = [0]
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt = slice(edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n)
+        avg_x, avg_y = x[nxt].mean(), y[nxt].mean()
+        a = selected[-1]
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        selected.append(lo + int(np.argmax(area)))
+    selected.append(n - 1)
+    return np.array(selected)
+
+
+def _combine(keys, stats):
+    """Merge consecutive rows of bucket stats (count, power sum/min/max, energy sum/min/max) with equal keys."""
+    if not len(keys):
+        return keys, stats
+    first = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    combined = np.empty((len(first), stats.shape[1]))
+    combined[:, [0, 1, 4]] = np.add.reduceat(stats[:, [0, 1, 4]], first, axis=0)
+    combined[:, [2, 5]] = np.minimum.reduceat(stats[:, [2, 5]], first, axis=0)
+    combined[:, [3, 6]] = np.maximum.reduceat(stats[:, [3, 6]], first, axis=0)
+    return keys[first], combined
+
+
+class RollupSeries:
+    """
+    Bucket starts (sorted) and stats of one charger in one rollup, in arrays with spare
+    capacity so that appending a bucket is amortized O(1) instead of copying the series.
+    """
+
+    def __init__(self, retention=None, capacity=256):
+        self.retention = retention  # seconds of history kept behind the newest bucket (None: all)
+        self.starts = np.empty(capacity, dtype=np.int64)
+        self.stats = np.empty((capacity, 7))
+        self.size = 0
+        self.complete_from = None  # older buckets were dropped by the retention (None: none were)
+
+    def __len__(self):
+        return self.size
+
+    def view(self):
+        return self.starts[:self.size], self.stats[:self.size]
+
+    def extend(self, starts, stats):
+        """Fold in buckets (sorted, distinct starts), merging with existing buckets of the same start."""
+        n = self.size
+        if n and starts[0] < self.starts[n - 1]:
+            # Out of time order (rare): rebuild the whole series
+            starts, stats = np.r_[self.starts[:n], starts], np.vstack([self.stats[:n], stats])
+            order = np.argsort(starts, kind="stable")
+            starts, stats = _combine(starts[order], stats[order])
+            self.size = 0
+        elif n and starts[0] == self.starts[n - 1]:
+            # Only the last bucket can overlap
+            _, merged = _combine(np.r_[self.starts[n - 1:n], starts[:1]], np.vstack([self.stats[n - 1:n], stats[:1]]))
+            self.stats[n - 1] = merged[0]
+            starts, stats = starts[1:], stats[1:]
+        self._put(starts, stats)
+        if self.retention is not None and self.size:
+            self._expire(self.starts[self.size - 1] - self.retention)
+
+    def _put(self, starts, stats):
+        need = self.size + len(starts)
+        if need > len(self.starts):
+            capacity = max(need, 2 * len(self.starts))
+            grown_starts, grown_stats = np.empty(capacity, dtype=np.int64), np.empty((capacity, 7))
+            grown_starts[:self.size], grown_stats[:self.size] = self.starts[:self.size], self.stats[:self.size]
+            self.starts, self.stats = grown_starts, grown_stats
+        self.starts[self.size:need] = starts
+        self.stats[self.size:need] = stats
+        self.size = need
+
+    def _expire(self, cutoff):
+        """Drop buckets older than cutoff; shifts the arrays only once a quarter of them expired."""
+        expired = int(np.searchsorted(self.starts[:self.size], cutoff))
+        if expired and expired >= self.size // 4:
+            keep = self.size - expired
+            self.starts[:keep] = self.starts[expired:self.size]
+            self.stats[:keep] = self.stats[expired:self.size]
+            self.size = keep
+            self.complete_from = int(self.starts[0])
+
+
+class Rollups:
+    """
+    Per charger count/sum/min/max of totalPower and of the energy register (kWh) in
+    1 min, 15 min and 1 h buckets (RollupSeries), the finer ones limited to
+    ROLLUP_RETENTION. New readings are folded in as they are read, so a chart query
+    touches at most ROLLUP_OVERSAMPLE buckets per point whatever its range.
+    """
+
+    def __init__(self):
+        self._series = {seconds: {} for seconds in ROLLUP_SECONDS}  # seconds -> charger code -> RollupSeries
+
+    def add(self, ts, charger, power, energy):
+        if not len(ts):
+            return
+        order = np.lexsort((ts, charger))
+        ts, charger = ts[order], charger[order].astype(np.int64)
+        power, energy = power[order], energy[order]
+        readings = np.column_stack([np.ones(len(ts)), power, power, power, energy, energy, energy])
+        bounds = np.flatnonzero(np.r_[True, charger[1:] != charger[:-1], True])
+        for seconds, series in self._series.items():
+            # Sorted by charger and time, so each charger's bucket starts are already in order
+            for lo, hi in zip(bounds[:-1], bounds[1:]):
+                code = int(charger[lo])
+                if code not in series:
+                    series[code] = RollupSeries(ROLLUP_RETENTION[seconds])
+                series[code].extend(*_combine(ts[lo:hi] // seconds * seconds, readings[lo:hi]))
+
+    def query(self, code, start, end, points):
+        """
+        (bucket seconds, bucket starts, stats) for start <= t < end from the finest rollup
+        needing at most points * ROLLUP_OVERSAMPLE buckets and still holding `start`, in time order.
+        """
+        span = max(end - start, 1)
+        for seconds in ROLLUP_SECONDS:
+            series = self._series[seconds].get(code)
+            if series is None:
+                return seconds, np.empty(0, dtype=np.int64), np.empty((0, 7))
+            if span / seconds <= points * ROLLUP_OVERSAMPLE and (
+                    series.complete_from is None or start >= series.complete_from):
+                break
+        starts, stats = series.view()
+        lo, hi = np.searchsorted(starts, [start // seconds * seconds, end])
+        return seconds, starts[lo:hi], stats[lo:hi]
+
+
+class MeterAnalytics:
+    """
+    The meter log as typed columns (epoch seconds, charger code, user code, raw
+    deliveredEnergy) for vectorized energy breakdowns.
+
+    Readings are parsed once and new lines are appended on refresh(), so repeated
+    queries only pay for numpy/pandas work. Energy per reading is the increase of the
+    charger's register since its previous reading, converted to kWh, and is counted
+    for the day/hour of the reading. A register that goes down was reset (new session
+    or meter restart) and counts from zero. Chargers of other brands than
+    ENERGY_CHARGER_MARKERS deliver 0 kWh, their register unit being unknown.
+    Users are keyed by id tag (userName for readings logged before it was recorded).
+    """
+
+    def __init__(self, meter_log, chunk_size=8 * 1024 * 1024):
+        self.meter_log = meter_log
+        self.chunk_size = chunk_size
+        self._lock = threading.RLock()
+        self._clear()
+
+    def _clear(self):
+        self._identity = None
+        self._head = b""  # first bytes of the log: tells an in-place rewrite from an append
+        self._offset = 0
+        self.chargers = []  # code -> charger name (upper case, as the dashboard shows them)
+        self.users = []  # code -> idTag (userName in older readings)
+        self._charger_codes = {}
+        self._user_codes = {}
+        self._columns = {
+            "ts": np.empty(0, dtype=np.int64),
+            "charger": np.empty(0, dtype=np.int32),
+            "user": np.empty(0, dtype=np.int32),
+            "energy": np.empty(0, dtype=np.float64),
+        }
+        self._frame = None
+        self.rollups = Rollups()
+
+    def __len__(self):
+        return len(self._columns["ts"])
+
+    def _codes(self, values, table, names, transform):
+        """Codes of values in a name table, adding names seen for the first time."""
+        local, uniques = pd.factorize(np.asarray(values, dtype=object))
+        mapping = np.empty(len(uniques), dtype=np.int32)
+        for i, value in enumerate(uniques):
+            name = transform(_decode(value))
+            if name not in table:
+                table[name] = len(names)
+                names.append(name)
+            mapping[i] = table[name]
+        return mapping[local] if len(local) else np.empty(0, dtype=np.int32)
+
+    def _extract(self, data):
+        """(timestamps, chargers, users, energies, powers) of a chunk of complete lines."""
+        lines = data.count(b"\n")
+        fields = [pattern.findall(data) for pattern in (_TIMESTAMP, _CHARGER, _ID_TAG, _ENERGY, _POWER)]
+        if not fields[2]:
+            fields[2] = _USER.findall(data)  # logged before readings carried the id tag
+        if all(len(values) == lines for values in fields):
+            try:
+                return (fields[0], fields[1], fields[2],
+                        np.array(fields[3]).astype(np.float64), np.array(fields[4]).astype(np.float64))
+            except ValueError:
+                pass
+        # Blank, partial or differently formatted lines: parse them one by one
+        timestamps, chargers, users, energies, powers = [], [], [], [], []
+        for line in data.splitlines():
+            if not line.strip():
+                continue
+            try:
+                rec = json.loads(line)
+                energy = float(rec.get("deliveredEnergy", 0) or 0)
+                power = float(rec.get("totalPower", 0) or 0)
+            except (ValueError, TypeError):
+                continue
+            if not rec.get("timestamp"):
+                continue
+            timestamps.append(str(rec["timestamp"]))
+            chargers.append(str(rec.get("chargerName", "UNKNOWN")))
+            users.append(str(rec.get("idTag") or rec.get("userName") or ""))
+            energies.append(energy)
+            powers.append(power)
+        return timestamps, chargers, users, np.array(energies, dtype=np.float64), np.array(powers, dtype=np.float64)
+
+    def refresh(self):
+        """Read readings appended since the last call (everything if the log was replaced). Returns how many."""
+        with self._lock:
+            identity = self.meter_log.identity()
+            try:
+                size = self.meter_log.path.stat().st_size
+                with open(self.meter_log.path, "rb") as f:
+                    head = f.read(HEAD_BYTES)
+            except FileNotFoundError:
+                size, head = 0, b""
+            if identity != self._identity or size < self._offset or head[:len(self._head)] != self._head:
+                self._clear()
+                self._identity = identity
+            if size == self._offset:
+                return 0
+            self._head = head
+
+            parts = {name: [column] for name, column in self._columns.items()}
+            for offset, data in self.meter_log.chunks(self._offset, self.chunk_size):
+                timestamps, chargers, users, energies, powers = self._extract(data)
+                ts = to_epoch_seconds(timestamps)
+                valid = ts >= 0
+                codes = self._codes(chargers, self._charger_codes, self.chargers, lambda name: name.upper())[valid]
+                parts["ts"].append(ts[valid])
+                parts["charger"].append(codes)
+                parts["user"].append(self._codes(users, self._user_codes, self.users, str)[valid])
+                parts["energy"].append(energies[valid])
+                units = np.array([energy_unit(name) for name in self.chargers], dtype=np.float64)
+                self.rollups.add(ts[valid], codes, np.nan_to_num(powers[valid]),
+                                 np.nan_to_num(energies[valid] * units[codes]))
+                self._offset = offset
+            added = sum(len(column) for column in parts["ts"][1:])
+            if added:
+                self._columns = {name: np.concatenate(columns) for name, columns in parts.items()}
+                self._frame = None
+            return added
+
+    def frame(self):
+        """Readings sorted by charger and time with their energy increment ("kwh") and reset flag."""
+        with self._lock:
+            self.refresh()
+            frame = self._frame
+            if frame is not None:
+                return frame
+            columns = self._columns
+            units = np.array([energy_unit(name) for name in self.chargers], dtype=np.float64)
+            ts, charger = columns["ts"], columns["charger"]
+            # One stable sort on a combined (charger, time) key
+            key = (charger.astype(np.int64) << 40) | (ts - ts.min() if len(ts) else ts)
+            order = np.argsort(key, kind="stable")
+            ts, charger, user = ts[order], charger[order], columns["user"][order]
+            register = np.nan_to_num(columns["energy"][order] * units[charger])
+
+            step = np.diff(register, prepend=register[:1])
+            first = np.ones(len(ts), dtype=bool)
+            first[1:] = charger[1:] != charger[:-1]  # no previous reading of the same charger
+            counted = np.array([counts_energy(name) for name in self.chargers], dtype=bool)[charger]
+            reset = (step < 0) & ~first & counted
+            kwh = np.where(first | ~counted, 0.0, np.where(reset, np.clip(register, 0, None), step))
+
+            frame = pd.DataFrame({"ts": ts, "charger": charger, "user": user, "kwh": kwh, "reset": reset})
+            self._frame = frame
+            return frame
+
+    def breakdown(self, by, start=None, end=None, charger=None, user=None):
+        """
+        Energy per day, hour (UTC), charger or user for readings with start <= ts < end
+        (epoch seconds), optionally limited to one charger or user (id tag).
+        Returns [{"key", "energy_kwh", "readings", "resets"}] sorted by key.
+        """
+        if by not in BREAKDOWNS:
+            raise ValueError(f"by must be one of {', '.join(BREAKDOWNS)}")
+        frame = self.frame()
+        mask = np.ones(len(frame), dtype=bool)
+        ts = frame["ts"].to_numpy()
+        if start is not None:
+            mask &= ts >= start
+        if end is not None:
+            mask &= ts < end
+        if charger is not None:
+            mask &= frame["charger"].to_numpy() == self._charger_codes.get(charger.upper(), -1)
+        if user is not None:
+            mask &= frame["user"].to_numpy() == self._user_codes.get(user, -1)
+        selected = frame[mask]
+
+        if by == "day":
+            keys = selected["ts"] // 86400
+        elif by == "hour":
+            keys = selected["ts"] // 3600
+        else:
+            keys = selected[by]
+        grouped = selected.groupby(keys.to_numpy(), sort=True).agg(
+            energy_kwh=("kwh", "sum"), readings=("kwh", "size"), resets=("reset", "sum"))
+
+        if by == "day":
+            labels = (grouped.index.to_numpy() * 86400).astype("datetime64[s]").astype("datetime64[D]").astype(str)
+        elif by == "hour":
+            labels = [f"{label}:00Z" for label in
+                      (grouped.index.to_numpy() * 3600).astype("datetime64[s]").astype("datetime64[h]").astype(str)]
+        else:
+            names = self.chargers if by == "charger" else self.users
+            labels = [names[code] for code in grouped.index]
+        return [
+            {"key": str(label), "energy_kwh": round(float(energy), 3), "readings": int(readings), "resets": int(resets)}
+            for label, energy, readings, resets in zip(labels, grouped["energy_kwh"], grouped["readings"], grouped["resets"])
+        ]
+
+    def timeseries(self, charger, start, end, points, mode="minmax"):
+        """
+        totalPower and energy register (kWh) of one charger for start <= t < end (epoch
+        seconds), from the rollups. mode="minmax" merges buckets into at most `points`
+        intervals with min/max/avg; mode="lttb" picks `points` bucket averages by LTTB.
+        Returns (bucket seconds, rows); None for a charger without readings.
+        """
+        with self._lock:
+            self.refresh()
+            code = self._charger_codes.get(charger.upper())
+            if code is None:
+                return None
+            seconds, times, stats = self.rollups.query(code, start, end, points)
+
+        if mode == "lttb":
+            power, energy = stats[:, 1] / stats[:, 0], stats[:, 4] / stats[:, 0]
+            return seconds, [{"t": _iso(times[i]), "power": round(float(power[i]), 3),
+                              "energy": round(float(energy[i]), 3)}
+                             for i in lttb(times.astype(np.float64), power, points)]
+
+        width = max(seconds, math.ceil(max(end - start, 1) / points / seconds) * seconds)
+        times, stats = _combine(start + np.maximum(times - start, 0) // width * width, stats)
+        return width, [{
+            "t": _iso(t),
+            "readings": int(count),
+            "power": {"min": round(pmin, 3), "max": round(pmax, 3), "avg": round(psum / count, 3)},
+            "energy": {"min": round(emin, 3), "max": round(emax, 3), "avg": round(esum / count, 3)},
+        } for t, (count, psum, pmin, pmax, esum, emin, emax) in zip(times.tolist(), stats.tolist())]
+
+    def totals(self, by, start=None, end=None):
+        """{key: kWh} shorthand of breakdown()."""
+        return {row["key"]: row["energy_kwh"] for row in self.breakdown(by, start=start, end=end)}
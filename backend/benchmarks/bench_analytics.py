@@ -0,0 +1,128 @@
+"""
+Compare the vectorized meter analytics with the per-record Python loop the dashboard
+used for /api/usage/history.
+
+Writes a synthetic meter_data_log.ndjson (one reading per line, several chargers with
+meter resets) to a scratch directory, then times the first load into typed arrays,
+an incremental refresh, day/hour/charger/user breakdowns and chart time series
+served from the rollups. The baseline replays the
+old loop (datetime.fromisoformat per record, grouped by day and charger).
+
+    python benchmarks/bench_analytics.py --records 10000000
+"""
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(BACKEND_DIR), str(BACKEND_DIR / "ocpp")]
+
+from analytics import MeterAnalytics  # noqa: E402
+from meter_log import MeterLog  # noqa: E402
+
+CHARGERS = ["SCHNEIDER_01", "SCHNEIDER_02", "EVLINK_03", "LIVOLTEK_01", "LIVOLTEK_02", "LIVOLTEK_03"]
+USERS = [f"Fleet Driver {i}" for i in range(500)]
+
+
+def write_meter_log(path, records, days=90):
+    start = datetime.now(timezone.utc) - timedelta(days=days)
+    step = timedelta(days=days) / max(records, 1)
+    energy = {name: 0.0 for name in CHARGERS}
+    with open(path, "w", encoding="utf-8") as f:
+        lines = []
+        for i in range(records):
+            charger = CHARGERS[i % len(CHARGERS)]
+            if random.random() < 0.0005:
+                energy[charger] = 0.0  # meter reset / new session
+            energy[charger] += random.uniform(0, 50) if "LIVOLTEK" not in charger else random.uniform(0, 0.05)
+            ts = (start + step * i).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+            lines.append(json.dumps({
+                "ID": f"{i:012x}",
+                "timestamp": ts,
+                "userName": USERS[(i // 40) % len(USERS)],
+                "totalPower": round(random.uniform(0, 11000), 1),
+                "chargerName": charger,
+                "deliveredEnergy": round(energy[charger], 3),
+            }))
+            if len(lines) == 100000:
+                f.write("\n".join(lines) + "\n")
+                lines = []
+        if lines:
+            f.write("\n".join(lines) + "\n")
+
+
+def baseline_history(meter_log):
+    """The per-record loop /api/usage/history ran before the analytics module."""
+    grouped = defaultdict(list)
+    for rec in meter_log:
+        ts = datetime.fromisoformat(rec["timestamp"].replace("Z", "+00:00"))
+        charger = str(rec.get("chargerName", "UNKNOWN")).upper()
+        grouped[(ts.date().isoformat(), charger)].append((ts, float(rec.get("deliveredEnergy", 0.0))))
+    daily = defaultdict(float)
+    for (day, charger), readings in grouped.items():
+        readings.sort(key=lambda x: x[0])
+        if "SCHNEIDER" in charger or "EVLINK" in charger:
+            daily[day] += max(0.0, (readings[-1][1] - readings[0][1]) / 1000.0)
+        else:
+            daily[day] += sum(max(0.0, b[1] - a[1]) for a, b in zip(readings, readings[1:]))
+    return daily
+
+
+def timed(label, fn, results):
+    started = time.perf_counter()
+    value = fn()
+    results.append((label, time.perf_counter() - started))
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=10_000_000)
+    parser.add_argument("--append", type=int, default=10_000, help="readings appended before the refresh timing")
+    parser.add_argument("--skip-baseline", action="store_true", help="don't run the slow per-record loop")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "meter_data_log.ndjson"
+        timed("write synthetic log", lambda: write_meter_log(path, args.records), results)
+        size_mb = path.stat().st_size / 1e6
+        meter_log = MeterLog(path)
+        analytics = MeterAnalytics(meter_log)
+
+        timed("load into typed arrays", analytics.refresh, results)
+        timed("sort + diff/clip (first query)", analytics.frame, results)
+        for by in ("day", "hour", "charger", "user"):
+            rows = timed(f"breakdown by {by}", lambda: analytics.breakdown(by), results)
+        last_week = int(time.time()) - 7 * 86400
+        timed("breakdown by day, last 7 days", lambda: analytics.breakdown("day", start=last_week), results)
+        now = int(time.time())
+        for label, span in (("1 day", 86400), ("90 days", 90 * 86400)):
+            timed(f"timeseries, {label}, 500 points", lambda: analytics.timeseries(CHARGERS[0], now - span, now, 500), results)
+        timed("timeseries, 90 days, 500 points, lttb",
+              lambda: analytics.timeseries(CHARGERS[0], now - 90 * 86400, now, 500, mode="lttb"), results)
+
+        with open(path, "a", encoding="utf-8") as f:
+            for i in range(args.append):
+                f.write(json.dumps({"timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                                    "userName": USERS[0], "chargerName": CHARGERS[0],
+                                    "deliveredEnergy": float(i)}) + "\n")
+        timed(f"refresh after {args.append} appended readings", analytics.refresh, results)
+        timed("breakdown by day after refresh", lambda: analytics.breakdown("day"), results)
+
+        if not args.skip_baseline:
+            timed("baseline: per-record loop by day", lambda: baseline_history(meter_log), results)
+
+    print(f"{args.records} readings, {size_mb:.0f} MB log, {len(rows)} users")
+    for label, seconds in results:
+        print(f"{label:<44} {seconds:>9.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Measure /api/health latency of the dashboard API while heavy queries are running.
+
+Copies the backend to a scratch directory, fills meter_data_log.ndjson with synthetic
+readings, starts uvicorn on the copy and reports /api/health p50/p99 while idle and
+while clients keep requesting /api/usage/history. backend/data is never touched.
+
+    python benchmarks/bench_dashboard_latency.py --records 200000 --workers 1
+"""
+import argparse
+import asyncio
+import json
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def write_meter_log(path, records):
+    chargers = ["SCHNEIDER_01", "SCHNEIDER_02", "LIVOLTEK_01", "LIVOLTEK_02"]
+    start = datetime.now(timezone.utc) - timedelta(days=7)
+    step = timedelta(days=7) / max(records, 1)
+    energy = {name: 0.0 for name in chargers}
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(records):
+            charger = chargers[i % len(chargers)]
+            energy[charger] += random.uniform(0, 50 if "SCHNEIDER" in charger else 0.05)
+            f.write(json.dumps({
+                "ID": f"{i:012x}",
+                "timestamp": (start + step * i).isoformat().replace("+00:00", "Z"),
+                "userName": "Bench User",
+                "chargerName": charger,
+                "totalPower": random.uniform(0, 11000),
+                "deliveredEnergy": round(energy[charger], 3),
+                "frequency": 50.0,
+            }) + "\n")
+
+
+async def measure(base_url, duration, load_clients):
+    import aiohttp
+
+    latencies = []
+    history_times = []
+    stop = time.perf_counter() + duration
+
+    async with aiohttp.ClientSession() as session:
+        async def probe():
+            while time.perf_counter() < stop:
+                sent = time.perf_counter()
+                async with session.get(f"{base_url}/api/health") as response:
+                    await response.read()
+                latencies.append(time.perf_counter() - sent)
+                await asyncio.sleep(0.01)
+
+        async def load():
+            while time.perf_counter() < stop:
+                sent = time.perf_counter()
+                async with session.get(f"{base_url}/api/usage/history", params={"days": "7"}) as response:
+                    await response.read()
+                history_times.append(time.perf_counter() - sent)
+
+        await asyncio.gather(probe(), *(load() for _ in range(load_clients)))
+
+    return {
+        "health_requests": len(latencies),
+        "health_p50_ms": percentile(latencies, 50) * 1000,
+        "health_p99_ms": percentile(latencies, 99) * 1000,
+        "health_max_ms": max(latencies, default=0.0) * 1000,
+        "history_requests": len(history_times),
+        "history_mean_ms": sum(history_times) / len(history_times) * 1000 if history_times else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=200000)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--clients", type=int, default=2, help="concurrent /api/usage/history clients")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--port", type=int, default=8109)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = Path(tmp) / "backend"
+        shutil.copytree(BACKEND_DIR, backend, ignore=shutil.ignore_patterns("__pycache__", "*.lock", "*.tmp"))
+        write_meter_log(backend / "data" / "meter_data_log.ndjson", args.records)
+
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server:app", "--port", str(args.port),
+             "--workers", str(args.workers), "--log-level", "warning"],
+            cwd=backend, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            time.sleep(3)
+            base_url = f"http://127.0.0.1:{args.port}"
+            idle = asyncio.run(measure(base_url, min(args.duration, 3.0), 0))
+            loaded = asyncio.run(measure(base_url, args.duration, args.clients))
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"{args.records} meter records, {args.workers} uvicorn worker(s), {args.clients} history clients")
+    print(f"{'':<22} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9} {'requests':>9}")
+    for label, r in (("/api/health idle", idle), ("/api/health loaded", loaded)):
+        print(f"{label:<22} {r['health_p50_ms']:>9.2f} {r['health_p99_ms']:>9.2f} "
+              f"{r['health_max_ms']:>9.2f} {r['health_requests']:>9}")
+    print(f"/api/usage/history: {loaded['history_requests']} requests, mean {loaded['history_mean_ms']:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
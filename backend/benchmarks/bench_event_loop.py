@@ -0,0 +1,146 @@
+"""
+Benchmark the OCPP server on the default asyncio loop vs uvloop.
+
+Reports websocket connection-setup rate and MeterValues round-trip latency
+(p50/p99) for each loop. Every loop runs in its own subprocess against a
+throwaway copy of the data directory, so backend/data is never touched.
+Server logging is disabled to measure the loop and protocol stack only.
+
+    python benchmarks/bench_event_loop.py --connections 500 --messages 2000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR / "ocpp"))
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_benchmark(port, connections, messages, concurrency):
+    import websockets
+    from ocpp.v16 import ChargePoint as cp
+    from ocpp.v16 import call
+    import ocpp_server
+    from server_config import ServerConfig
+
+    central_system = ocpp_server.CentralSystem(ServerConfig(port=port))
+    server_task = asyncio.create_task(central_system.start())
+    await asyncio.sleep(0.5)
+    url = f"ws://127.0.0.1:{port}"
+
+    # --- Connection setup rate ---
+    semaphore = asyncio.Semaphore(concurrency)
+    opened = []
+
+    async def open_one(i):
+        async with semaphore:
+            ws = await websockets.connect(f"{url}/BENCH_CONN_{i}", subprotocols=["ocpp1.6"])
+            opened.append(ws)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(open_one(i) for i in range(connections)))
+    setup_seconds = time.perf_counter() - start
+    await asyncio.gather(*(ws.close() for ws in opened))
+
+    # --- MeterValues round trip ---
+    latencies = []
+    async with websockets.connect(f"{url}/BENCH_METER", subprotocols=["ocpp1.6"]) as ws:
+        client = cp("BENCH_METER", ws)
+        reader = asyncio.create_task(client.start())
+        for i in range(messages):
+            payload = call.MeterValuesPayload(
+                connector_id=1,
+                meter_value=[{
+                    "timestamp": "2025-01-01T00:00:00Z",
+                    "sampledValue": [
+                        {"value": str(i), "measurand": "Energy.Active.Import.Register", "unit": "kWh"},
+                        {"value": "7000", "measurand": "Power.Active.Import", "unit": "W"},
+                    ],
+                }],
+            )
+            sent = time.perf_counter()
+            await client.call(payload)
+            latencies.append(time.perf_counter() - sent)
+        reader.cancel()
+
+    server_task.cancel()
+    return {
+        "connections": connections,
+        "connect_rate_per_s": connections / setup_seconds if setup_seconds else 0.0,
+        "messages": messages,
+        "rtt_p50_ms": percentile(latencies, 50) * 1000,
+        "rtt_p99_ms": percentile(latencies, 99) * 1000,
+        "rtt_mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+    }
+
+
+def run_one(args):
+    """Child process: run the benchmark on one loop and print the result as JSON."""
+    logging.disable(logging.CRITICAL)
+    import ocpp_server
+
+    # Point every data file at a scratch copy of backend/data
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp)
+        shutil.copy(BACKEND_DIR / "data" / "users1.csv", data_dir / "users1.csv")
+        ocpp_server.DATA_DIR = data_dir
+
+        loop_used = args.run_one
+        if args.run_one == "uvloop":
+            try:
+                import uvloop  # noqa: F401
+            except ImportError:
+                loop_used = "asyncio (uvloop not installed)"
+
+        result = ocpp_server.run_event_loop(
+            run_benchmark(args.port, args.connections, args.messages, args.concurrency), args.run_one
+        )
+        result["loop"] = loop_used
+        print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--loops", nargs="+", default=["asyncio", "uvloop"])
+    parser.add_argument("--connections", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--port", type=int, default=9109)
+    parser.add_argument("--run-one", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        run_one(args)
+        return
+
+    print(f"{'loop':<32} {'conn/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'mean ms':>9}")
+    for loop_name in args.loops:
+        output = subprocess.run(
+            [sys.executable, __file__, "--run-one", loop_name,
+             "--connections", str(args.connections), "--concurrency", str(args.concurrency),
+             "--messages", str(args.messages), "--port", str(args.port)],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1]
+        r = json.loads(output)
+        print(f"{r['loop']:<32} {r['connect_rate_per_s']:>10.1f} {r['rtt_p50_ms']:>9.3f} "
+              f"{r['rtt_p99_ms']:>9.3f} {r['rtt_mean_ms']:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Serialization time and bytes on the wire of the dashboard's Users and Logs pages.
+
+Copies the backend to a scratch directory with synthetic users and meter readings,
+then compares the old encoding (a pydantic model per row, FastAPI's jsonable_encoder
+and json.dumps) with plain dicts encoded by fast_response.json_bytes (orjson when
+installed), and reports response sizes for identity, gzip and (if brotli-asgi is
+installed) brotli. backend/data is never touched.
+
+    python benchmarks/bench_json_encoding.py --users 20000 --logs 1000
+"""
+import argparse
+import json
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+def write_data(data_dir, users, logs):
+    with open(data_dir / "users1.csv", "w", newline="") as f:
+        f.write("id_tag,header name,surname,quota_kwh,unlimited\n")
+        for i in range(users):
+            f.write(f"CARD{i:06d},Fleet,Driver {i},{50 + i % 100},{'TRUE' if i % 10 == 0 else 'FALSE'}\n")
+    (data_dir / "users1.journal").unlink(missing_ok=True)
+    start = datetime.now(timezone.utc) - timedelta(days=1)
+    with open(data_dir / "meter_data_log.ndjson", "w", encoding="utf-8") as f:
+        for i in range(logs):
+            f.write(json.dumps({
+                "ID": f"{i:012x}", "groupId": "EVSE", "groupName": "Electric Vehicle Supply Equipment",
+                "deviceType": "EVSE", "timestamp": (start + timedelta(seconds=30 * i)).isoformat().replace("+00:00", "Z"),
+                "userName": f"Fleet Driver {i % 50}", "totalPower": round(random.uniform(0, 11000), 1),
+                "phase1Power": 0.0, "phase2Power": 0.0, "phase3Power": 0.0, "phase1Voltage": 230.1,
+                "phase2Voltage": 229.8, "phase3Voltage": 230.4, "frequency": 50.0,
+                "chargerName": "LIVOLTEK_01", "deliveredEnergy": round(i * 0.01, 3), "suppliedEnergy": 0.0,
+            }) + "\n")
+
+
+def best_of(fn, repeat=5):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--logs", type=int, default=1000, help="readings on the Logs page (limit)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = Path(tmp) / "backend"
+        shutil.copytree(BACKEND_DIR, backend, ignore=shutil.ignore_patterns("__pycache__", "*.lock", "*.tmp"))
+        write_data(backend / "data", args.users, args.logs)
+        sys.path.insert(0, str(backend))
+
+        import server
+        from fastapi.encoders import jsonable_encoder
+        from fastapi.testclient import TestClient
+        from fast_response import BrotliMiddleware, json_bytes, orjson
+
+        users = server.load_users_csv()
+        usage = server.load_current_usage()
+        logs = [record for _, record in zip(range(args.logs), server.meter_log.reverse())]
+
+        def users_before():
+            models = [server.UserQuota(**server.user_quota_row(user, usage)) for user in users]
+            return json.dumps(jsonable_encoder(models)).encode()
+
+        def users_after():
+            return json_bytes([server.user_quota_row(user, usage) for user in users])
+
+        def logs_before():
+            return ("[" + ",".join(json.dumps(log, ensure_ascii=False) for log in logs) + "]").encode()
+
+        def logs_after():
+            return b"[" + b",".join(json_bytes(log) for log in logs) + b"]"
+
+        timings = [
+            ("Users page", best_of(users_before), best_of(users_after)),
+            ("Logs page", best_of(logs_before), best_of(logs_after)),
+        ]
+
+        client = TestClient(server.app)
+        token = client.post("/api/auth/login", json={"username": "admin", "password": "admin123"}).json()["access_token"]
+        encodings = ["identity", "gzip"] + (["br"] if BrotliMiddleware is not None else [])
+        sizes = []
+        for label, path in (("Users page", "/api/users"), ("Logs page", f"/api/logs?limit={args.logs}")):
+            row = []
+            for encoding in encodings:
+                headers = {"Authorization": f"Bearer {token}", "Accept-Encoding": encoding}
+                with client.stream("GET", path, headers=headers) as response:
+                    row.append(sum(len(chunk) for chunk in response.iter_raw()))  # bytes as sent, still encoded
+            sizes.append((label, row))
+
+    print(f"{args.users} users, {args.logs} log records, encoder: {'orjson' if orjson else 'json (orjson not installed)'}")
+    print(f"{'serialization':<14} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for label, before, after in timings:
+        print(f"{label:<14} {before * 1000:>10.1f} {after * 1000:>10.1f} {before / after:>7.1f}x")
+    print(f"{'bytes on wire':<14} " + " ".join(f"{encoding:>10}" for encoding in encodings))
+    for label, row in sizes:
+        print(f"{label:<14} " + " ".join(f"{size:>10}" for size in row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import json
+from datetime import date, datetime
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from starlette.middleware.gzip import GZipMiddleware
+
+try:
+    import orjson
+except ImportError:  # optional: the standard library encoder is used without it
+    orjson = None
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:  # optional: gzip only
+    BrotliMiddleware = None
+
+
+def _default(value):
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def json_bytes(content):
+    """Compact UTF-8 JSON, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by json_bytes(). Read endpoints return it directly with plain
+    dicts, which also skips FastAPI's response model validation and jsonable_encoder pass."""
+
+    def render(self, content):
+        return json_bytes(content)
+
+
+class CompressionMiddleware:
+    """
+    Compress response bodies of at least `minimum_size` bytes: brotli when brotli-asgi
+    is installed and the client accepts it, gzip otherwise. Paths in `exclude` (the
+    SSE stream, whose events must not wait in the compressor) are sent as they are.
+    """
+
+    def __init__(self, app, minimum_size=1024, exclude=()):
+        self.app = app
+        self.exclude = set(exclude)
+        if BrotliMiddleware is not None:
+            self.compressed = BrotliMiddleware(app, minimum_size=minimum_size, gzip_fallback=True)
+        else:
+            self.compressed = GZipMiddleware(app, minimum_size=minimum_size, compresslevel=6)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] not in self.exclude:
+            await self.compressed(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
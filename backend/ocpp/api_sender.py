@@ -13,10 +13,11 @@ DEFAULT_API_ENDPOINT = 'http://144.122.166.37:3005/api/readings/'
 DEFAULT_API_KEY = 'None'
 
 class ApiSender:
-    def __init__(self, api_url: str = DEFAULT_API_ENDPOINT, api_key: str = DEFAULT_API_KEY):
+    def __init__(self, api_url: str = DEFAULT_API_ENDPOINT, api_key: str = DEFAULT_API_KEY,
+                 metrics: PerformanceMetrics = None):
         self.api_url = api_url
         self.api_key = api_key
-        self.metrics = PerformanceMetrics()
+        self.metrics = metrics or PerformanceMetrics()
         self.headers = {
             'Content-Type': 'application/json',
             'X-API-Key': api_key
@@ -61,7 +62,6 @@ class ApiSender:
                         # Add metrics before returning success
                         api_time = time.time() - start_time
                         self.metrics.update_api_timing(api_time, success=True)
-                        self.metrics.log_metrics()
                         return True
                     elif response.status == 401:
                         logger.error(f"[API] Authentication failed - Invalid API key")
@@ -74,7 +74,6 @@ class ApiSender:
                         # Add metrics before returning failure
                         api_time = time.time() - start_time
                         self.metrics.update_api_timing(api_time, success=False)
-                        self.metrics.log_metrics()
                         return False
                         
         except aiohttp.ClientError as e:
@@ -86,5 +85,4 @@ class ApiSender:
             # Add metrics before returning failure
             api_time = time.time() - start_time
             self.metrics.update_api_timing(api_time, success=False)
-            self.metrics.log_metrics()
             return False
\ No newline at end of file
@@ -0,0 +1,53 @@
+import asyncio
+import itertools
+import os
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+
+class ChangeFeed:
+    """
+    In-memory feed of changes the dashboard displays: charger status, transactions,
+    usage and new meter log records. Events get increasing sequence numbers and the
+    last `maxlen` are kept, so a follower asks for everything after the last sequence
+    number it saw instead of re-reading the data files.
+
+    Event format: {"seq", "type", "time", "data"}
+    """
+
+    def __init__(self, maxlen=2000):
+        # Changes on every process start so followers notice they missed events
+        self.feed_id = f"{os.getpid()}-{int(time.time())}"
+        self.seq = 0
+        self.events = deque(maxlen=maxlen)
+        self._wakeup = asyncio.Event()
+
+    def publish(self, event_type, data):
+        self.seq += 1
+        self.events.append({
+            "seq": self.seq,
+            "type": event_type,
+            "time": datetime.now(timezone.utc).isoformat(),
+            "data": data
+        })
+        wakeup, self._wakeup = self._wakeup, asyncio.Event()
+        wakeup.set()
+
+    def since(self, seq):
+        """Events after `seq`, or None when some of them were already dropped (or seq is unknown)."""
+        if seq > self.seq:
+            return None
+        first = self.events[0]["seq"] if self.events else self.seq + 1
+        if seq < first - 1:
+            return None
+        return list(itertools.islice(self.events, seq - first + 1, None))
+
+    async def wait(self, seq, timeout):
+        """Like since(), but waits up to `timeout` seconds for a new event when there is none yet."""
+        if seq == self.seq:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.since(seq)
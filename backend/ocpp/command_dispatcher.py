@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import time
+
+import websockets
+from ocpp.v16 import call
+
+logger = logging.getLogger(__name__)
+
+
+class Command:
+    """One central-system initiated OCPP call waiting in a charger's queue."""
+    __slots__ = ("charger_id", "action", "payload", "timeout", "retries", "future", "queued_at", "raw")
+
+    def __init__(self, charger_id, action, payload, timeout, retries, future, raw=False):
+        self.charger_id = charger_id
+        self.action = action
+        self.payload = payload
+        self.timeout = timeout
+        self.retries = retries
+        self.future = future
+        self.queued_at = time.monotonic()
+        self.raw = raw  # future gets the charger's response (or the exception) instead of a result dict
+
+
+class CommandDispatcher:
+    """
+    Sends central-system initiated commands (RemoteStopTransaction, TriggerMessage,
+    ChangeConfiguration, Reset) to chargers without blocking the caller.
+
+    Every charger gets its own FIFO queue drained by one task, because OCPP allows a
+    single outstanding call per connection; different chargers are served concurrently.
+    submit() returns a future resolving to a result dict:
+
+        {"charger_id", "action", "status", "attempts", "error", "elapsed"}
+
+    where status is the charger's answer ("Accepted", "Rejected", ...) or one of
+    "Timeout", "NotConnected", "CallError", "Error", "QueueFull". Answers are final.
+    A command that never reached the charger (not connected) is retried with
+    exponential backoff. After a timeout or a connection lost mid-call the charger
+    may already have acted on it, so only IDEMPOTENT actions are sent again.
+    """
+
+    ACTIONS = {
+        "RemoteStopTransaction": call.RemoteStopTransactionPayload,
+        "TriggerMessage": call.TriggerMessagePayload,
+        "ChangeConfiguration": call.ChangeConfigurationPayload,
+        "Reset": call.ResetPayload,
+    }
+    # Safe to send twice: a second RemoteStop of a stopped transaction is just Rejected.
+    # A repeated Reset or ChangeConfiguration could reboot a charger twice.
+    IDEMPOTENT = frozenset({"RemoteStopTransaction", "TriggerMessage"})
+
+    def __init__(self, chargers, timeout=30, retries=2, retry_delay=2.0, max_queue=100):
+        # CentralSystem.chargers, looked up on every attempt so a retry reaches a reconnected charger
+        self.chargers = chargers
+        self.timeout = timeout  # seconds to wait for the charger's answer
+        self.retries = retries  # extra attempts while the charger is offline (or after a timeout, if IDEMPOTENT)
+        self.retry_delay = retry_delay  # first backoff in seconds, doubled per attempt
+        self.max_queue = max_queue  # pending commands per charger
+        self.queues = {}  # charger_id -> asyncio.Queue of Command
+        self.workers = {}  # charger_id -> task draining that queue
+
+    @classmethod
+    def build_payload(cls, action, params=None):
+        """Build the OCPP payload for `action`; raises ValueError for unknown actions or bad params."""
+        payload_class = cls.ACTIONS.get(action)
+        if payload_class is None:
+            raise ValueError(f"Unsupported action '{action}', expected one of {', '.join(cls.ACTIONS)}")
+        try:
+            return payload_class(**(params or {}))
+        except TypeError as e:
+            raise ValueError(f"Invalid parameters for {action}: {e}")
+
+    def submit(self, charger_id, action, params=None, timeout=None, retries=None):
+        """Queue a command for one charger and return a future with its result."""
+        future = asyncio.get_running_loop().create_future()
+        command = Command(
+            charger_id,
+            action,
+            self.build_payload(action, params),
+            self.timeout if timeout is None else timeout,
+            self.retries if retries is None else retries,
+            future
+        )
+        if not self._enqueue(command):
+            future.set_result(self._result(command, "QueueFull", 0, "too many pending commands"))
+        return future
+
+    def call(self, charger_id, payload, timeout=None):
+        """
+        Send any OCPP payload through the charger's queue, behind its pending commands, and
+        return a future with the charger's response (None for a CallError). Sent once: the
+        future raises asyncio.TimeoutError, ConnectionError or asyncio.QueueFull instead.
+        """
+        future = asyncio.get_running_loop().create_future()
+        action = type(payload).__name__.removesuffix("Payload")
+        command = Command(charger_id, action, payload, self.timeout if timeout is None else timeout, 0, future,
+                          raw=True)
+        if not self._enqueue(command):
+            future.set_exception(asyncio.QueueFull(f"too many pending commands for {charger_id}"))
+        return future
+
+    def _enqueue(self, command):
+        """Put a command on its charger's queue (starting the drain task); False when the queue is full."""
+        queue = self.queues.get(command.charger_id)
+        if queue is None:
+            queue = self.queues[command.charger_id] = asyncio.Queue(self.max_queue)
+        try:
+            queue.put_nowait(command)
+        except asyncio.QueueFull:
+            logger.warning(f"[COMMAND] Queue of {command.charger_id} is full, dropping {command.action}")
+            return False
+        if command.charger_id not in self.workers:
+            self.workers[command.charger_id] = asyncio.create_task(self._drain(command.charger_id, queue))
+        return True
+
+    async def dispatch(self, commands, timeout=None, retries=None):
+        """
+        Fan out [(charger_id, action, params)] across chargers and wait for all results.
+        Results come back in the order of `commands`.
+        """
+        futures = [self.submit(charger_id, action, params, timeout, retries)
+                   for charger_id, action, params in commands]
+        return await asyncio.gather(*futures)
+
+    def pending(self):
+        """Queued commands per charger (the one being sent is not counted)."""
+        return {charger_id: queue.qsize() for charger_id, queue in self.queues.items() if queue.qsize()}
+
+    async def _drain(self, charger_id, queue):
+        try:
+            while not queue.empty():
+                command = queue.get_nowait()
+                if command.future.done():  # caller cancelled it while queued
+                    continue
+                if command.raw:
+                    await self._execute_raw(command)
+                    continue
+                try:
+                    result = await self._execute(command)
+                except Exception as e:
+                    result = self._result(command, "Error", 0, str(e))
+                if not command.future.done():
+                    command.future.set_result(result)
+        finally:
+            self.workers.pop(charger_id, None)
+            if queue.empty():
+                self.queues.pop(charger_id, None)
+
+    async def _execute_raw(self, command):
+        try:
+            cp = self.chargers.get(command.charger_id)
+            if cp is None:
+                raise ConnectionError(f"{command.charger_id} is not connected")
+            response = await asyncio.wait_for(cp.call(command.payload), command.timeout)
+        except Exception as e:
+            if not command.future.done():
+                command.future.set_exception(e)
+        else:
+            if not command.future.done():
+                command.future.set_result(response)
+
+    async def _execute(self, command):
+        attempts = 0
+        while True:
+            attempts += 1
+            sent = False  # whether the charger may have received (and acted on) this attempt
+            cp = self.chargers.get(command.charger_id)
+            if cp is None:
+                status, error = "NotConnected", "charger is not connected"
+            else:
+                sent = True
+                try:
+                    response = await asyncio.wait_for(cp.call(command.payload), command.timeout)
+                except asyncio.TimeoutError:
+                    status, error = "Timeout", f"no answer within {command.timeout}s"
+                except websockets.exceptions.ConnectionClosed as e:
+                    status, error = "NotConnected", f"connection closed: {e}"
+                else:
+                    if response is None:
+                        return self._result(command, "CallError", attempts, "charger answered with a CallError")
+                    return self._result(command, getattr(response.status, "value", response.status), attempts)
+
+            if sent and command.action not in self.IDEMPOTENT:
+                logger.warning(f"[COMMAND] {command.action} to {command.charger_id}: {error}, "
+                               f"not retried (the charger may have executed it)")
+                return self._result(command, status, attempts, error)
+            if attempts > command.retries:
+                logger.warning(f"[COMMAND] {command.action} to {command.charger_id} failed after "
+                               f"{attempts} attempts: {error}")
+                return self._result(command, status, attempts, error)
+            delay = self.retry_delay * 2 ** (attempts - 1)
+            logger.info(f"[COMMAND] {command.action} to {command.charger_id}: {error}, retrying in {delay:.0f}s")
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _result(command, status, attempts, error=None):
+        return {
+            "charger_id": command.charger_id,
+            "action": command.action,
+            "status": status,
+            "attempts": attempts,
+            "error": error,
+            "elapsed": round(time.monotonic() - command.queued_at, 3),
+        }
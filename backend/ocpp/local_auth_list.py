@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+
+from ocpp.v16 import call
+from ocpp.v16.enums import AuthorizationStatus, UpdateStatus, UpdateType
+
+from shared_state import SharedJsonFile
+
+logger = logging.getLogger(__name__)
+
+
+class LocalAuthListManager:
+    """
+    Builds versioned OCPP 1.6 local authorization lists from QuotaManager users and
+    their quota state, and pushes them to chargers with SendLocalList so RFID taps
+    can be authorized on the charger without an Authorize round trip.
+
+    Users with quota left are Accepted, users whose quota ran out are Blocked.
+    Chargers get a Full list on BootNotification or when their list version does not
+    match ours, and Differential updates otherwise. An update larger than chunk_size
+    goes out as several messages with increasing versions (see _send).
+
+    Versions are only meaningful to the manager that issued them: with a version_file
+    they are allocated from a counter shared by all OCPP workers, so a charger holding
+    another worker's list never matches our version and gets a Full update.
+    """
+
+    def __init__(self, quota_manager, chunk_size=1000, history_size=200, dispatcher=None, version_file=None):
+        self.quota_manager = quota_manager
+        self.dispatcher = dispatcher  # CommandDispatcher: list updates wait in the charger's command queue
+        self.chunk_size = chunk_size  # entries per SendLocalList message
+        self.history_size = history_size  # differential updates kept for lagging chargers
+        # Seed from the clock so versions keep increasing across server restarts
+        self._version_store = SharedJsonFile(version_file) if version_file else None
+        self.version = int(time.time())
+        if self._version_store is not None:
+            self.version = self._allocate(1)
+        self.entries = {}  # id_tag -> AuthorizationStatus
+        self.history = []  # [(version, {id_tag: status or None for removed})], oldest first
+        self.history_base = self.version  # differentials can be built from this version onwards
+        self.partial_versions = set()  # versions of non-final chunks: a charger left there holds part of a list
+        self.charger_versions = {}  # charger_id -> list version the charger accepted
+        self.unsupported = set()  # chargers without local list support
+        self.revoked = set()  # users blocked by revoke() while their stopped session is still open
+        self.changed = asyncio.Event()
+        self._locks = defaultdict(asyncio.Lock)
+        self.refresh()
+
+    def user_status(self, id_tag):
+        budget = self.quota_manager.get_budget(id_tag)
+        if budget is None:
+            return None
+        return AuthorizationStatus.accepted if budget.can_start() else AuthorizationStatus.blocked
+
+    def _publish(self, changes):
+        """Apply changes as a new list version."""
+        if not changes:
+            return
+        for id_tag, status in changes.items():
+            if status is None:
+                self.entries.pop(id_tag, None)
+            else:
+                self.entries[id_tag] = status
+        self.version = self._allocate(1)
+        self._record(changes)
+        self.changed.set()
+        logger.info(f"[LOCAL_LIST] Version {self.version}: {len(changes)} changes, {len(self.entries)} entries")
+
+    def _record(self, changes):
+        self.history.append((self.version, changes))
+        if len(self.history) > self.history_size:
+            self.history_base = self.history.pop(0)[0]
+            self.partial_versions = {v for v in self.partial_versions if v > self.history_base}
+
+    def _allocate(self, count):
+        """Reserve `count` consecutive versions above any issued before and return the last."""
+        if self._version_store is None:
+            return self.version + count
+        with self._version_store.locked() as counter:
+            last = max(counter.get("version", 0), self.version) + count
+            counter["version"] = last
+        return last
+
+    def issued(self, version):
+        """True if `version` is one of our list versions that differentials can still be built from."""
+        return version == self.history_base or any(entry_version == version for entry_version, _ in self.history)
+
+    def _reserve_versions(self, count):
+        """
+        List versions for an update sent in `count` chunks: new versions for the chunks
+        when there are several, the last of them the new current version (same entries).
+        """
+        if count == 1:
+            return [self.version]
+        self.version = self._allocate(count)
+        first = self.version - count + 1
+        self.partial_versions.update(range(first, self.version))
+        self._record({})
+        return list(range(first, self.version + 1))
+
+    def refresh(self):
+        """Recompute the desired list from users and quota state; returns the changes published."""
+        self.quota_manager._usage_store.refresh()  # usage reset or written by other workers
+        # A revoked user's last energy is only counted at StopTransaction; keep them blocked until then
+        charging = {tx["id_tag"] for tx in self.quota_manager.active_transactions.values()}
+        self.revoked &= charging
+        desired = {}
+        for id_tag in self.quota_manager.users:
+            status = AuthorizationStatus.blocked if id_tag in self.revoked else self.user_status(id_tag)
+            if status is not None:
+                desired[id_tag] = status
+        changes = {tag: status for tag, status in desired.items() if self.entries.get(tag) != status}
+        changes.update({tag: None for tag in self.entries.keys() - desired.keys()})
+        self._publish(changes)
+        return changes
+
+    def revoke(self, id_tag):
+        """Block a user right away (quota ran out) instead of waiting for the next refresh."""
+        self.revoked.add(id_tag)
+        if id_tag in self.entries and self.entries[id_tag] != AuthorizationStatus.blocked:
+            self._publish({id_tag: AuthorizationStatus.blocked})
+
+    def changes_since(self, version):
+        """Merged changes after `version`, or None if that version is too old or not ours."""
+        if version is None or version in self.partial_versions or not self.issued(version):
+            return None
+        merged = {}
+        for entry_version, changes in self.history:
+            if entry_version > version:
+                merged.update(changes)
+        return merged
+
+    @staticmethod
+    def _list_entry(id_tag, status):
+        if status is None:
+            return {"id_tag": id_tag}  # no id_tag_info = remove from the charger's list
+        return {"id_tag": id_tag, "id_tag_info": {"status": status}}
+
+    async def _call(self, cp, payload):
+        if self.dispatcher is None:
+            return await cp.call(payload)
+        return await self.dispatcher.call(cp.id, payload)
+
+    async def _send(self, cp, update_type, items):
+        """
+        Send the current list version as one update, split into chunk_size messages.
+        Several chunks go out as the first chunk of `update_type` followed by Differential
+        chunks, each with a higher version than the one before (chargers reject a second
+        update with the same version). Returns (last UpdateStatus, version it answered).
+        """
+        chunks = [items[i:i + self.chunk_size] for i in range(0, len(items), self.chunk_size)] or [[]]
+        versions = self._reserve_versions(len(chunks))  # before the first await: items match self.version
+        status = None
+        for index, (chunk, version) in enumerate(zip(chunks, versions)):
+            chunk_type = update_type if index == 0 else UpdateType.differential
+            response = await self._call(cp, call.SendLocalListPayload(
+                list_version=version,
+                update_type=chunk_type,
+                local_authorization_list=[self._list_entry(tag, st) for tag, st in chunk]
+            ))
+            if response is None:  # CallError, e.g. NotImplemented
+                return UpdateStatus.not_supported, version
+            status = response.status
+            if status != UpdateStatus.accepted:
+                break
+        return status, version
+
+    async def sync_charger(self, cp, full=False):
+        """Bring one charger's local list up to the current version."""
+        if cp.id in self.unsupported:
+            return
+        async with self._locks[cp.id]:
+            try:
+                charger_version = self.charger_versions.get(cp.id)
+                if not full:
+                    if charger_version is None:
+                        response = await self._call(cp, call.GetLocalListVersionPayload())
+                        if response is None or response.list_version < 0:
+                            self.unsupported.add(cp.id)
+                            logger.info(f"[LOCAL_LIST] {cp.id} does not support local authorization lists")
+                            return
+                        charger_version = response.list_version
+                    if charger_version == self.version:
+                        self.charger_versions[cp.id] = charger_version
+                        return
+
+                changes = None if full else self.changes_since(charger_version)
+                if changes is None:
+                    status, version = await self._send(cp, UpdateType.full, sorted(self.entries.items()))
+                    update_type = "Full"
+                else:
+                    status, version = await self._send(cp, UpdateType.differential, sorted(changes.items()))
+                    update_type = "Differential"
+                    if status == UpdateStatus.version_mismatch:
+                        status, version = await self._send(cp, UpdateType.full, sorted(self.entries.items()))
+                        update_type = "Full"
+
+                if status == UpdateStatus.accepted:
+                    self.charger_versions[cp.id] = version
+                    logger.info(f"[LOCAL_LIST] {cp.id} accepted {update_type} list version {version}")
+                elif status == UpdateStatus.not_supported:
+                    self.unsupported.add(cp.id)
+                    logger.info(f"[LOCAL_LIST] {cp.id} does not support SendLocalList")
+                else:
+                    self.charger_versions.pop(cp.id, None)  # unknown state: full sync next time
+                    logger.warning(f"[LOCAL_LIST] {cp.id} rejected {update_type} list version {version}: {status}")
+            except Exception as e:
+                self.charger_versions.pop(cp.id, None)
+                logger.error(f"[LOCAL_LIST] Failed to sync {cp.id}: {e}")
+
+    def forget_charger(self, charger_id):
+        """Drop per-charger state on disconnect; the next connection re-checks the version."""
+        self.charger_versions.pop(charger_id, None)
+        self.unsupported.discard(charger_id)
+        self._locks.pop(charger_id, None)
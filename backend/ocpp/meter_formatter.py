@@ -10,7 +10,7 @@ from performance_metrics import PerformanceMetrics
 logger = logging.getLogger(__name__)
 
 class MeterValueFormatter:
-    def __init__(self):
+    def __init__(self, metrics: PerformanceMetrics = None):
         self.json_template = {
             "ID": "",                      # Will be generated from chargePointId + timestamp
             "groupId": "EVSE",             # Static for EVSE devices
@@ -38,7 +38,7 @@ class MeterValueFormatter:
             "suppliedEnergy": 0.0
       
         }
-        self.metrics = PerformanceMetrics()
+        self.metrics = metrics or PerformanceMetrics()
         self.logger = logging.getLogger('meter_formatter')
 
     def generate_unique_id(self, charge_point_id: str, timestamp: str) -> str:
@@ -129,18 +129,18 @@ class MeterValueFormatter:
 
                 # Add metrics before returning
                 process_time = time.time() - start_time
-                self.metrics.update_meter_timing(process_time)
+                self.metrics.update_meter_timing(process_time, charge_point_id)
                 
                 return formatted_data
             else:
                 self.logger.warning("[METER] No meter values found in data")
                 process_time = time.time() - start_time
-                self.metrics.update_meter_timing(process_time)
+                self.metrics.update_meter_timing(process_time, charge_point_id)
                 return formatted_data
             
         except Exception as e:
             self.logger.error(f"[METER] Error formatting meter values: {e}")
             self.logger.error(f"[METER] Raw meter data: {meter_data}")
             process_time = time.time() - start_time
-            self.metrics.update_meter_timing(process_time)
+            self.metrics.update_meter_timing(process_time, charge_point_id)
             raise e
\ No newline at end of file
@@ -0,0 +1,189 @@
+import json
+import logging
+import os
+from pathlib import Path
+
+from shared_state import file_lock
+
+logger = logging.getLogger(__name__)
+
+
+class MeterLog:
+    """
+    Append-only meter reading log shared by the OCPP workers and the dashboard,
+    stored as newline-delimited JSON (one reading per line).
+
+    Appending costs one write no matter how long the history is, and readers stream
+    the file in either direction with memory bounded by one block. Byte offsets of
+    lines serve as stable positions for pagination cursors.
+    """
+
+    def __init__(self, path, block_size=64 * 1024):
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self.block_size = block_size
+
+    def identity(self):
+        """Inode of the log file; changes when the file is replaced (cursors become invalid)."""
+        try:
+            return os.stat(self.path).st_ino
+        except FileNotFoundError:
+            return None
+
+    def migrate(self, legacy_path):
+        """
+        One-time migration from `legacy_path` (meter_data_log.json, a single JSON array or
+        already one reading per line) to this log. Does nothing once this log exists; the
+        old file is kept as <name>.migrated. Returns the number of records moved.
+        """
+        legacy_path = Path(legacy_path)
+        with file_lock(self.lock_path):
+            if self.path.exists() or not legacy_path.exists():
+                return 0
+            with open(legacy_path, "r", encoding="utf-8") as f:
+                content = f.read()
+            if content.lstrip().startswith("["):
+                records = json.loads(content)
+            else:
+                records = [record for record in map(self._parse, filter(str.strip, content.splitlines()))
+                           if record is not None]
+            tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            os.replace(tmp_path, self.path)
+            legacy_path.rename(legacy_path.with_name(legacy_path.name + ".migrated"))
+        logger.info(f"[METER_LOG] Migrated {len(records)} records from {legacy_path.name} to {self.path.name}")
+        return len(records)
+
+    def append(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with file_lock(self.lock_path):
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    @staticmethod
+    def _parse(line):
+        try:
+            return json.loads(line)
+        except ValueError:
+            logger.warning(f"[METER_LOG] Skipping unreadable line: {line[:80]!r}")
+            return None
+
+    def __iter__(self):
+        for _, record in self.records():
+            yield record
+
+    def records(self, start=0):
+        """Yield (offset after the line, record) oldest first, starting at byte offset `start`."""
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(start)
+            offset = start
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # line still being written
+                offset += len(line)
+                record = self._parse(line) if line.strip() else None
+                if record is not None:
+                    yield offset, record
+
+    def chunks(self, start=0, size=8 * 1024 * 1024):
+        """Yield (offset after the chunk, raw bytes of complete lines) from byte offset `start`, ~`size` bytes each."""
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(start)
+            offset = start
+            carry = b""
+            while True:
+                data = f.read(size)
+                if not data:
+                    break  # anything left in carry is a line still being written
+                data = carry + data
+                cut = data.rfind(b"\n") + 1
+                carry = data[cut:]
+                if cut:
+                    offset += cut
+                    yield offset, data[:cut]
+
+    def bisect(self, target, key):
+        """
+        Byte offset to read from for records with key(record) >= target, assuming the log
+        is ordered by key (e.g. timestamps). Reads about log2(size / block_size) lines;
+        records before target may still follow within one block, so callers filter.
+        key returns None for records it cannot place.
+        """
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return 0
+        with f:
+            lo, hi = 0, f.seek(0, os.SEEK_END)
+            while hi - lo > self.block_size:
+                mid = (lo + hi) // 2
+                f.seek(mid)
+                f.readline()  # rest of the line mid falls in
+                value = None
+                while value is None and f.tell() < hi:
+                    line = f.readline()
+                    if not line.endswith(b"\n"):
+                        break
+                    record = self._parse(line) if line.strip() else None
+                    value = key(record) if record is not None else None
+                if value is not None and value < target:
+                    lo = mid  # every line up to the one just read comes before target
+                else:
+                    hi = mid
+            if lo == 0:
+                return 0
+            f.seek(lo)
+            f.readline()
+            return f.tell()
+
+    def reverse(self, end=None):
+        """Yield (offset of the line, record) newest first, for the lines ending before byte offset `end`."""
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            size = f.seek(0, os.SEEK_END)
+            pos = size if end is None else min(end, size)
+            tail_end = pos
+            buffer = b""
+            skip_partial = end is None
+            while pos > 0:
+                read = min(self.block_size, pos)
+                pos -= read
+                f.seek(pos)
+                buffer = f.read(read) + buffer
+                parts = buffer.split(b"\n")
+                # parts[0] may continue in the previous block unless we reached the start of the file
+                complete = parts if pos == 0 else parts[1:]
+                line_end = tail_end
+                for part in reversed(complete):
+                    line_start = line_end - len(part)
+                    if skip_partial:
+                        skip_partial = False  # text after the last newline is a line still being written
+                    elif part.strip():
+                        record = self._parse(part)
+                        if record is not None:
+                            yield line_start, record
+                    line_end = line_start - 1
+                if pos > 0:
+                    buffer = parts[0]
+                    tail_end = pos + len(buffer)
+
+
+if __name__ == "__main__":
+    # python meter_log.py [DATA_DIR]: migrate meter_data_log.json without starting the OCPP server
+    import sys
+    data_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else Path(__file__).resolve().parents[1] / "data"
+    logging.basicConfig(level=logging.INFO)
+    MeterLog(data_dir / "meter_data_log.ndjson").migrate(data_dir / "meter_data_log.json")
@@ -5,19 +5,30 @@ import logging
 from datetime import datetime
 from ocpp.v16 import ChargePoint as cp
 from ocpp.v16 import call_result
-from ocpp.v16 import call
 from ocpp.v16.enums import Action, RegistrationStatus, AuthorizationStatus, RemoteStartStopStatus
-from ocpp.routing import on
+from ocpp.routing import on, after
 from websockets.server import serve
 import websockets
+from aiohttp import web
 from meter_formatter import MeterValueFormatter
 from api_sender import ApiSender
-from performance_metrics import PerformanceMetrics
+from performance_metrics import PerformanceMetrics, MetricsReporter
+from shared_state import SharedJsonFile, SharedJsonMap
+from local_auth_list import LocalAuthListManager
+from command_dispatcher import CommandDispatcher
+from change_feed import ChangeFeed
+from meter_log import MeterLog
+from user_store import UserStore
+from session_archive import SessionArchive
+from usage_ledger import closed_periods, current_period, is_legacy, migrate_legacy, period_usage
+from server_config import ServerConfig
 import time
 from datetime import datetime, timezone
-import csv
+import hmac
 import json
+import multiprocessing
 import os
+from multiprocessing.connection import wait as wait_for_processes
 from pathlib import Path
 
 logging.basicConfig(level=logging.INFO)
@@ -32,122 +43,274 @@ print(f"🧭 OCPP DATA_DIR = {DATA_DIR}")
 USERS_CSV = DATA_DIR / "users1.csv"
 ENERGY_USAGE_JSON = DATA_DIR / "energy_usage.json"
 ACTIVE_TRANSACTIONS_JSON = DATA_DIR / "active_transactions.json"
+SESSIONS_JSON = DATA_DIR / "sessions.json"
+METER_LOG_NDJSON = DATA_DIR / "meter_data_log.ndjson"
+LEGACY_METER_LOG_JSON = DATA_DIR / "meter_data_log.json"  # single JSON array, migrated by main()
 LAST_RESET_FILE = DATA_DIR / "last_reset.txt"
+# Power.Active.Import units the quota projection understands, as factors to W
+POWER_UNIT_FACTORS = {"W": 1.0, "kW": 1000.0}
+# Max seconds between writes of meter progress (last_meter, max_power_w, charger counters);
+# Start/Stop, status changes and disconnects are written immediately and flush it
+PROGRESS_SAVE_INTERVAL = 30
+
+class UserBudget:
+    """
+    Precomputed quota state of one user. Updated in place as energy is added so
+    quota checks are a single comparison instead of rebuilding the user info.
+    """
+    __slots__ = ("full_name", "plan", "quota_kwh", "used_kwh", "remaining_kwh",
+                 "start_limit", "stop_threshold", "usage_version")
+
+    def __init__(self, user):
+        self.full_name = user["full_name"]
+        self.plan = user["plan"]
+        self.quota_kwh = user["quota_kwh"]
+        if self.plan == "unlimited":
+            self.start_limit = self.stop_threshold = float("inf")
+        else:
+            # Limited users without a quota may not start; running sessions are only stopped on a real quota
+            self.start_limit = self.quota_kwh or 0.0
+            self.stop_threshold = self.quota_kwh or float("inf")
+        self.used_kwh = 0.0
+        self.remaining_kwh = None
+        self.usage_version = None
+
+    def set_used(self, used_kwh, usage_version):
+        self.used_kwh = used_kwh
+        self.usage_version = usage_version
+        if self.plan == "limited" and self.quota_kwh is not None:
+            self.remaining_kwh = max(0, self.quota_kwh - used_kwh)
+
+    def add(self, energy_kwh, usage_version):
+        self.set_used(self.used_kwh + energy_kwh, usage_version)
+
+    def can_start(self):
+        return self.used_kwh < self.start_limit
+
+    def exceeded(self):
+        return self.used_kwh >= self.stop_threshold
+
 
 class QuotaManager:
-    def __init__(self, csv_path=None, usage_file=None, tx_file=None):
+    def __init__(self, csv_path=None, usage_file=None, tx_file=None, feed: ChangeFeed = None, sessions_file=None,
+                 progress_interval=PROGRESS_SAVE_INTERVAL, usage_history_file=None):
         self.csv_path = csv_path or DATA_DIR / "users1.csv"
         self.usage_file = usage_file or DATA_DIR / "energy_usage.json"
         self.tx_file = tx_file or DATA_DIR / "active_transactions.json"
+        self.sessions = SessionArchive(sessions_file or SESSIONS_JSON)  # completed sessions, append-only
+        self.user_store = UserStore(self.csv_path)  # same index/journal the dashboard writes
         self.users = {}
-        self.energy_usage = {}
+        self.budgets = {}  # id_tag -> UserBudget, built on first use
         self.active_transactions = {}  # Track ongoing transactions
         self.stop_pending = set()  # Track transactions with pending stop commands
+        self.transaction_power = {}  # transaction_id -> last Power.Active.Import (W)
+        self.feed = feed  # dashboard change feed (optional)
+        # Usage and transactions are shared with the other OCPP workers through the data files
+        self._usage_store = SharedJsonFile(self.usage_file)
+        # Closed billing periods, moved out of the usage file at rollover
+        self._usage_history = SharedJsonFile(usage_history_file or DATA_DIR / "energy_usage_history.json")
+        self._tx_store = SharedJsonMap(self.tx_file)
+        self.progress_interval = progress_interval
+        self._progress_dirty = False  # meter progress not written to active_transactions.json yet
+        self._progress_saved_at = time.monotonic()
         self.load_user_data()
         self.load_usage_data()
         self.load_active_transactions()
 
+    @property
+    def energy_usage(self):
+        """Per-user usage of the current billing period, as last synchronized with energy_usage.json."""
+        return period_usage(self._usage_store.data)
+
+    def _usage_key(self):
+        """Changes when energy_usage.json is re-read or the billing period rolls over."""
+        return self._usage_store.version, current_period()
+
     def save_active_transactions(self):
-        """Persist active transactions to file."""
+        """Persist active transactions to file, merging with other workers' transactions."""
         try:
-            with open(self.tx_file, "w") as f:
-                json.dump(self.active_transactions, f, indent=2)
+            self.active_transactions = self._tx_store.merge(self.active_transactions)
+            self._progress_dirty = False
+            self._progress_saved_at = time.monotonic()
         except Exception as e:
             logging.error(f"Error saving active transactions: {e}")
 
+    def save_progress(self):
+        """Persist meter progress of running transactions, at most every progress_interval seconds."""
+        self._progress_dirty = True
+        if time.monotonic() - self._progress_saved_at >= self.progress_interval:
+            self.save_active_transactions()
+
+    def flush_progress(self):
+        """Write meter progress not persisted yet (charger disconnected: another worker may take it over)."""
+        if self._progress_dirty:
+            self.save_active_transactions()
+
     def load_active_transactions(self):
         """Load active transactions from file."""
         try:
-            if os.path.exists(self.tx_file):
-                with open(self.tx_file, "r") as f:
-                    self.active_transactions = json.load(f)
-            else:
-                self.active_transactions = {}
+            self.active_transactions = self._tx_store.load()
             logging.info(f"Loaded {len(self.active_transactions)} active transactions from {self.tx_file}")
         except Exception as e:
             logging.error(f"Error loading active transactions: {e}")
             self.active_transactions = {}
 
+    @staticmethod
+    def quota_user(row):
+        """Quota view of a users1.csv row: full name, plan and quota (None for unlimited users)."""
+        tag = row["id_tag"]
+        full_name = f"{row['header name']} {row['surname']}"
+        plan = "unlimited" if row["unlimited"].upper() == "TRUE" else "limited"
+
+        quota_kwh = None
+        if plan == "limited":
+            if row.get("quota_kwh"):
+                quota_kwh = float(row["quota_kwh"])
+            else:
+                logging.warning(
+                    f"[USER] {tag} has no quota defined in CSV and is marked as limited → blocking user")
+
+        return {
+            "full_name": full_name,
+            "plan": plan,
+            "quota_kwh": quota_kwh  # None for unlimited users
+        }
+
     def load_user_data(self):
         """Load user data from CSV including quotas."""
         self.users = {}
         try:
-            with open(self.csv_path, mode='r') as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    tag = row["id_tag"].strip()
-                    full_name = f"{row['header name'].strip()} {row['surname'].strip()}"
-                    plan = "unlimited" if row["unlimited"].strip().upper() == "TRUE" else "limited"
-
-                    quota_kwh = None
-                    if plan == "limited":
-                        if row.get("quota_kwh") and row.get("quota_kwh").strip():
-                            quota_kwh = float(row["quota_kwh"])
-                        else:
-                            logging.warning(
-                                f"[USER] {tag} has no quota defined in CSV and is marked as limited → blocking user")
-
-                    self.users[tag] = {
-                        "full_name": full_name,
-                        "plan": plan,
-                        "quota_kwh": quota_kwh  # None for unlimited users
-                    }
+            self.user_store.refresh()
+            self.users = {row["id_tag"]: self.quota_user(row) for row in self.user_store.rows()}
             logging.info(f"Loaded {len(self.users)} users from {self.csv_path}")
         except Exception as e:
             logging.error(f"Error loading user data: {e}")
+        self.budgets = {}  # plan data changed: rebuild budgets on next use
+
+    def read_user_changes(self):
+        """
+        Return {id_tag: user or None (deleted)} for users changed since the last check.
+        Runs in a worker thread: only journal lines not seen yet are read, unless the CSV was replaced.
+        """
+        changed = self.user_store.refresh()
+        changes = {}
+        for tag in changed:
+            row = self.user_store.get(tag)
+            changes[tag] = self.quota_user(row) if row is not None else None
+        return changes
+
+    def apply_user_changes(self, changes):
+        """Apply changed users to the quota table, invalidating only their budgets."""
+        added = {tag for tag, user in changes.items() if user is not None and tag not in self.users}
+        removed = {tag for tag, user in changes.items() if user is None and tag in self.users}
+        changed = {tag for tag, user in changes.items()
+                   if user is not None and tag in self.users and user != self.users[tag]}
+        users = dict(self.users)
+        for tag in added | changed:
+            users[tag] = changes[tag]
+        for tag in removed:
+            del users[tag]
+        for tag in removed | changed:
+            self.budgets.pop(tag, None)
+        self.users = users  # single assignment: readers see either the old or the new table
+        logging.info(
+            f"[USER] Reloaded {self.csv_path}: {len(users)} users "
+            f"(+{len(added)} added, -{len(removed)} removed, {len(changed)} changed)")
+        return added, removed, changed
 
     def load_usage_data(self):
         """Load existing energy usage data."""
         try:
-            if os.path.exists(self.usage_file):
-                with open(self.usage_file, 'r') as f:
-                    self.energy_usage = json.load(f)
-            else:
-                self.energy_usage = {}
+            ledger = self._usage_store.load()
+            if is_legacy(ledger) or closed_periods(ledger):
+                with self._usage_store.locked() as usage:
+                    if is_legacy(usage):
+                        usage = self._usage_store.data = migrate_legacy(usage, LAST_RESET_FILE)
+                        logging.info("[USAGE] Migrated energy_usage.json to per-period buckets")
+                    self._archive_closed_periods(usage, current_period())
             logging.info(f"Loaded energy usage data for {len(self.energy_usage)} users")
         except Exception as e:
             logging.error(f"Error loading usage data: {e}")
-            self.energy_usage = {}
 
-    def save_usage_data(self):
-        """Save current energy usage to file."""
-        try:
-            with open(self.usage_file, 'w') as f:
-                json.dump(self.energy_usage, f, indent=2)
-        except Exception as e:
-            logging.error(f"Error saving usage data: {e}")
+    def _archive_closed_periods(self, ledger, period):
+        """Move periods before `period` from the locked ledger to the history file."""
+        closed = closed_periods(ledger, period)
+        if not closed:
+            return
+        # History first: a crash in between leaves the period in both files with the same
+        # totals, and the next write moves it again
+        with self._usage_history.locked() as history:
+            history.update(closed)
+        for key in closed:
+            del ledger[key]
+        logging.info(f"[USAGE] Moved periods {', '.join(sorted(closed))} to {self._usage_history.path.name}")
+
+    def add_usage(self, id_tag, energy_kwh):
+        """Atomically add energy to a user's usage and return the new total."""
+        key = self._usage_key()
+        with self._usage_store.locked() as ledger:
+            # Period resolved under the lock: once a period is archived nobody writes it again
+            period = current_period()
+            self._archive_closed_periods(ledger, period)
+            usage = ledger.setdefault(period, {})
+            usage[id_tag] = usage.get(id_tag, 0) + energy_kwh
+            total = usage[id_tag]
+        budget = self.budgets.get(id_tag)
+        written = self._usage_key()
+        if budget is not None and budget.usage_version == key and written == (key[0] + 1, key[1]):
+            budget.add(energy_kwh, written)  # only our write happened since the budget was synced
+        # Otherwise the file was re-read (another worker wrote it) and the budget resyncs on next use
+        if self.feed:
+            budget = self.get_budget(id_tag)
+            self.feed.publish("usage", {
+                "id_tag": id_tag,
+                "period": period,
+                "used_kwh": total,
+                "remaining_kwh": budget.remaining_kwh if budget else None
+            })
+        return total
+
+    def get_budget(self, id_tag):
+        """Return the user's UserBudget, or None for unknown tags."""
+        budget = self.budgets.get(id_tag)
+        if budget is None:
+            user = self.users.get(id_tag)
+            if user is None:
+                return None
+            budget = self.budgets[id_tag] = UserBudget(user)
+        key = self._usage_key()
+        if budget.usage_version != key:
+            budget.set_used(self.energy_usage.get(id_tag, 0), key)
+        return budget
 
     def get_user_info(self, id_tag):
-        user = self.users.get(id_tag)
-        if not user:
+        budget = self.get_budget(id_tag)
+        if not budget:
             return None
-        current_usage = self.energy_usage.get(id_tag, 0)
-        remaining_quota = None
-        if user["plan"] == "limited" and user["quota_kwh"] is not None:
-            remaining_quota = max(0, user["quota_kwh"] - current_usage)
         return {
-            "full_name": user["full_name"],
-            "plan": user["plan"],
-            "quota_kwh": user["quota_kwh"],
-            "used_kwh": current_usage,
-            "remaining_kwh": remaining_quota
+            "full_name": budget.full_name,
+            "plan": budget.plan,
+            "quota_kwh": budget.quota_kwh,
+            "used_kwh": budget.used_kwh,
+            "remaining_kwh": budget.remaining_kwh
         }
 
     def can_start_transaction(self, id_tag):
-        user_info = self.get_user_info(id_tag)
-        if not user_info:
+        self._usage_store.refresh()  # pick up usage recorded by other workers
+        budget = self.get_budget(id_tag)
+        if not budget:
             return False, "User not found"
-        if user_info["plan"] == "unlimited":
+        if budget.plan == "unlimited":
             return True, "Unlimited plan"
-        if user_info["remaining_kwh"] is None or user_info["remaining_kwh"] <= 0:
-            return False, f"Quota exceeded. Used: {user_info['used_kwh']:.2f}kWh, Quota: {user_info['quota_kwh']:.2f}kWh"
-        return True, f"Available quota: {user_info['remaining_kwh']:.2f}kWh"
-
-    def start_transaction(self, transaction_id, id_tag, initial_meter_kwh, charger_id):
-        tx_id_str = str(transaction_id) 
-        user_info = self.get_user_info(id_tag)
-        full_name = user_info["full_name"] if user_info else "Unknown"
-        self.active_transactions[str(transaction_id)] = {
+        if not budget.can_start():
+            return False, f"Quota exceeded. Used: {budget.used_kwh:.2f}kWh, Quota: {budget.quota_kwh or 0:.2f}kWh"
+        return True, f"Available quota: {budget.remaining_kwh:.2f}kWh"
+
+    def start_transaction(self, id_tag, initial_meter_kwh, charger_id):
+        """Record a new transaction under an id no worker is using and return the id."""
+        budget = self.get_budget(id_tag)
+        full_name = budget.full_name if budget else "Unknown"
+        transaction = {
             "id_tag": id_tag,
             "start_meter": initial_meter_kwh,
             "start_time": datetime.now(timezone.utc).isoformat(),
@@ -155,12 +318,19 @@ class QuotaManager:
             "full_name": full_name,
             "charger_id": charger_id
         }
+        # Id picked and written under the file lock: workers starting sessions in the same second get different ids
+        transaction_id = self._tx_store.insert(self.active_transactions, int(time.time()), transaction)
+        self.active_transactions = self._tx_store.data
+        tx_id_str = str(transaction_id)
         # Clear any pending stop flag when starting new transaction
         self.stop_pending.discard(tx_id_str)
-        self.save_active_transactions()
+        if self.feed:
+            self.feed.publish("transaction", {"transaction_id": tx_id_str, "state": "started",
+                                              **self.active_transactions[tx_id_str]})
         logging.info(f"[QUOTA] Transaction {transaction_id} started for {id_tag}")
+        return transaction_id
 
-    def update_transaction_usage(self, transaction_id, current_meter_kwh):
+    def update_transaction_usage(self, transaction_id, current_meter_kwh, power_w=None):
         transaction_id = str(transaction_id)
         if transaction_id not in self.active_transactions:
             return False
@@ -176,91 +346,157 @@ class QuotaManager:
         last_meter = transaction.get("last_meter", transaction["start_meter"])
         energy_increment = max(0, current_meter_kwh - last_meter)
 
-        # Persist the updated last_meter
+        # Persist the updated last_meter (and the peak power for the session archive)
         transaction["last_meter"] = current_meter_kwh
+        if power_w is not None and power_w > transaction.get("max_power_w", 0):
+            transaction["max_power_w"] = power_w
 
-        # Update quota file
-        self.energy_usage[id_tag] = self.energy_usage.get(id_tag, 0) + energy_increment
-        self.save_usage_data()
-        self.save_active_transactions()
+        # Update quota file (increment under the shared lock so other workers' usage is kept)
+        try:
+            total_usage = self.add_usage(id_tag, energy_increment)
+        except Exception as e:
+            logging.error(f"Error saving usage data: {e}")
+            total_usage = self.energy_usage.get(id_tag, 0)
+        self.save_progress()
 
         logging.info(
             f"[DEBUG] Updating energy_usage.json for {id_tag}: +{energy_increment:.3f} kWh "
-            f"(Total: {self.energy_usage[id_tag]:.3f} kWh)"
+            f"(Total: {total_usage:.3f} kWh)"
         )
 
-        user_info = self.get_user_info(id_tag)
-        if not user_info or user_info["plan"] == "unlimited":
-            return False
-
-        if user_info["quota_kwh"] and user_info["used_kwh"] >= user_info["quota_kwh"]:
+        budget = self.get_budget(id_tag)
+        if budget is not None and budget.exceeded():
             self.stop_pending.add(transaction_id)
             logging.info(f"[QUOTA] Marking transaction {transaction_id} for stop (quota exceeded)")
             return True
         
         return False
 
-    def end_transaction(self, transaction_id, final_meter_kwh):
+    def end_transaction(self, transaction_id, final_meter_kwh, reason=None):
         transaction_id = str(transaction_id)
         if transaction_id not in self.active_transactions:
             return
         transaction = self.active_transactions[transaction_id]
         id_tag = transaction["id_tag"]
 
+        # Readings are already counted in real time; only add the energy since the last reading
+        # (a predictive cutoff stops the session between two MeterValues)
+        last_meter = transaction.get("last_meter", transaction["start_meter"])
+        final_increment = max(0, final_meter_kwh - last_meter)
+        if final_increment > 0:
+            try:
+                self.add_usage(id_tag, final_increment)
+            except Exception as e:
+                logging.error(f"Error saving usage data: {e}")
+
         # Update last meter for recordkeeping
         transaction["last_meter"] = final_meter_kwh
 
-        # Do not increment usage again; already updated in real time
         del self.active_transactions[transaction_id]
+        self.archive_session(transaction_id, transaction, reason)
+        if self.feed:
+            self.feed.publish("transaction", {"transaction_id": transaction_id, "state": "stopped", **transaction})
 
         # Cleanup
         self.stop_pending.discard(transaction_id)
-        self.save_usage_data()
+        self.transaction_power.pop(transaction_id, None)
         self.save_active_transactions()
 
         logging.info(
             f"[QUOTA] Transaction {transaction_id} ended for {id_tag}, "
-            f"final meter {final_meter_kwh:.3f}kWh (no extra increment)"
+            f"final meter {final_meter_kwh:.3f}kWh (+{final_increment:.3f} kWh since last reading)"
         )
 
-    def reset_monthly_usage(self):
-        """Reset all user energy usage at the start of a new month."""
-        current_month = datetime.now().strftime("%Y-%m")
-        reset_file = DATA_DIR / "last_reset.txt"
-
-        # Check when we last reset
-        last_reset_month = None
-        if os.path.exists(reset_file):
-            with open(reset_file, "r") as f:
-                last_reset_month = f.read().strip()
-
-        # If it's a new month, reset usage
-        if last_reset_month != current_month:
-            logging.info(f"[RESET] New month detected ({current_month}) → resetting all user usage.")
-            for user_id in self.energy_usage.keys():
-                self.energy_usage[user_id] = 0.0
-            self.save_usage_data()
-
-            # Save last reset month
-            with open(reset_file, "w") as f:
-                f.write(current_month)
-        else:
-            logging.info(f"[RESET] Usage file already reset for {current_month}, skipping.")
+    def archive_session(self, transaction_id, transaction, reason):
+        """Record a completed transaction in the session archive."""
+        stop_time = datetime.now(timezone.utc)
+        try:
+            duration = (stop_time - datetime.fromisoformat(transaction["start_time"])).total_seconds()
+        except (KeyError, TypeError, ValueError):
+            duration = None
+        session = {
+            "transaction_id": transaction_id,
+            "id_tag": transaction["id_tag"],
+            "full_name": transaction.get("full_name"),
+            "charger_id": transaction.get("charger_id"),
+            "start_time": transaction.get("start_time"),
+            "stop_time": stop_time.isoformat(),
+            "duration_s": round(duration) if duration is not None else None,
+            "start_meter_kwh": transaction["start_meter"],
+            "stop_meter_kwh": transaction["last_meter"],
+            "energy_kwh": round(max(0.0, transaction["last_meter"] - transaction["start_meter"]), 3),
+            "max_power_w": transaction.get("max_power_w", 0.0),
+            "stop_reason": reason or "Local",  # OCPP 1.6 default when the charger sends none
+            "quota_stop": transaction_id in self.stop_pending,
+        }
+        try:
+            self.sessions.append(session)
+        except Exception as e:
+            logging.error(f"[SESSIONS] Error archiving transaction {transaction_id}: {e}")
+
+    def project_quota_exhaustion(self, transaction_id, power_w):
+        """
+        Record the transaction's current power and return the seconds until the user's
+        quota runs out at the combined power of all their sessions, or None if it never will.
+        """
+        transaction_id = str(transaction_id)
+        transaction = self.active_transactions.get(transaction_id)
+        if transaction is None:
+            return None
+        self.transaction_power[transaction_id] = max(0.0, power_w)
+
+        id_tag = transaction["id_tag"]
+        budget = self.get_budget(id_tag)
+        if budget is None or budget.stop_threshold == float("inf"):
+            return None
+
+        user_power_w = sum(
+            power for tid, power in self.transaction_power.items()
+            if self.active_transactions.get(tid, {}).get("id_tag") == id_tag
+        )
+        if user_power_w <= 0:
+            return None
+        remaining_kwh = max(0.0, budget.stop_threshold - budget.used_kwh)
+        return remaining_kwh / (user_power_w / 1000.0) * 3600.0
 
 
 class ChargePoint(cp):
     def __init__(self, id, connection, meter_formatter: MeterValueFormatter, api_sender: ApiSender,
-                 quota_manager: QuotaManager, charger_status_manager):
+                 quota_manager: QuotaManager, charger_status_manager, local_list: LocalAuthListManager = None,
+                 dispatcher: CommandDispatcher = None, metrics: PerformanceMetrics = None, authorize_all=False):
         super().__init__(id, connection)
         self.id = id
+        self.authorize_all = authorize_all  # unrestricted charger: every tag is accepted, no local list
         self.heartbeat_interval = 60
         self.meter_formatter = meter_formatter
         self.api_sender = api_sender
+        self.metrics = metrics or api_sender.metrics
         self.current_state = "Available"
-        self._message_start_time = None
+        self.connected_at = time.monotonic()
+        self.last_message_time = self.connected_at  # refreshed by every message from the charger
+        self.cutoff_timers = {}  # transaction_id -> TimerHandle of the predictive quota stop
+        self._background_tasks = set()
         self.quota_manager = quota_manager
         self.energy_unit_factor = 1  # Energy values are in kWh
         self.charger_status_manager = charger_status_manager
+        self.local_list = local_list
+        self.dispatcher = dispatcher
+
+    @staticmethod
+    def convert_to_watts(sample):
+        """
+        Power of a Power.Active.Import sampledValue in W, read with its `unit` (W when
+        missing, or kW). None for other units or unreadable values.
+        """
+        factor = POWER_UNIT_FACTORS.get(sample.get('unit') or 'W')
+        if factor is None:
+            logging.warning(f"[METER] Unknown power unit {sample.get('unit')!r}, skipping quota projection")
+            return None
+        try:
+            return float(sample.get('value')) * factor
+        except (ValueError, TypeError):
+            logging.error(f"[METER] Invalid power value: {sample.get('value')}")
+            return None
 
     def convert_to_kwh(self, energy_value):
         """
@@ -285,70 +521,103 @@ class ChargePoint(cp):
             logging.error(f"[METER] Invalid energy value: {energy_value}")
             return 0.0
 
-    async def send_call(self, call):
-        """Override to track message metrics."""
+    async def route_message(self, raw_msg):
+        """Override to record the last time the charger was heard from."""
+        self.last_message_time = time.monotonic()
+        return await super().route_message(raw_msg)
+
+    def idle_seconds(self):
+        """Seconds since the last message received from the charger."""
+        return time.monotonic() - self.last_message_time
+
+    def schedule_quota_cutoff(self, transaction_id, power_w):
+        """(Re)schedule the remote stop at the projected moment the user's quota runs out."""
+        transaction_id = str(transaction_id)
+        self.cancel_quota_cutoff(transaction_id)
+        seconds = self.quota_manager.project_quota_exhaustion(transaction_id, power_w)
+        if seconds is None:
+            return
+        self.cutoff_timers[transaction_id] = asyncio.get_running_loop().call_later(
+            seconds, self._quota_cutoff_due, transaction_id)
+        logging.info(f"[QUOTA] Transaction {transaction_id}: quota projected to run out in {seconds:.0f}s at {power_w:.0f}W")
+
+    def cancel_quota_cutoff(self, transaction_id):
+        timer = self.cutoff_timers.pop(str(transaction_id), None)
+        if timer is not None:
+            timer.cancel()
+
+    def cancel_all_quota_cutoffs(self):
+        for timer in self.cutoff_timers.values():
+            timer.cancel()
+        self.cutoff_timers.clear()
+
+    def _quota_cutoff_due(self, transaction_id):
+        """Timer callback: the projected quota exhaustion time was reached."""
+        self.cutoff_timers.pop(transaction_id, None)
+        if (transaction_id not in self.quota_manager.active_transactions
+                or transaction_id in self.quota_manager.stop_pending):
+            return
+        self.quota_manager.stop_pending.add(transaction_id)
+        logging.warning(f"[QUOTA] Projected quota exhaustion reached for transaction {transaction_id}, stopping")
+        if self.local_list:
+            self.local_list.revoke(self.quota_manager.active_transactions[transaction_id]["id_tag"])
+        self.stop_transaction_remotely(transaction_id)
+
+    async def call(self, payload, suppress=True, unique_id=None):
+        """Override to track metrics of calls sent to the charger."""
+        action = payload.__class__.__name__[:-len("Payload")]
+        start_time = time.perf_counter()
         try:
-            self._message_start_time = time.time()
-            response = await super().send_call(call)
-            latency = time.time() - self._message_start_time
-            self.api_sender.metrics.record_message_metrics(latency, is_sent=True)
-            return response
-        except Exception as e:
-            if self._message_start_time:
-                latency = time.time() - self._message_start_time
-                self.api_sender.metrics.record_message_metrics(latency, is_sent=True, failed=True)
-            raise e
+            response = await super().call(payload, suppress, unique_id)
+        except Exception:
+            self.metrics.record_message_metrics(time.perf_counter() - start_time, is_sent=True, failed=True,
+                                                charger=self.id, action=action)
+            raise
+        # A CallError answer comes back as None when suppressed
+        self.metrics.record_message_metrics(time.perf_counter() - start_time, is_sent=True, failed=response is None,
+                                            charger=self.id, action=action)
+        return response
 
     async def _handle_call(self, message):
         """Override to track message metrics."""
+        start_time = time.perf_counter()
         try:
-            start_time = time.time()
             response = await super()._handle_call(message)
-            latency = time.time() - start_time
-            self.api_sender.metrics.record_message_metrics(latency, is_sent=False)
-            return response
-        except Exception as e:
-            self.api_sender.metrics.record_message_metrics(0, is_sent=False, failed=True)
-            raise e
-
-    async def stop_transaction_remotely(self, transaction_id):
-        """Send RemoteStopTransaction command to the charger."""
-        try:
-            # Ensure transaction_id is an integer - convert from string if needed
-            if isinstance(transaction_id, str):
-                tx_id = int(transaction_id)
-            else:
-                tx_id = transaction_id
-            
-            logging.info(f"[REMOTE_STOP] Sending stop command for transaction {tx_id}")
-            
-            # Create the request
-            request = call.RemoteStopTransactionPayload(transaction_id=tx_id)
-            
-            # Send the command without waiting for confirmation
-            # The charger will send StopTransaction message when it actually stops
-            response = await self.call(request)
-            
-            if response.status == RemoteStartStopStatus.accepted:
-                logging.info(f"[REMOTE_STOP] ✓ Charger accepted stop command for transaction {tx_id}")
-                return True
-            else:
-                logging.warning(f"[REMOTE_STOP] ✗ Charger rejected stop command for transaction {tx_id}: {response.status}")
-                # Clear the pending flag if rejected
-                self.quota_manager.stop_pending.discard(str(tx_id))
-                return False
-                
-        except asyncio.TimeoutError:
-            # Timeout is actually OK - the charger might still stop the transaction
-            # It just took longer than 30s to respond
+        except Exception:
+            self.metrics.record_message_metrics(0, is_sent=False, failed=True, charger=self.id, action=message.action)
+            raise
+        self.metrics.record_message_metrics(time.perf_counter() - start_time, is_sent=False,
+                                            charger=self.id, action=message.action)
+        return response
+
+    def stop_transaction_remotely(self, transaction_id):
+        """
+        Queue a RemoteStopTransaction on the command dispatcher and return its future.
+        The charger sends StopTransaction when it actually stops, so callers don't wait.
+        """
+        tx_id = int(transaction_id)
+        logging.info(f"[REMOTE_STOP] Queueing stop command for transaction {tx_id}")
+        future = self.dispatcher.submit(self.id, "RemoteStopTransaction", {"transaction_id": tx_id})
+        future.add_done_callback(lambda f: self._remote_stop_done(tx_id, f))
+        return future
+
+    def _remote_stop_done(self, tx_id, future):
+        if future.cancelled() or future.exception() is not None:
+            error = "cancelled" if future.cancelled() else repr(future.exception())
+            logging.warning(f"[REMOTE_STOP] ✗ Stop command for transaction {tx_id} failed: {error}")
+            self.quota_manager.stop_pending.discard(str(tx_id))  # retried on the next meter reading
+            return
+        result = future.result()
+        status = result["status"]
+        if status == RemoteStartStopStatus.accepted:
+            logging.info(f"[REMOTE_STOP] ✓ Charger accepted stop command for transaction {tx_id}")
+        elif status == "Timeout":
+            # The charger might still stop the transaction, it just didn't answer in time
             logging.warning(f"[REMOTE_STOP] ⏱ Timeout waiting for response on transaction {tx_id}, but command was sent")
-            return True  # Consider it successful since command was sent
-            
-        except Exception as e:
-            logging.error(f"[REMOTE_STOP] ✗ Failed to send stop command for transaction {transaction_id}: {e}")
-            # Clear the pending flag on error
-            self.quota_manager.stop_pending.discard(str(transaction_id))
-            return False
+        else:
+            logging.warning(f"[REMOTE_STOP] ✗ Stop command for transaction {tx_id} failed: {status} {result['error'] or ''}")
+            # Clear the pending flag so the next meter reading can try again
+            self.quota_manager.stop_pending.discard(str(tx_id))
 
     @on(Action.BootNotification)
     async def on_boot_notification(self, charging_station=None, charge_point_model=None, charge_point_vendor=None,
@@ -383,6 +652,15 @@ class ChargePoint(cp):
                 status=RegistrationStatus.accepted
             )
 
+    @after(Action.BootNotification)
+    def after_boot_notification(self, **kwargs):
+        """Push the full local authorization list once the charger is registered."""
+        if self.local_list and not self.authorize_all:
+            # Run as a task: awaiting a call here would block the receive loop that delivers its response
+            task = asyncio.create_task(self.local_list.sync_charger(self, full=True))
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+
     @on(Action.Heartbeat)
     async def on_heartbeat(self):
         """Handle Heartbeat from Charge Point."""
@@ -420,15 +698,18 @@ class ChargePoint(cp):
             logging.info(f'[METER] Received meter values from {self.id}')
             logging.info(f'[METER] Connector ID: {connector_id}')
 
-            # Extract energy value for quota checking
+            # Extract energy value for quota checking (and power for the quota projection)
             current_energy_kwh = None
+            power_w = None
             transaction_id = kwargs.get('transaction_id')
 
             user_name = "Unknown"
+            id_tag = None
             if transaction_id:
                 tx_id_str = str(transaction_id)
                 if tx_id_str in self.quota_manager.active_transactions:
                     user_name = self.quota_manager.active_transactions[tx_id_str].get("full_name", "Unknown")
+                    id_tag = self.quota_manager.active_transactions[tx_id_str].get("id_tag")
 
             if meter_value:
                 for value in meter_value:
@@ -445,36 +726,11 @@ class ChargePoint(cp):
 
                             except (ValueError, TypeError) as e:
                                 logging.error(f'[METER] Error parsing energy value: {e}')
+                        elif measurand == 'Power.Active.Import':
+                            power_w = self.convert_to_watts(val)
 
-            # Check active transactions for quota violations
-            if current_energy_kwh is not None:
-                transactions_to_stop = []
-                self.charger_status_manager.update_uptime(self.id)
-                self.charger_status_manager.add_delivered_energy(self.id, current_energy_kwh)
-
-
-                # If we have a specific transaction ID, check only that one
-                if transaction_id and transaction_id in self.quota_manager.active_transactions:
-                    quota_exceeded = self.quota_manager.update_transaction_usage(transaction_id, current_energy_kwh)
-                    if quota_exceeded:
-                        transactions_to_stop.append(transaction_id)
-                else:
-                    # Only update transactions from the same charger
-                    for tid, transaction in self.quota_manager.active_transactions.items():
-                        charger_name = transaction.get("charger_id")
-                        if charger_name == self.id:
-                            quota_exceeded = self.quota_manager.update_transaction_usage(tid, current_energy_kwh)
-                            if quota_exceeded:
-                                transactions_to_stop.append(tid)
-
-                # Stop transactions that exceeded quota
-                for tid in transactions_to_stop:
-                    user_info = self.quota_manager.get_user_info(self.quota_manager.active_transactions[tid]["id_tag"])
-                    user_name = user_info["full_name"] if user_info else "Unknown"
-                    logging.warning(f"[QUOTA] Remote stop triggered for {user_name} (ID {tid}) due to quota exceeded")
-                    await self.stop_transaction_remotely(tid)
-            
             # Format meter values for API (with user name)
+            formatted_data = None
             try:
                 formatted_data = self.meter_formatter.format_meter_values(
                     self.id,
@@ -486,14 +742,47 @@ class ChargePoint(cp):
                     user_name=user_name
                 )
                 formatted_data["chargerName"] = self.id
-
-                # Save to meter_data_log.json
-                self.charger_status_manager.append_meter_log(formatted_data)
-
+                if id_tag:
+                    formatted_data["idTag"] = id_tag  # analytics group usage per user by id tag
             except Exception as format_error:
                 logging.error(f'[METER] Failed to format meter data: {str(format_error)}')
+
+            # Check active transactions for quota violations
+            if current_energy_kwh is not None:
+                transactions_to_stop = []
+                self.charger_status_manager.update_uptime(self.id)
+                self.charger_status_manager.add_delivered_energy(self.id, current_energy_kwh)
+
+                # If we have a specific transaction ID, check only that one
+                if transaction_id and str(transaction_id) in self.quota_manager.active_transactions:
+                    updated = [str(transaction_id)]
+                else:
+                    # Only update transactions from the same charger
+                    updated = [tid for tid, transaction in self.quota_manager.active_transactions.items()
+                               if transaction.get("charger_id") == self.id]
+                for tid in updated:
+                    if self.quota_manager.update_transaction_usage(tid, current_energy_kwh, power_w):
+                        transactions_to_stop.append(tid)
+                    elif power_w is not None:
+                        self.schedule_quota_cutoff(tid, power_w)
+
+                # Stop transactions that exceeded quota
+                for tid in transactions_to_stop:
+                    self.cancel_quota_cutoff(tid)
+                    stop_tag = self.quota_manager.active_transactions[tid]["id_tag"]
+                    budget = self.quota_manager.get_budget(stop_tag)
+                    stop_user = budget.full_name if budget else "Unknown"
+                    if self.local_list:
+                        self.local_list.revoke(stop_tag)
+                    logging.warning(f"[QUOTA] Remote stop triggered for {stop_user} (ID {tid}) due to quota exceeded")
+                    self.stop_transaction_remotely(tid)
+
+            if formatted_data is None:
                 return call_result.MeterValuesPayload()
 
+            # Save to meter_data_log.ndjson
+            self.charger_status_manager.append_meter_log(formatted_data)
+
             # Log formatted data
             logging.info(f'[METER] Formatted data:')
             logging.info(f'[METER] ID: {formatted_data["ID"]}')
@@ -522,17 +811,17 @@ class ChargePoint(cp):
     async def on_authorize(self, id_tag: str, **kwargs):
         logging.info(f"[AUTH] RFID Tag {id_tag} requesting authorization on station {self.id}")
 
-        if self.id != "BEDAS01":
-            user_info = self.quota_manager.get_user_info(id_tag)
+        if not self.authorize_all:
+            can_charge, reason = self.quota_manager.can_start_transaction(id_tag)
+            budget = self.quota_manager.budgets.get(id_tag)  # validated by can_start_transaction
 
-            if user_info:
-                can_charge, reason = self.quota_manager.can_start_transaction(id_tag)
+            if budget:
                 if can_charge:
                     status = AuthorizationStatus.accepted
-                    logging.info(f"[AUTH] {id_tag} ({user_info['full_name']}) AUTHORIZED - {reason}")
+                    logging.info(f"[AUTH] {id_tag} ({budget.full_name}) AUTHORIZED - {reason}")
                 else:
                     status = AuthorizationStatus.invalid
-                    logging.warning(f"[AUTH] {id_tag} ({user_info['full_name']}) DENIED - {reason}")
+                    logging.warning(f"[AUTH] {id_tag} ({budget.full_name}) DENIED - {reason}")
             else:
                 status = AuthorizationStatus.invalid
                 logging.warning(f"[AUTH] {id_tag} is NOT authorized - User not found")
@@ -550,29 +839,28 @@ class ChargePoint(cp):
         # Check quota before allowing transaction
         can_charge, reason = self.quota_manager.can_start_transaction(id_tag)
 
-        if not can_charge and self.id != "BEDAS01":
+        if not can_charge and not self.authorize_all:
             logging.warning(f'[TRANSACTION] Start DENIED - Station: {self.id}, RFID: {id_tag}, Reason: {reason}')
             return call_result.StartTransactionPayload(
                 transaction_id=0,  # Invalid transaction ID
                 id_tag_info={'status': AuthorizationStatus.invalid}
             )
 
-        transaction_id = int(time.time())  # Simple transaction ID generation
         meter_start_kwh = self.convert_to_kwh(meter_start)
 
         # Record transaction start
-        self.quota_manager.start_transaction(transaction_id, id_tag, meter_start_kwh, self.id)
+        transaction_id = self.quota_manager.start_transaction(id_tag, meter_start_kwh, self.id)
 
-        self.api_sender.metrics.start_transaction(transaction_id)
+        self.metrics.start_transaction(transaction_id, self.id)
 
-        user_info = self.quota_manager.get_user_info(id_tag)
-        user_name = user_info['full_name'] if user_info else 'Unknown'
+        budget = self.quota_manager.get_budget(id_tag)
+        user_name = budget.full_name if budget else 'Unknown'
 
         logging.info(
             f'[TRANSACTION] Start APPROVED - Station: {self.id}, Connector: {connector_id}, User: {user_name} ({id_tag}), Initial Meter: {meter_start_kwh:.3f}kWh, Transaction ID: {transaction_id}')
 
-        if user_info and user_info['remaining_kwh'] is not None:
-            logging.info(f'[QUOTA] Available quota for {id_tag}: {user_info["remaining_kwh"]:.3f}kWh')
+        if budget and budget.remaining_kwh is not None:
+            logging.info(f'[QUOTA] Available quota for {id_tag}: {budget.remaining_kwh:.3f}kWh')
 
         # Update charger status to Charging
         self.charger_status_manager.update_charger_status(self.id, "Charging", connector_id)
@@ -589,10 +877,11 @@ class ChargePoint(cp):
         was_successful = reason not in ['Error', 'EVDisconnected', 'DeAuthorized', 'EmergencyStop']
 
         meter_stop_kwh = self.convert_to_kwh(meter_stop)
+        self.cancel_quota_cutoff(transaction_id)
 
         # Update quota usage
-        self.quota_manager.end_transaction(transaction_id, meter_stop_kwh)
-        self.api_sender.metrics.end_transaction(transaction_id, was_successful)
+        self.quota_manager.end_transaction(transaction_id, meter_stop_kwh, reason)
+        self.metrics.end_transaction(transaction_id, was_successful, self.id)
 
         logging.info(
             f'[TRANSACTION] Stop completed - Station: {self.id}, Transaction ID: {transaction_id}, Final Meter: {meter_stop_kwh:.3f}kWh, Success: {was_successful}')
@@ -617,7 +906,7 @@ class ChargePoint(cp):
         """Handle StatusNotification with state transition tracking."""
         old_state = self.current_state
         self.current_state = status
-        self.api_sender.metrics.record_state_transition(old_state, status)
+        self.metrics.record_state_transition(old_state, status, self.id)
         
         # Update charger status in file
         self.charger_status_manager.update_charger_status(self.id, status, connector_id)
@@ -629,10 +918,16 @@ class ChargePoint(cp):
 class ChargerStatusManager:
     """Manages charger_status.json file for dashboard integration."""
 
-    def __init__(self):
+    def __init__(self, feed: ChangeFeed = None, progress_interval=PROGRESS_SAVE_INTERVAL):
         self.status_file = DATA_DIR / "charger_status.json"
-        self.meter_log_file = DATA_DIR / "meter_data_log.json"
+        self.meter_log_file = METER_LOG_NDJSON
         self.chargers = {}
+        self._store = SharedJsonMap(self.status_file)
+        self._meter_log = MeterLog(self.meter_log_file)
+        self.feed = feed  # dashboard change feed (optional)
+        self.progress_interval = progress_interval
+        self._progress_dirty = False  # uptime/meter counters not written yet
+        self._progress_saved_at = time.monotonic()
         self.load_charger_status()
         
         # ✅ Initialize empty file if it doesn't exist
@@ -643,61 +938,34 @@ class ChargerStatusManager:
     def load_charger_status(self):
         """Load existing charger status."""
         try:
-            if os.path.exists(self.status_file):
-                with open(self.status_file, 'r', encoding='utf-8') as f:
-                    content = f.read().strip()
-                    if content:  # ✅ Check if file has content
-                        self.chargers = json.loads(content)
-                    else:
-                        logging.warning("[STATUS] charger_status.json is empty, initializing")
-                        self.chargers = {}
-            else:
-                logging.info("[STATUS] charger_status.json does not exist, will create")
-                self.chargers = {}
+            self.chargers = self._store.load()
             logging.info(f"[STATUS] Loaded {len(self.chargers)} chargers from status file")
-        except json.JSONDecodeError as e:
-            logging.error(f"[STATUS] JSON decode error in charger status: {e}, resetting to empty")
-            self.chargers = {}
         except Exception as e:
             logging.error(f"[STATUS] Error loading charger status: {e}")
             self.chargers = {}
 
     def save_charger_status(self):
-        """Save charger status to file with proper error handling and verification."""
+        """
+        Save charger status to file. Only the chargers changed by this worker are
+        written; entries updated by other OCPP workers are merged back in.
+        """
         try:
-            # Ensure directory exists
-            self.status_file.parent.mkdir(parents=True, exist_ok=True)
-            
-            # Write to temporary file first for atomic write
-            tmp_path = self.status_file.with_suffix(".tmp")
-            
-            with open(tmp_path, 'w', encoding='utf-8') as f:
-                json.dump(self.chargers, f, indent=2, ensure_ascii=False)
-                f.flush()
-                os.fsync(f.fileno())  # Force write to disk
-            
-            # Atomic replace (works on Windows and Unix)
-            if os.path.exists(self.status_file):
-                os.remove(self.status_file)
-            os.rename(tmp_path, self.status_file)
-            
-            # ✅ Verify the write was successful
-            with open(self.status_file, 'r', encoding='utf-8') as f:
-                verify = json.load(f)
-                if len(verify) != len(self.chargers):
-                    raise Exception("Verification failed: charger count mismatch")
-            
+            self.chargers = self._store.merge(self.chargers)
+            self._progress_dirty = False
+            self._progress_saved_at = time.monotonic()
+            if self.feed:
+                for charger_id in self._store.merged_keys:
+                    if charger_id in self.chargers:
+                        self.feed.publish("charger", {"id": charger_id, **self.chargers[charger_id]})
             logging.info(f"[STATUS] ✅ Saved {len(self.chargers)} chargers to {self.status_file}")
-            
         except Exception as e:
             logging.error(f"[STATUS] ❌ Error saving charger status: {e}")
-            # Try to restore from temp if it exists
-            if tmp_path.exists():
-                logging.info("[STATUS] Attempting to restore from temp file")
-                try:
-                    os.rename(tmp_path, self.status_file)
-                except:
-                    pass
+
+    def save_progress(self):
+        """Persist uptime and meter counters, at most every progress_interval seconds."""
+        self._progress_dirty = True
+        if time.monotonic() - self._progress_saved_at >= self.progress_interval:
+            self.save_charger_status()
 
     def update_charger_boot(self, charger_id, brand, model):
         """Update charger info on boot notification."""
@@ -788,33 +1056,14 @@ class ChargerStatusManager:
         logging.info(f"[STATUS] ✅ Status updated for {charger_id}: {status}")
 
     def append_meter_log(self, meter_data):
-        """Append meter reading to meter_data_log.json as a JSON array - never resets, only appends."""
+        """Append meter reading to meter_data_log.ndjson (one JSON record per line) - never resets, only appends."""
         try:
-            # Read existing data
-            existing_data = []
-            if self.meter_log_file.exists():
-                try:
-                    with open(self.meter_log_file, "r", encoding="utf-8") as f:
-                        content = f.read().strip()
-                        if content:
-                            existing_data = json.loads(content)
-                            if not isinstance(existing_data, list):
-                                existing_data = []
-                except json.JSONDecodeError:
-                    logging.warning(f"[METER_LOG] Could not parse existing data, starting fresh")
-                    existing_data = []
-                except Exception as e:
-                    logging.error(f"[METER_LOG] Error reading existing log: {e}")
-                    existing_data = []
-            
-            # Append new data
-            existing_data.append(meter_data)
-            
-            # Write back the entire array
-            with open(self.meter_log_file, "w", encoding="utf-8") as f:
-                json.dump(existing_data, f, indent=2, ensure_ascii=False)
-            
-            logging.info(f"[METER_LOG] ✅ Appended meter data to {self.meter_log_file} (Total records: {len(existing_data)})")
+            # One locked append per reading: cost doesn't grow with the history
+            self._meter_log.append(meter_data)
+            if self.feed:
+                self.feed.publish("log", meter_data)
+
+            logging.info(f"[METER_LOG] ✅ Appended meter data to {self.meter_log_file}")
         except Exception as e:
             logging.error(f"[METER_LOG] ❌ Error appending meter data: {e}")
 
@@ -832,7 +1081,7 @@ class ChargerStatusManager:
             boot_time = datetime.fromisoformat(boot_time_str)
             uptime = (datetime.now(timezone.utc) - boot_time).total_seconds() / 3600
             self.chargers[charger_id]["uptime_hours"] = round(uptime, 2)
-        self.save_charger_status()  
+        self.save_progress()
 
     def add_delivered_energy(self, charger_id, delivered_energy_kwh):
         """
@@ -867,7 +1116,7 @@ class ChargerStatusManager:
         if delta > 0.001:
             prev_total = self.chargers[charger_id].get("total_energy_delivered", 0)
             self.chargers[charger_id]["total_energy_delivered"] = round(prev_total + delta, 3)
-            self.save_charger_status()
+            self.save_progress()
             logging.info(f"[STATUS] Updated total_energy_delivered for {charger_id}: +{delta:.3f} kWh (Total: {self.chargers[charger_id]['total_energy_delivered']:.3f} kWh)")
         else:
             # Just update the last reading without saving to reduce I/O
@@ -875,25 +1124,270 @@ class ChargerStatusManager:
     
 
 class CentralSystem:
-    def __init__(self, port=9000, api_url=None, api_key=None, csv_path=None):
+    def __init__(self, config=None, reuse_port=False, worker_id=None):
+        self.config = config or ServerConfig()
         self.chargers = {}
-        self.port = port
-        self.meter_formatter = MeterValueFormatter()
-        self.api_sender = ApiSender(api_url, api_key)
-        self.quota_manager = QuotaManager(csv_path)
-        self.charger_status_manager = ChargerStatusManager()
-
-    async def run_daily_reset(self):
-        """Background task to run monthly reset once a day."""
+        self.reuse_port = reuse_port  # several worker processes bind the same port (SO_REUSEPORT)
+        self.worker_id = worker_id
+        self.open_chargers = set(self.config.open_chargers)  # accept every RFID tag without quota checks
+        self.server = None
+        # One metrics registry per process, shared by every component and charger session
+        self.metrics = PerformanceMetrics()
+        self.meter_formatter = MeterValueFormatter(self.metrics)
+        self.api_sender = ApiSender(self.config.api_url, self.config.api_key, self.metrics)
+        self.feed = ChangeFeed()
+        self.quota_manager = QuotaManager(self.config.csv_path, feed=self.feed)
+        self.charger_status_manager = ChargerStatusManager(feed=self.feed)
+        self.dispatcher = CommandDispatcher(self.chargers, timeout=self.config.command_timeout,
+                                            retries=self.config.command_retries)
+        # List versions come from a counter shared by the workers: a charger that reconnects
+        # to another worker never looks up to date with that worker's list
+        self.local_list = (LocalAuthListManager(self.quota_manager, dispatcher=self.dispatcher,
+                                                version_file=DATA_DIR / "local_list_version.json")
+                           if self.config.local_list_interval else None)
+        self._register_metrics()
+
+    async def run_user_reload(self):
+        """Background task picking up users1.csv changes made by the dashboard without a restart."""
         while True:
+            await asyncio.sleep(self.config.user_reload_interval)
             try:
-                logging.info("[RESET] Daily check for monthly usage reset...")
-                self.quota_manager.reset_monthly_usage()
+                # stat + journal read off the event loop; the swap itself happens on the loop thread
+                changes = await asyncio.to_thread(self.quota_manager.read_user_changes)
+                if changes:
+                    self.quota_manager.apply_user_changes(changes)
+                    if self.local_list:
+                        self.local_list.changed.set()
             except Exception as e:
-                logging.error(f"[RESET] Error during monthly reset check: {e}")
+                logging.error(f"[USER] Error reloading user data: {e}")
 
-            # Sleep for 24 hours (86400 seconds)
-            await asyncio.sleep(86400)
+    async def run_local_list_sync(self):
+        """Background task pushing local authorization list changes to connected chargers."""
+        while True:
+            try:
+                await asyncio.wait_for(self.local_list.changed.wait(), self.config.local_list_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.local_list.changed.clear()
+            try:
+                self.local_list.refresh()
+                targets = [
+                    cp for cp in self.chargers.values()
+                    if not cp.authorize_all
+                    and cp.last_message_time > cp.connected_at  # charger has started talking
+                    and self.local_list.charger_versions.get(cp.id) != self.local_list.version
+                ]
+                await asyncio.gather(*(self.local_list.sync_charger(cp) for cp in targets))
+            except Exception as e:
+                logging.error(f"[LOCAL_LIST] Error during sync: {e}")
+
+    def connection_stats(self):
+        """Open sockets vs charger sessions that are still live (heard from within idle_timeout)."""
+        open_sockets = len(self.server.websockets) if self.server else 0
+        live = sum(
+            1 for cp in self.chargers.values()
+            if cp._connection.open and (self.config.idle_timeout is None or cp.idle_seconds() <= self.config.idle_timeout)
+        )
+        return {"open_sockets": open_sockets, "sessions": len(self.chargers), "live_sessions": live}
+
+    async def close_charger(self, cp, reason):
+        """Close a charger's websocket; on_connect then marks it Offline and releases it."""
+        try:
+            # close() waits at most close_timeout for the peer before dropping the TCP connection
+            await cp._connection.close(code=1001, reason=reason)
+        except Exception as e:
+            logging.error(f"[REAPER] Error closing connection of {cp.id}: {e}")
+
+    async def reap_idle_chargers(self):
+        """Close every session silent for longer than idle_timeout and return how many were closed."""
+        if self.config.idle_timeout is None:
+            return 0
+        idle = []
+        for charge_point_id, cp in list(self.chargers.items()):
+            seconds = cp.idle_seconds()
+            if seconds > self.config.idle_timeout:
+                logging.warning(
+                    f"[REAPER] {charge_point_id} silent for {seconds:.0f}s "
+                    f"(limit {self.config.idle_timeout}s), closing connection")
+                idle.append(cp)
+        # Concurrently: each dead peer can hold its close for the whole close_timeout
+        await asyncio.gather(*(self.close_charger(cp, "idle timeout") for cp in idle))
+        return len(idle)
+
+    async def run_connection_reaper(self):
+        """Background task closing charger sessions that went silent."""
+        while True:
+            await asyncio.sleep(self.config.reaper_interval)
+            try:
+                reaped = await self.reap_idle_chargers()
+                stats = self.connection_stats()
+                self.metrics.update_connection_counts(stats["open_sockets"], stats["live_sessions"])
+                logging.info(
+                    f"[REAPER] Open sockets: {stats['open_sockets']}, sessions: {stats['sessions']}, "
+                    f"live: {stats['live_sessions']}, reaped: {reaped}")
+            except Exception as e:
+                logging.error(f"[REAPER] Error during connection check: {e}")
+
+    def _register_metrics(self):
+        """Gauges read from live state when /metrics is scraped."""
+        registry = self.metrics.registry
+        self.uptime_gauge = registry.gauge("ocpp_uptime_seconds", "Seconds since the OCPP server started")
+        self.connection_gauges = {
+            "sessions": registry.gauge("ocpp_connected_chargers", "Charger sessions held by this process"),
+            "open_sockets": registry.gauge("ocpp_open_sockets", "Open websocket connections"),
+            "live_sessions": registry.gauge("ocpp_live_chargers", "Sessions heard from within idle_timeout"),
+        }
+        self.active_transactions_gauge = registry.gauge(
+            "ocpp_active_transactions", "Active transactions in active_transactions.json (all workers)")
+        self.command_queue_gauge = registry.gauge(
+            "ocpp_command_queue_depth", "Commands waiting to be sent to a charger", ("charger",))
+        self.incoming_queue_gauge = registry.gauge(
+            "ocpp_websocket_incoming_queue", "Received messages not yet handled", ("charger",))
+        self.write_buffer_gauge = registry.gauge(
+            "ocpp_websocket_write_buffer_bytes", "Bytes waiting in the outgoing buffer", ("charger",))
+        self.store_writes = registry.counter(
+            "ocpp_store_writes_total", "Writes of a shared data file by this process", ("file",))
+        self.store_write_seconds = registry.counter(
+            "ocpp_store_write_seconds_total", "Time spent writing a shared data file", ("file",))
+        self.store_last_write_seconds = registry.gauge(
+            "ocpp_store_last_write_seconds", "Duration of the last write of a shared data file", ("file",))
+        registry.add_collector(self.collect_metrics)
+
+    def collect_metrics(self):
+        """Refresh the live-state gauges (runs on the event loop, once per scrape)."""
+        self.uptime_gauge.labels().set(self.metrics.get_uptime())
+        for name, value in self.connection_stats().items():
+            self.connection_gauges[name].labels().set(value)
+        self.active_transactions_gauge.labels().set(len(self.quota_manager.active_transactions))
+        for gauge in (self.command_queue_gauge, self.incoming_queue_gauge, self.write_buffer_gauge):
+            gauge.series.clear()  # only chargers connected right now
+        for charger_id, depth in self.dispatcher.pending().items():
+            self.command_queue_gauge.labels(charger_id).set(depth)
+        for charger_id, cp in self.chargers.items():
+            connection = cp._connection
+            self.incoming_queue_gauge.labels(charger_id).set(len(getattr(connection, "messages", ())))
+            transport = getattr(connection, "transport", None)
+            if transport is not None:
+                self.write_buffer_gauge.labels(charger_id).set(transport.get_write_buffer_size())
+        stores = (self.quota_manager._usage_store, self.quota_manager._tx_store, self.charger_status_manager._store)
+        for store in stores:
+            name = store.path.name
+            self.store_writes.labels(name).value = store.writes
+            self.store_write_seconds.labels(name).value = store.write_seconds
+            self.store_last_write_seconds.labels(name).set(store.last_write_seconds)
+
+    async def run_metrics_reporter(self):
+        """Background task reporting counter rates and latency percentiles of each interval."""
+        labels = {"worker": self.worker_id} if self.worker_id is not None else None
+        reporter = MetricsReporter(self.metrics, self.config.metrics_report_file, labels)
+        while True:
+            await asyncio.sleep(self.config.metrics_report_interval)
+            try:
+                stats = self.connection_stats()
+                self.metrics.update_connection_counts(stats["open_sockets"], stats["live_sessions"])
+                reporter.emit(reporter.report())
+            except Exception as e:
+                logging.error(f"[METRICS] Error reporting metrics: {e}")
+
+    async def serve_metrics(self, request):
+        """GET /metrics: Prometheus text format."""
+        return web.Response(text=self.metrics.registry.render(), content_type="text/plain",
+                            headers={"X-Content-Type-Options": "nosniff"}, charset="utf-8")
+
+    async def start_metrics_api(self):
+        """Serve /metrics on metrics_host:metrics_port."""
+        app = web.Application()
+        app.router.add_get("/metrics", self.serve_metrics)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, self.config.metrics_host, self.config.metrics_port).start()
+        logging.info(f"Metrics listening on http://{self.config.metrics_host}:{self.config.metrics_port}/metrics")
+
+    async def admin_chargers(self, request):
+        """GET /chargers: chargers connected to this process and their pending commands."""
+        return web.json_response({
+            "worker_id": self.worker_id,
+            "chargers": sorted(self.chargers),
+            "pending": self.dispatcher.pending()
+        })
+
+    async def admin_commands(self, request):
+        """
+        POST /commands: send a command to many chargers at once and wait for the results.
+        Body: {"action", "params", "chargers" (default: all connected), "timeout", "retries"}
+        or {"commands": [{"charger_id", "action", "params"}, ...]} for per-charger commands.
+        Chargers not connected to this process are listed in "not_connected".
+        """
+        try:
+            body = await request.json()
+            if body.get("commands") is not None:
+                commands = [(c["charger_id"], c["action"], c.get("params")) for c in body["commands"]]
+            else:
+                targets = body.get("chargers")
+                if targets is None:
+                    targets = sorted(self.chargers)
+                commands = [(charger_id, body["action"], body.get("params")) for charger_id in targets]
+            for _, action, params in commands:
+                CommandDispatcher.build_payload(action, params)  # reject the whole batch before sending anything
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            return web.json_response({"detail": f"Invalid command request: {e}"}, status=400)
+
+        connected = [c for c in commands if c[0] in self.chargers]
+        not_connected = sorted({c[0] for c in commands} - set(self.chargers))
+        logging.info(f"[COMMAND] Admin request: {len(connected)} commands, {len(not_connected)} chargers not connected")
+        results = await self.dispatcher.dispatch(connected, body.get("timeout"), body.get("retries"))
+        return web.json_response({"worker_id": self.worker_id, "results": results, "not_connected": not_connected})
+
+    async def admin_events(self, request):
+        """
+        GET /events?since=N: long-poll the change feed. Answers as soon as there are
+        events after N (or after `timeout` seconds with none). "reset" is true when the
+        follower missed events and should reload its data; omit `since` to start at the end.
+        """
+        try:
+            since = request.query.get("since")
+            timeout = min(float(request.query.get("timeout", 25)), 60)
+            since = self.feed.seq if since is None else int(since)
+        except ValueError:
+            return web.json_response({"detail": "since and timeout must be numbers"}, status=400)
+        events = await self.feed.wait(since, timeout)
+        return web.json_response({
+            "feed": self.feed.feed_id,
+            "seq": self.feed.seq,
+            "reset": events is None,
+            "events": events or []
+        })
+
+    async def admin_publish(self, request):
+        """
+        POST /events: publish a dashboard-side change ({"type", "data"}) on the change feed,
+        so every dashboard worker following the feed passes it on to its browsers.
+        """
+        try:
+            body = await request.json()
+            event_type, data = str(body["type"]), body.get("data")
+        except (ValueError, KeyError, TypeError) as e:
+            return web.json_response({"detail": f"Invalid event: {e}"}, status=400)
+        self.feed.publish(event_type, data)
+        return web.json_response({"feed": self.feed.feed_id, "seq": self.feed.seq})
+
+    @web.middleware
+    async def admin_auth(self, request, handler):
+        if not hmac.compare_digest(request.headers.get("X-Admin-Token", "").encode(), self.config.admin_token.encode()):
+            return web.json_response({"detail": "Invalid admin token"}, status=401)
+        return await handler(request)
+
+    async def start_admin_api(self):
+        """Serve the admin API on 127.0.0.1:admin_port (requests must carry admin_token)."""
+        app = web.Application(middlewares=[self.admin_auth])
+        app.router.add_get("/chargers", self.admin_chargers)
+        app.router.add_post("/commands", self.admin_commands)
+        app.router.add_get("/events", self.admin_events)
+        app.router.add_post("/events", self.admin_publish)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", self.config.admin_port).start()
+        logging.info(f"Admin API listening on http://127.0.0.1:{self.config.admin_port}")
 
     def configure_api(self, api_url: str, api_key: str = None):
         """Configure the API endpoint and key."""
@@ -902,6 +1396,7 @@ class CentralSystem:
     async def on_connect(self, websocket, path):
         """Handle incoming WebSocket connections."""
         charge_point_id = path.strip("/")
+        cp = None
 
         try:
             cp = ChargePoint(
@@ -910,9 +1405,18 @@ class CentralSystem:
                 self.meter_formatter,
                 self.api_sender,
                 self.quota_manager,
-                self.charger_status_manager
+                self.charger_status_manager,
+                self.local_list,
+                self.dispatcher,
+                self.metrics,
+                authorize_all=charge_point_id in self.open_chargers
             )
+            previous = self.chargers.get(charge_point_id)
             self.chargers[charge_point_id] = cp
+            if previous is not None:
+                # Charger reconnected before its old socket was detected dead: release the stale session
+                logging.warning(f"[CONNECT] {charge_point_id} reconnected, closing stale session")
+                asyncio.create_task(self.close_charger(previous, "replaced by new connection"))
 
             # ✅ Fallback: immediately register charger in charger_status.json
             try:
@@ -943,40 +1447,72 @@ class CentralSystem:
             except Exception as e:
                 logging.error(f"[CONNECT] Could not update charger_status.json: {e}")
 
-            # ✅ Add connection metrics
-            self.api_sender.metrics.connection_start_time = datetime.now(timezone.utc)
-            self.api_sender.metrics.last_connection_time = datetime.now(timezone.utc)
+            # ✅ Add connection metrics (per charger; the server's uptime starts in start())
+            self.metrics.record_connect(charge_point_id)
 
             logging.info(f"[CONNECT] Charger {charge_point_id} connected")
 
             # ⚙️ Start listening for messages — blocking until disconnect
             await cp.start()
 
+        except websockets.exceptions.ConnectionClosed as e:
+            logging.info(f"[CONNECT] Connection of {charge_point_id} closed: {e}")
+
         except Exception as e:
             logging.error(f"[CONNECT] Error on connection: {e}")
 
         finally:
-            # ✅ When disconnected, mark as Offline
-            self.charger_status_manager.update_charger_status(charge_point_id, "Offline")
-            if charge_point_id in self.chargers:
+            if cp is not None:
+                cp.cancel_all_quota_cutoffs()
+            # ✅ When disconnected, mark as Offline — unless a newer connection of the same charger took over
+            replaced = self.chargers.get(charge_point_id) is not cp
+            if not replaced:
                 del self.chargers[charge_point_id]
+                if self.local_list:
+                    self.local_list.forget_charger(charge_point_id)
+                # The charger may reconnect to another worker: hand over its throttled meter progress
+                self.quota_manager.flush_progress()
+                self.charger_status_manager.update_charger_status(charge_point_id, "Offline")
+            self.metrics.record_websocket_disconnect(charge_point_id, replaced=replaced)
             logging.info(f"[CONNECT] Charger {charge_point_id} disconnected")
 
     async def start(self):
         """Start the OCPP server."""
-        server = await serve(
+        self.metrics.connection_start_time = datetime.now(timezone.utc)
+        self.server = server = await serve(
             self.on_connect,
             "0.0.0.0",
-            self.port,
+            self.config.port,
             subprotocols=["ocpp1.6"],
-            ping_interval=None,
-            ping_timeout=None
+            ping_interval=self.config.ping_interval,
+            ping_timeout=self.config.ping_timeout,
+            reuse_port=self.reuse_port,
+            max_size=self.config.max_size,
+            max_queue=self.config.max_queue,
+            write_limit=self.config.write_limit,
+            compression=self.config.compression
         )
-        logging.info(f'OCPP Server started on port {self.port}')
-        logging.info(f'Chargers can connect via: ws://<host>:{self.port}/<charger_id>')
-
-        # Start daily background reset task
-        asyncio.create_task(self.run_daily_reset())
+        if self.worker_id is not None:
+            logging.info(f'OCPP worker {self.worker_id} (pid {os.getpid()}) started on port {self.config.port}')
+        else:
+            logging.info(f'OCPP Server started on port {self.config.port}')
+        logging.info(f'Chargers can connect via: ws://<host>:{self.config.port}/<charger_id>')
+
+        # Background tasks (monthly rollover needs none: usage is bucketed per period)
+        asyncio.create_task(self.run_connection_reaper())
+        if self.config.user_reload_interval:
+            asyncio.create_task(self.run_user_reload())
+        if self.local_list:
+            asyncio.create_task(self.run_local_list_sync())
+        if self.config.metrics_report_interval:
+            asyncio.create_task(self.run_metrics_reporter())
+        if self.config.admin_port and not self.config.admin_token:
+            # Anyone able to reach the port could reset or stop every charger
+            logging.error("[ADMIN] Admin API disabled: set OCPP_ADMIN_TOKEN to enable it")
+        elif self.config.admin_port:
+            await self.start_admin_api()
+        if self.config.metrics_port:
+            await self.start_metrics_api()
         await server.wait_closed()
 
     def get_quota_status(self, id_tag=None):
@@ -990,18 +1526,100 @@ class CentralSystem:
             return status
 
 
+def run_event_loop(coro, loop_name="asyncio"):
+    """Run `coro` on the requested event loop ("asyncio" or "uvloop"), falling back to asyncio."""
+    if loop_name == "uvloop":
+        try:
+            import uvloop
+        except ImportError:
+            logging.warning("[LOOP] uvloop is not installed, falling back to the default asyncio loop")
+        else:
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+            logging.info("[LOOP] Using uvloop event loop")
+    elif loop_name != "asyncio":
+        logging.warning(f"[LOOP] Unknown event loop '{loop_name}', using the default asyncio loop")
+    return asyncio.run(coro)
+
+
+def run_worker(worker_id, config):
+    """Entry point of one OCPP worker process."""
+    try:
+        central_system = CentralSystem(config.for_worker(worker_id), reuse_port=True, worker_id=worker_id)
+        run_event_loop(central_system.start(), config.event_loop)
+    except KeyboardInterrupt:
+        pass
+
+
+# Delay before restarting a worker that died: doubles from the first to the second value while it
+# keeps dying within WORKER_STABLE_SECONDS of its start, so a crash loop does not spin the CPU
+WORKER_RESTART_DELAY = (1, 60)
+WORKER_STABLE_SECONDS = 60
+
+
+def run_workers(config):
+    """
+    Run `config.workers` OCPP server processes bound to the same port with SO_REUSEPORT.
+    The kernel spreads incoming charger connections across them; quota, transaction
+    and charger state are coordinated through the shared data files.
+    Workers that die are restarted, with a growing delay when they keep crashing.
+    """
+    processes = {}
+    started = {}  # worker_id -> monotonic start time
+    delays = {}  # worker_id -> last restart delay
+    restarts = {}  # worker_id -> monotonic time of a scheduled restart
+
+    def spawn(worker_id):
+        process = multiprocessing.Process(
+            target=run_worker, args=(worker_id, config), name=f"ocpp-worker-{worker_id}", daemon=True
+        )
+        process.start()
+        processes[worker_id] = process
+        started[worker_id] = time.monotonic()
+        logging.info(f"[WORKERS] Started worker {worker_id} (pid {process.pid})")
+
+    for worker_id in range(config.workers):
+        spawn(worker_id)
+
+    try:
+        while True:
+            timeout = max(0, min(restarts.values()) - time.monotonic()) if restarts else None
+            wait_for_processes([p.sentinel for w, p in processes.items() if w not in restarts], timeout)
+            now = time.monotonic()
+            for worker_id, process in list(processes.items()):
+                if worker_id in restarts or process.is_alive():
+                    continue
+                if now - started[worker_id] >= WORKER_STABLE_SECONDS:
+                    delays[worker_id] = 0
+                else:
+                    first, longest = WORKER_RESTART_DELAY
+                    delays[worker_id] = min(max(delays.get(worker_id, 0) * 2, first), longest)
+                restarts[worker_id] = now + delays[worker_id]
+                logging.error(f"[WORKERS] Worker {worker_id} exited with code {process.exitcode}, "
+                              f"restarting in {delays[worker_id]}s")
+            for worker_id, restart_at in list(restarts.items()):
+                if restart_at <= now:
+                    del restarts[worker_id]
+                    spawn(worker_id)
+    finally:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.join(timeout=5)
+
+
 def main():
     try:
         logging.info("Starting OCPP Central System with Quota Management...")
         logging.info(f"Data directory: {DATA_DIR}")
-        
-        central_system = CentralSystem(
-            port=9000,
-            api_url='http://144.122.166.37:3005/api/readings/',
-            api_key='None',
-            csv_path=DATA_DIR / 'users1.csv'
-        )
-        asyncio.run(central_system.start())
+        # Data file migrations run once here, before any worker opens the files
+        MeterLog(METER_LOG_NDJSON).migrate(LEGACY_METER_LOG_JSON)
+
+        config = ServerConfig.from_env()
+        if config.workers > 1:
+            run_workers(config)
+        else:
+            central_system = CentralSystem(config)
+            run_event_loop(central_system.start(), config.event_loop)
     except KeyboardInterrupt:
         logging.info("Server stopped by user")
     except Exception as e:
@@ -1,11 +1,293 @@
+import bisect
+import json
 import logging
+import math
 from datetime import datetime
-from collections import defaultdict
+from collections import defaultdict, deque
 import time
 import datetime
 
-class PerformanceMetrics:
+# Histogram buckets: SUB_BUCKETS linear steps per power of two (about 3% relative error)
+SUB_BUCKETS = 32
+MIN_VALUE = 1e-9
+PERCENTILES = (50, 90, 99)
+# Sliding windows (seconds) and the rings of slots they are answered from: (slot seconds, slots)
+WINDOWS = {"1m": 60, "5m": 300, "1h": 3600}
+WINDOW_RINGS = ((10, 30), (60, 60))
+# Labeled series kept per metric; label values beyond that are counted under OVERFLOW_LABEL
+MAX_SERIES = 2000
+OVERFLOW_LABEL = "other"
+# Upper bounds of the cumulative buckets histograms are exported with (Prometheus "le")
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+DURATION_BUCKETS = (60, 300, 900, 1800, 3600, 7200, 14400, 28800, 86400)
+
+
+def bucket_index(value):
+    """HDR-style log-linear bucket of a positive value."""
+    mantissa, exponent = math.frexp(max(value, MIN_VALUE))  # value = mantissa * 2**exponent, 0.5 <= mantissa < 1
+    return exponent * SUB_BUCKETS + int((mantissa * 2 - 1) * SUB_BUCKETS)
+
+
+def bucket_value(index):
+    """Midpoint of a bucket."""
+    exponent, sub = divmod(index, SUB_BUCKETS)
+    return (1 + (sub + 0.5) / SUB_BUCKETS) * 2.0 ** (exponent - 1)
+
+
+class StreamingHistogram:
+    """Count, sum, min, max and log-bucket counts of a stream of values, in constant memory."""
+
     def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+        self.buckets = defaultdict(int)  # bucket index -> count; only buckets that were hit
+
+    def record(self, value, index=None):
+        """Add a value; `index` is its bucket_index() when the caller already computed it."""
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.buckets[bucket_index(value) if index is None else index] += 1
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        for index, count in other.buckets.items():
+            self.buckets[index] += count
+        return self
+
+    def copy(self):
+        return StreamingHistogram().merge(self)
+
+    def since(self, earlier):
+        """Histogram of the values recorded after `earlier` (a copy() of this one); min/max to a bucket's width."""
+        delta = StreamingHistogram()
+        delta.count = self.count - earlier.count
+        delta.total = self.total - earlier.total
+        for index, count in self.buckets.items():
+            count -= earlier.buckets.get(index, 0)
+            if count > 0:
+                delta.buckets[index] = count
+        if delta.buckets:
+            delta.min = max(bucket_value(min(delta.buckets)), self.min)
+            delta.max = min(bucket_value(max(delta.buckets)), self.max)
+        return delta
+
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+    def percentile(self, percent):
+        """Approximate percentile (within a bucket's width), clamped to the exact min/max."""
+        if not self.count:
+            return 0
+        rank = max(1, math.ceil(self.count * percent / 100))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(max(bucket_value(index), self.min), self.max)
+        return self.max
+
+    def summary(self):
+        summary = {"count": self.count, "avg": self.mean(), "min": self.min if self.count else 0, "max": self.max}
+        for percent in PERCENTILES:
+            summary[f"p{percent}"] = self.percentile(percent)
+        return summary
+
+
+class WindowedHistogram:
+    """
+    A StreamingHistogram over all values plus rings of per-slot histograms for the
+    sliding windows in WINDOWS (last 1 m / 5 m from 10 s slots, last 1 h from 1 min
+    slots). Windows are exact to one slot.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.all = StreamingHistogram()
+        self.rings = [(slot_seconds, deque(maxlen=slots)) for slot_seconds, slots in WINDOW_RINGS]
+
+    def record(self, value, index=None):
+        if index is None:
+            index = bucket_index(value)
+        self.all.record(value, index)
+        now = self.clock()
+        for slot_seconds, ring in self.rings:
+            slot = int(now // slot_seconds)
+            if not ring or ring[-1][0] != slot:
+                ring.append((slot, StreamingHistogram()))
+            ring[-1][1].record(value, index)
+
+    def window(self, seconds):
+        """Histogram of the values recorded in the last `seconds` (one of WINDOWS)."""
+        slot_seconds, ring = next((s, r) for s, r in self.rings if s * r.maxlen >= seconds)
+        first = int(self.clock() // slot_seconds) - seconds // slot_seconds + 1
+        merged = StreamingHistogram()
+        for slot, histogram in ring:
+            if slot >= first:
+                merged.merge(histogram)
+        return merged
+
+    def summary(self):
+        """{"all": ..., "1m": ..., "5m": ..., "1h": ...} of StreamingHistogram.summary()."""
+        summary = {"all": self.all.summary()}
+        for name, seconds in WINDOWS.items():
+            summary[name] = self.window(seconds).summary()
+        return summary
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Gauge:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+
+class MetricFamily:
+    """
+    A named metric and its series, one per combination of label values. The number
+    of series is capped at max_series: values first seen after that (e.g. a flood of
+    unknown charger IDs) all go to one series labeled OVERFLOW_LABEL.
+    """
+
+    def __init__(self, name, kind, help, labelnames, factory, max_series=MAX_SERIES, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.kind = kind  # "counter", "gauge" or "histogram"
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.factory = factory
+        self.max_series = max_series
+        self.buckets = tuple(buckets)
+        self.series = {}  # label values -> Counter / Gauge / StreamingHistogram
+
+    def labels(self, *values):
+        series = self.series.get(values)
+        if series is None:
+            if len(self.series) >= self.max_series:
+                values = (OVERFLOW_LABEL,) * len(self.labelnames)
+                series = self.series.get(values)
+            if series is None:
+                series = self.series[values] = self.factory()
+        return series
+
+    def remove(self, *values):
+        self.series.pop(values, None)
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _number(value):
+    if value != value:
+        return "NaN"
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """
+    Labeled counters, gauges and histograms of one process, registered once by name.
+    Collectors added with add_collector() run before each render() to set gauges from
+    live state (connected chargers, queue depths, ...) only when somebody asks.
+    """
+
+    def __init__(self, max_series=MAX_SERIES):
+        self.max_series = max_series
+        self.families = {}
+        self.collectors = []
+
+    def _family(self, name, kind, help, labelnames, factory, buckets=LATENCY_BUCKETS):
+        family = self.families.get(name)
+        if family is None:
+            family = self.families[name] = MetricFamily(name, kind, help, labelnames, factory, self.max_series, buckets)
+        elif family.kind != kind or family.labelnames != tuple(labelnames):
+            raise ValueError(f"Metric {name} is already registered as a {family.kind} with labels {family.labelnames}")
+        return family
+
+    def counter(self, name, help, labelnames=()):
+        return self._family(name, "counter", help, labelnames, Counter)
+
+    def gauge(self, name, help, labelnames=()):
+        return self._family(name, "gauge", help, labelnames, Gauge)
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._family(name, "histogram", help, labelnames, StreamingHistogram, buckets)
+
+    def add_collector(self, collect):
+        """Call `collect()` before every render()."""
+        self.collectors.append(collect)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        for collect in self.collectors:
+            try:
+                collect()
+            except Exception as e:
+                logging.error(f"[METRICS] Collector {getattr(collect, '__name__', collect)} failed: {e}")
+        lines = []
+        for family in list(self.families.values()):
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for values, series in list(family.series.items()):
+                labels = ",".join(f'{name}="{_label_value(value)}"' for name, value in zip(family.labelnames, values))
+                if family.kind != "histogram":
+                    lines.append(f"{family.name}{{{labels}}} {_number(series.value)}" if labels
+                                 else f"{family.name} {_number(series.value)}")
+                    continue
+                # Log buckets are folded into the family's "le" bounds by their midpoint
+                counts = [0] * (len(family.buckets) + 1)
+                for index, count in list(series.buckets.items()):
+                    counts[bisect.bisect_left(family.buckets, bucket_value(index))] += count
+                prefix = f"{labels}," if labels else ""
+                cumulative = 0
+                for bound, count in zip((*family.buckets, float('inf')), counts):
+                    cumulative += count
+                    lines.append(f'{family.name}_bucket{{{prefix}le="{_number(bound)}"}} {cumulative}')
+                suffix = f"{{{labels}}}" if labels else ""
+                lines.append(f"{family.name}_sum{suffix} {_number(series.total)}")
+                lines.append(f"{family.name}_count{suffix} {series.count}")
+        return "\n".join(lines) + "\n"
+
+
+class PerformanceMetrics:
+    """
+    Metrics of one OCPP process. Created once by CentralSystem and shared by the
+    ApiSender, the MeterValueFormatter and every ChargePoint. Besides the process-wide
+    totals below, everything is recorded in `registry` per charger and OCPP action.
+    """
+
+    def __init__(self, registry: MetricsRegistry = None):
+        self.registry = registry or MetricsRegistry()
+        self._register()
+
         # API Performance
         self.min_api_time = float('inf')
         self.max_api_time = 0
@@ -29,24 +311,58 @@ class PerformanceMetrics:
         # New Transaction Metrics
         self.transaction_count = 0
         self.failed_transactions = 0
-        self.transaction_durations = []
+        self.transaction_durations = WindowedHistogram()
         self.current_transactions = {}  # {transaction_id: start_time}
         self.transaction_interruptions = defaultdict(int)
         self.state_transitions = defaultdict(lambda: defaultdict(int))  # {from_state: {to_state: count}}
         
         # New WebSocket Metrics
-        self.message_latencies = []
+        self.message_latencies = WindowedHistogram()
         self.max_message_latency = 0
         self.min_message_latency = float('inf')
         self.failed_messages = 0
         self.message_queue_size = 0
         self.websocket_disconnects = 0
+        self.open_connections = 0
+        self.live_connections = 0
         self.last_message_time = None
         self.total_messages_sent = 0
         self.total_messages_received = 0
 
+    def _register(self):
+        registry = self.registry
+        self.messages = registry.counter(
+            "ocpp_messages_total", "OCPP messages handled (in) or sent (out)", ("charger", "action", "direction"))
+        self.message_failures = registry.counter(
+            "ocpp_message_failures_total", "OCPP messages that failed", ("charger", "action", "direction"))
+        self.message_seconds = registry.histogram(
+            "ocpp_message_latency_seconds", "Handler time of incoming calls, round trip of outgoing calls",
+            ("charger", "action", "direction"))
+        self.transactions_started = registry.counter(
+            "ocpp_transactions_started_total", "Transactions started", ("charger",))
+        self.transactions_failed = registry.counter(
+            "ocpp_transactions_failed_total", "Transactions that ended with an error reason", ("charger",))
+        self.transaction_seconds = registry.histogram(
+            "ocpp_transaction_duration_seconds", "Duration of completed transactions", ("charger",),
+            buckets=DURATION_BUCKETS)
+        self.status_changes = registry.counter(
+            "ocpp_status_changes_total", "StatusNotifications by new status", ("charger", "status"))
+        self.charger_connected = registry.gauge(
+            "ocpp_charger_connected", "1 while the charger has a websocket to this process", ("charger",))
+        self.charger_connected_since = registry.gauge(
+            "ocpp_charger_connected_since_seconds", "Unix time the current connection was opened", ("charger",))
+        self.disconnects = registry.counter(
+            "ocpp_websocket_disconnects_total", "Websocket connections closed", ("charger",))
+        self.meter_seconds = registry.histogram(
+            "ocpp_meter_format_seconds", "Time to format a MeterValues message", ("charger",))
+        self.api_requests = registry.counter(
+            "ocpp_api_requests_total", "Meter data POSTs to the readings API", ("result",))
+        self.api_seconds = registry.histogram("ocpp_api_request_seconds", "Readings API response time")
+
     def update_api_timing(self, response_time: float, success: bool):
         self.current_api_time = response_time
+        self.api_requests.labels("success" if success else "failure").inc()
+        self.api_seconds.labels().record(response_time)
         if success:
             self.min_api_time = min(self.min_api_time, response_time)
             self.max_api_time = max(self.max_api_time, response_time)
@@ -55,8 +371,9 @@ class PerformanceMetrics:
             self.api_failure += 1
         self.last_api_call_time = datetime.datetime.now(datetime.UTC)
 
-    def update_meter_timing(self, process_time: float):
+    def update_meter_timing(self, process_time: float, charger: str = "unknown"):
         self.current_meter_process_time = process_time
+        self.meter_seconds.labels(charger).record(process_time)
         self.min_meter_process_time = min(self.min_meter_process_time, process_time)
         self.max_meter_process_time = max(self.max_meter_process_time, process_time)
         self.total_meter_process_time += process_time
@@ -74,32 +391,41 @@ class PerformanceMetrics:
             return 0
         return (datetime.datetime.now(datetime.UTC) - self.connection_start_time).total_seconds()
 
-    def start_transaction(self, transaction_id):
+    def start_transaction(self, transaction_id, charger: str = "unknown"):
         """Record the start of a transaction."""
         self.current_transactions[transaction_id] = datetime.datetime.now(datetime.UTC)
         self.transaction_count += 1
+        self.transactions_started.labels(charger).inc()
 
-    def end_transaction(self, transaction_id, was_successful=True):
+    def end_transaction(self, transaction_id, was_successful=True, charger: str = "unknown"):
         """Record the end of a transaction."""
         if transaction_id in self.current_transactions:
             duration = (datetime.datetime.now(datetime.UTC) - self.current_transactions[transaction_id]).total_seconds()
-            self.transaction_durations.append(duration)
+            self.transaction_durations.record(duration)
+            self.transaction_seconds.labels(charger).record(duration)
             del self.current_transactions[transaction_id]
             if not was_successful:
                 self.failed_transactions += 1
+                self.transactions_failed.labels(charger).inc()
 
-    def record_state_transition(self, from_state, to_state):
+    def record_state_transition(self, from_state, to_state, charger: str = "unknown"):
         """Record a state transition."""
         self.state_transitions[from_state][to_state] += 1
+        self.status_changes.labels(charger, to_state).inc()
         if to_state == "Available" and from_state == "Charging":
             self.transaction_interruptions[from_state] += 1
 
-    def record_message_metrics(self, latency, is_sent=True, failed=False):
+    def record_message_metrics(self, latency, is_sent=True, failed=False, charger="unknown", action="unknown"):
         """Record WebSocket message metrics."""
+        labels = (charger, action, "out" if is_sent else "in")
         if failed:
             self.failed_messages += 1
+            self.message_failures.labels(*labels).inc()
         else:
-            self.message_latencies.append(latency)
+            index = bucket_index(latency)
+            self.message_latencies.record(latency, index)
+            self.messages.labels(*labels).inc()
+            self.message_seconds.labels(*labels).record(latency, index)
             self.max_message_latency = max(self.max_message_latency, latency)
             self.min_message_latency = min(self.min_message_latency, latency)
             if is_sent:
@@ -112,9 +438,30 @@ class PerformanceMetrics:
         """Update the message queue size."""
         self.message_queue_size = size
 
-    def record_websocket_disconnect(self):
-        """Record a WebSocket disconnection."""
+    def record_connect(self, charger):
+        """Record a charger's new websocket connection."""
+        self.last_connection_time = datetime.datetime.now(datetime.UTC)
+        self.charger_connected.labels(charger).set(1)
+        self.charger_connected_since.labels(charger).set(time.time())
+
+    def record_websocket_disconnect(self, charger=None, replaced=False):
+        """Record a WebSocket disconnection (`replaced`: the charger already reconnected)."""
         self.websocket_disconnects += 1
+        if charger is not None:
+            self.disconnects.labels(charger).inc()
+            if not replaced:
+                self.charger_connected.labels(charger).set(0)
+                self.charger_connected_since.remove(charger)
+
+    def get_charger_uptime(self, charger) -> float:
+        """Seconds since the charger's current connection was opened (0 when not connected)."""
+        since = self.charger_connected_since.series.get((charger,))
+        return time.time() - since.value if since is not None else 0
+
+    def update_connection_counts(self, open_connections, live_connections):
+        """Record open sockets vs sessions that are still sending messages."""
+        self.open_connections = open_connections
+        self.live_connections = live_connections
 
     def get_transaction_success_rate(self) -> float:
         """Calculate transaction success rate."""
@@ -123,11 +470,51 @@ class PerformanceMetrics:
 
     def get_average_transaction_duration(self) -> float:
         """Calculate average transaction duration."""
-        return sum(self.transaction_durations) / len(self.transaction_durations) if self.transaction_durations else 0
+        return self.transaction_durations.all.mean()
 
     def get_average_message_latency(self) -> float:
         """Calculate average message latency."""
-        return sum(self.message_latencies) / len(self.message_latencies) if self.message_latencies else 0
+        return self.message_latencies.all.mean()
+
+    def get_message_latency_summary(self) -> dict:
+        """Message latency count/avg/min/max/p50/p90/p99, overall and for the last 1 m / 5 m / 1 h."""
+        return self.message_latencies.summary()
+
+    def get_transaction_duration_summary(self) -> dict:
+        """Transaction duration count/avg/min/max/p50/p90/p99, overall and for the last 1 m / 5 m / 1 h."""
+        return self.transaction_durations.summary()
+
+    def snapshot(self) -> dict:
+        """Cumulative counters, current gauges and copies of the histograms, for MetricsReporter."""
+        meter_seconds = StreamingHistogram()
+        for histogram in list(self.meter_seconds.series.values()):
+            meter_seconds.merge(histogram)
+        return {
+            "counters": {
+                "messages_sent": self.total_messages_sent,
+                "messages_received": self.total_messages_received,
+                "failed_messages": self.failed_messages,
+                "api_success": self.api_success,
+                "api_failure": self.api_failure,
+                "meter_readings": self.meter_process_count,
+                "transactions_started": self.transaction_count,
+                "transactions_failed": self.failed_transactions,
+                "websocket_disconnects": self.websocket_disconnects,
+            },
+            "gauges": {
+                "uptime_seconds": round(self.get_uptime(), 1),
+                "open_connections": self.open_connections,
+                "live_connections": self.live_connections,
+                "active_transactions": len(self.current_transactions),
+                "message_queue_size": self.message_queue_size,
+            },
+            "histograms": {
+                "message_latency": self.message_latencies.all.copy(),
+                "transaction_duration": self.transaction_durations.all.copy(),
+                "api_response": self.api_seconds.labels().copy(),
+                "meter_processing": meter_seconds,
+            },
+        }
 
     def log_metrics(self):
         current_time = datetime.datetime.now(datetime.UTC)
@@ -155,6 +542,9 @@ class PerformanceMetrics:
         logging.info(f"Failed Transactions: {self.failed_transactions}")
         logging.info(f"Transaction Success Rate: {self.get_transaction_success_rate():.1f}%")
         logging.info(f"Average Transaction Duration: {self.get_average_transaction_duration():.1f}s")
+        durations = self.transaction_durations.all
+        logging.info(f"Transaction Duration - p50/p90/p99: {durations.percentile(50):.1f}s/"
+                     f"{durations.percentile(90):.1f}s/{durations.percentile(99):.1f}s")
         logging.info(f"Active Transactions: {len(self.current_transactions)}")
         logging.info(f"Transaction Interruptions: {sum(self.transaction_interruptions.values())}")
         
@@ -165,9 +555,64 @@ class PerformanceMetrics:
         logging.info(f"Message Latency - Min: {self.min_message_latency:.3f}s")
         logging.info(f"Message Latency - Max: {self.max_message_latency:.3f}s")
         logging.info(f"Message Latency - Avg: {self.get_average_message_latency():.3f}s")
+        for name, seconds in (("all", None), *WINDOWS.items()):
+            latencies = self.message_latencies.all if seconds is None else self.message_latencies.window(seconds)
+            logging.info(f"Message Latency ({name}) - p50/p90/p99: {latencies.percentile(50):.3f}s/"
+                         f"{latencies.percentile(90):.3f}s/{latencies.percentile(99):.3f}s ({latencies.count} messages)")
         logging.info(f"WebSocket Disconnections: {self.websocket_disconnects}")
+        logging.info(f"Open/Live Connections: {self.open_connections}/{self.live_connections}")
         
         logging.info("\n--- Connection Status ---")
         logging.info(f"Uptime: {self.get_uptime():.1f} seconds")
         logging.info(f"Connection Drops: {self.connection_drops}")
-        logging.info("========================\n")
\ No newline at end of file
+        logging.info("========================\n")
+
+
+class MetricsReporter:
+    """
+    Periodic report of a PerformanceMetrics: totals, deltas and per-second rates of the
+    counters since the previous report, current gauges and the histogram summaries of
+    the interval, as one JSON record. Records are logged as a single `[METRICS]` line
+    and, when `path` is set, appended to that file one per line.
+    """
+
+    def __init__(self, metrics: PerformanceMetrics, path=None, labels=None, clock=time.monotonic):
+        self.metrics = metrics
+        self.path = path
+        self.labels = labels or {}  # e.g. {"worker": 0}, added to every record
+        self.clock = clock
+        self.previous = metrics.snapshot()
+        self.previous_time = clock()
+
+    def report(self) -> dict:
+        """Build the record for the interval since the previous report and start a new interval."""
+        now = self.clock()
+        snapshot = self.metrics.snapshot()
+        elapsed = now - self.previous_time
+        counters = snapshot["counters"]
+        deltas = {name: value - self.previous["counters"].get(name, 0) for name, value in counters.items()}
+        api_calls = deltas["api_success"] + deltas["api_failure"]
+        record = {
+            "time": datetime.datetime.now(datetime.UTC).isoformat(),
+            **self.labels,
+            "interval_seconds": round(elapsed, 3),
+            "totals": counters,
+            "deltas": deltas,
+            "rates": {name: round(delta / elapsed, 4) if elapsed > 0 else 0 for name, delta in deltas.items()},
+            "api_success_rate": round(deltas["api_success"] / api_calls * 100, 1) if api_calls else None,
+            "gauges": snapshot["gauges"],
+        }
+        for name, histogram in snapshot["histograms"].items():
+            record[name] = histogram.since(self.previous["histograms"][name]).summary()
+        self.previous, self.previous_time = snapshot, now
+        return record
+
+    def emit(self, record):
+        line = json.dumps(record, separators=(",", ":"))
+        logging.info(f"[METRICS] {line}")
+        if self.path:
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            except OSError as e:
+                logging.error(f"[METRICS] Error writing metrics report to {self.path}: {e}")
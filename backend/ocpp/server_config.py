@@ -0,0 +1,75 @@
+import os
+from dataclasses import dataclass, replace
+from typing import Optional
+
+# Where main() forwards meter readings
+READINGS_API_URL = "http://144.122.166.37:3005/api/readings/"
+
+
+@dataclass(frozen=True)
+class ServerConfig:
+    """
+    Settings of a CentralSystem. The defaults suit tests and embedding (side APIs off);
+    from_env() builds what main() runs with from the OCPP_* environment variables.
+    """
+    port: int = 9000
+    api_url: Optional[str] = None
+    api_key: Optional[str] = None
+    csv_path: Optional[str] = None  # None: DATA_DIR/users1.csv
+    open_chargers: tuple = ("BEDAS01",)  # chargers that accept every RFID tag without quota checks
+    # Processes: SO_REUSEPORT workers (1 = single process) and "asyncio" or "uvloop"
+    workers: int = 1
+    event_loop: str = "asyncio"
+    # Websocket server tuning, passed straight to websockets.serve
+    max_size: Optional[int] = 2 ** 20  # largest accepted frame in bytes (None = unlimited)
+    max_queue: int = 32  # incoming messages buffered per connection
+    write_limit: int = 2 ** 16  # high-water mark of the outgoing buffer in bytes
+    compression: Optional[str] = "deflate"  # None disables permessage-deflate
+    # Keepalive: protocol pings detect dead TCP peers, the reaper closes sessions
+    # that sent no OCPP message for idle_timeout seconds (None disables either)
+    ping_interval: Optional[float] = 30
+    ping_timeout: Optional[float] = 30
+    idle_timeout: Optional[float] = 300
+    reaper_interval: float = 60
+    user_reload_interval: float = 5  # seconds between users1.csv change checks
+    local_list_interval: Optional[float] = 30  # max seconds between local list refreshes (None = off)
+    command_timeout: float = 30
+    command_retries: int = 2
+    # Admin HTTP API on localhost for the dashboard; only started with a token (None disables it)
+    admin_port: Optional[int] = None
+    admin_token: Optional[str] = None
+    # Prometheus /metrics on a side port (None disables it)
+    metrics_port: Optional[int] = None
+    metrics_host: str = "127.0.0.1"
+    # Periodic metrics report: one JSON record per interval in the log and optionally a file (None disables it)
+    metrics_report_interval: Optional[float] = 60
+    metrics_report_file: Optional[str] = None
+
+    @classmethod
+    def from_env(cls, environ=os.environ):
+        """Configuration of main(); numeric settings set to 0 are disabled (None)."""
+        def number(name, default, parse=int):
+            return parse(environ.get(name, default)) or None
+
+        return cls(
+            api_url=READINGS_API_URL,
+            api_key="None",
+            open_chargers=tuple(c.strip() for c in environ.get("OCPP_OPEN_CHARGERS", ",".join(cls.open_chargers))
+                                .split(",") if c.strip()),
+            workers=int(environ.get("OCPP_WORKERS", cls.workers)),
+            event_loop=environ.get("OCPP_EVENT_LOOP", cls.event_loop),
+            admin_port=number("OCPP_ADMIN_PORT", "9100"),
+            admin_token=environ.get("OCPP_ADMIN_TOKEN"),
+            metrics_port=number("OCPP_METRICS_PORT", "9200"),
+            metrics_host=environ.get("OCPP_METRICS_HOST", cls.metrics_host),
+            metrics_report_interval=number("OCPP_METRICS_REPORT_INTERVAL", cls.metrics_report_interval, float),
+            metrics_report_file=environ.get("OCPP_METRICS_REPORT_FILE"),
+        )
+
+    def for_worker(self, worker_id):
+        """Settings of one worker process: each serves its own admin and metrics port."""
+        return replace(
+            self,
+            admin_port=self.admin_port + worker_id if self.admin_port else None,
+            metrics_port=self.metrics_port + worker_id if self.metrics_port else None,
+        )
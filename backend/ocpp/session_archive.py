@@ -0,0 +1,141 @@
+import bisect
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from pathlib import Path
+
+from shared_state import file_lock
+
+logger = logging.getLogger(__name__)
+
+INDEXES = ("user", "charger", "month")
+
+
+def _index_keys(session):
+    """Index keys of a session: its id_tag, charger and the UTC month ("YYYY-MM") it started in."""
+    return {
+        "user": session.get("id_tag") or "",
+        "charger": session.get("charger_id") or "",
+        "month": (session.get("start_time") or session.get("stop_time") or "")[:7],
+    }
+
+
+class SessionArchive:
+    """
+    Append-only archive of completed charging sessions (one JSON record per line),
+    written by the OCPP workers when a transaction ends and read by the dashboard.
+
+    Readers keep an in-memory index of line offsets by user, charger and start month,
+    plus session/energy totals per key, extended with the lines appended since the
+    last refresh(). Queries seek straight to the matching lines.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self._lock = threading.RLock()
+        self._clear()
+
+    def _clear(self):
+        self._identity = None
+        self._size = 0
+        self._offsets = []  # position -> byte offset of the line, in completion order
+        self._index = {name: defaultdict(list) for name in INDEXES}  # key -> positions
+        self._totals = {name: defaultdict(lambda: {"sessions": 0, "energy_kwh": 0.0}) for name in INDEXES}
+
+    def identity(self):
+        """Inode of the archive; changes when the file is replaced (cursors become invalid)."""
+        try:
+            return os.stat(self.path).st_ino
+        except FileNotFoundError:
+            return None
+
+    def __len__(self):
+        self.refresh()
+        return len(self._offsets)
+
+    def append(self, session):
+        line = json.dumps(session, ensure_ascii=False) + "\n"
+        with file_lock(self.lock_path):
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    def refresh(self):
+        """Index sessions appended since the last call (everything if the file was replaced)."""
+        with self._lock:
+            identity = self.identity()
+            try:
+                size = os.stat(self.path).st_size
+            except FileNotFoundError:
+                size = 0
+            if identity != self._identity or size < self._size:
+                self._clear()
+                self._identity = identity
+            if size == self._size:
+                return
+            with open(self.path, "rb") as f:
+                f.seek(self._size)
+                offset = self._size
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # line still being written
+                    line_offset, offset = offset, offset + len(line)
+                    if not line.strip():
+                        continue
+                    try:
+                        session = json.loads(line)
+                    except ValueError:
+                        logger.warning(f"[SESSIONS] Skipping unreadable line: {line[:80]!r}")
+                        continue
+                    position = len(self._offsets)
+                    self._offsets.append(line_offset)
+                    for name, key in _index_keys(session).items():
+                        self._index[name][key].append(position)
+                        totals = self._totals[name][key]
+                        totals["sessions"] += 1
+                        totals["energy_kwh"] += float(session.get("energy_kwh") or 0)
+            self._size = offset
+
+    def _read(self, f, position):
+        f.seek(self._offsets[position])
+        return json.loads(f.readline())
+
+    def query(self, user=None, charger=None, month=None, before=None, limit=100):
+        """
+        Sessions matching all given keys, newest first, at positions below `before`.
+        Returns (sessions, position to pass as `before` for the next page or None).
+        """
+        with self._lock:
+            self.refresh()
+            filters = [self._index[name].get(key, []) for name, key in
+                       (("user", user), ("charger", charger), ("month", month)) if key is not None]
+            if filters:
+                filters.sort(key=len)
+                candidates, others = filters[0], [set(positions) for positions in filters[1:]]
+            else:
+                candidates, others = range(len(self._offsets)), []
+            end = len(candidates) if before is None else bisect.bisect_left(candidates, before)
+
+            positions = []
+            for i in range(end - 1, -1, -1):
+                position = candidates[i]
+                if all(position in other for other in others):
+                    positions.append(position)
+                    if len(positions) > limit:
+                        break  # one more than asked: there is a next page
+            more = len(positions) > limit
+            positions = positions[:limit]
+            if not positions:
+                return [], None
+            with open(self.path, "rb") as f:
+                sessions = [self._read(f, position) for position in positions]
+            return sessions, (positions[-1] if more else None)
+
+    def totals(self, by):
+        """{key: {"sessions", "energy_kwh"}} per user, charger or month, from the index alone."""
+        with self._lock:
+            self.refresh()
+            return {key: {"sessions": totals["sessions"], "energy_kwh": round(totals["energy_kwh"], 3)}
+                    for key, totals in sorted(self._totals[by].items())}
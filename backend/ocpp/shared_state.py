@@ -0,0 +1,179 @@
+import copy
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: single worker only, no cross-process lock needed
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def file_lock(lock_path):
+    """Exclusive cross-process lock held on `lock_path` for the duration of the block."""
+    if fcntl is None:
+        yield
+        return
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class SharedJsonFile:
+    """
+    JSON document in DATA_DIR shared by several OCPP worker processes.
+
+    Every write goes through an exclusive lock file and an atomic rename, and the
+    document is only re-read when another process replaced it since our last access.
+    """
+
+    def __init__(self, path, default_factory=dict):
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self.default_factory = default_factory
+        self.data = default_factory()
+        self.version = 0  # bumped whenever the document is re-read from disk or written
+        self._stamp = None
+        # Serializes threads of one process (dashboard endpoints run in a threadpool)
+        self._thread_lock = threading.RLock()
+        # Flush statistics of this process, exported as metrics
+        self.writes = 0
+        self.write_seconds = 0.0
+        self.last_write_seconds = 0.0
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                content = f.read().strip()
+            return json.loads(content) if content else self.default_factory()
+        except FileNotFoundError:
+            return self.default_factory()
+        except Exception as e:
+            logger.error(f"[SHARED] Could not read {self.path.name}: {e}")
+            return self.default_factory()
+
+    def _write(self, data):
+        started = time.perf_counter()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self._stamp = self._file_stamp()
+        self.last_write_seconds = time.perf_counter() - started
+        self.write_seconds += self.last_write_seconds
+        self.writes += 1
+
+    @contextmanager
+    def _lock(self):
+        with self._thread_lock, file_lock(self.lock_path):
+            yield
+
+    def refresh(self):
+        """Re-read the file if another process changed it. Returns True when it did."""
+        with self._thread_lock:
+            stamp = self._file_stamp()
+            if stamp is not None and stamp == self._stamp:
+                return False
+            self.data = self._read()
+            self._stamp = stamp
+            self.version += 1
+            return True
+
+    def load(self):
+        """Return the current document, re-reading it only when it changed on disk."""
+        self.refresh()
+        return self.data
+
+    @contextmanager
+    def locked(self):
+        """
+        Read-modify-write under the cross-process lock.
+        The yielded document is written back atomically unless the block raises.
+        """
+        with self._lock():
+            self.refresh()
+            yield self.data
+            self._write(self.data)
+            self.version += 1  # anything derived from the old document is stale now
+
+
+class SharedJsonMap(SharedJsonFile):
+    """
+    Shared JSON object whose top-level keys are owned by individual workers
+    (transactions by id, chargers by name). `merge` writes back only the keys
+    this process changed, so concurrent workers never clobber each other.
+    """
+
+    def __init__(self, path):
+        super().__init__(path, dict)
+        self._baseline = {}
+        self.merged_keys = []  # keys this process changed in the last merge()
+
+    def refresh(self):
+        with self._thread_lock:
+            changed = super().refresh()
+            if changed:
+                self._baseline = copy.deepcopy(self.data)
+            return changed
+
+    def merge(self, local):
+        """Publish changes made to `local` since the last sync and return the merged document."""
+        with self._lock():
+            self._merge_locked(local, self._current())
+        return self.data
+
+    def insert(self, local, first_id, value):
+        """
+        Add `value` to `local` under the first integer key >= first_id that neither `local`
+        nor the file uses, publish it and return the key. The key is picked and written in
+        one locked section, so two workers can never hand out the same id.
+        """
+        with self._lock():
+            current = self._current()
+            key = first_id
+            while str(key) in current or str(key) in local:
+                key += 1
+            local[str(key)] = value
+            self._merge_locked(local, current)
+        return key
+
+    def _current(self):
+        """Document as on disk (caller holds the lock)."""
+        if self._file_stamp() == self._stamp:
+            return copy.deepcopy(self._baseline)
+        return self._read()
+
+    def _merge_locked(self, local, merged):
+        missing = object()
+        self.merged_keys = []
+        for key, value in local.items():
+            if self._baseline.get(key, missing) != value:
+                merged[key] = copy.deepcopy(value)
+                self.merged_keys.append(key)
+        for key in self._baseline.keys() - local.keys():
+            merged.pop(key, None)
+            self.merged_keys.append(key)
+
+        self._write(merged)
+        self.data = merged
+        self.version += 1
+        self._baseline = copy.deepcopy(merged)
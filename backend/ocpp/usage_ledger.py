@@ -0,0 +1,84 @@
+"""
+Period-bucketed energy usage ledger shared by the OCPP server and the dashboard.
+
+energy_usage.json maps billing periods to per-user usage:
+
+    {"2025-11": {"6A6CB588": 10.0, ...}, "2025-12": {...}}
+
+The current period is resolved when usage is read or written, so the monthly
+rollover needs no reset job and happens exactly at 00:00 on the 1st, in the
+server's local time like the old reset job, or in BILLING_TIMEZONE (an IANA name
+such as "Europe/Istanbul") when set.
+
+energy_usage.json is rewritten on every reading, so it only holds the current
+period: closed periods are moved to energy_usage_history.json (same format) at
+the first write after the rollover.
+"""
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+# Time zone of the billing month; None = local time of the server
+BILLING_TZ = ZoneInfo(os.environ["BILLING_TIMEZONE"]) if os.getenv("BILLING_TIMEZONE") else None
+
+_period = None
+_period_end = 0.0  # epoch seconds at which _period stops being current
+
+
+def current_period():
+    """Billing period ("YYYY-MM", in BILLING_TZ) in effect now. Recomputed only at month boundaries."""
+    global _period, _period_end
+    now = time.time()
+    if now >= _period_end:
+        today = datetime.fromtimestamp(now, BILLING_TZ)
+        _period = today.strftime("%Y-%m")
+        if today.month == 12:
+            next_month = datetime(today.year + 1, 1, 1, tzinfo=BILLING_TZ)
+        else:
+            next_month = datetime(today.year, today.month + 1, 1, tzinfo=BILLING_TZ)
+        _period_end = next_month.timestamp()
+    return _period
+
+
+def is_legacy(data):
+    """True for the old flat {id_tag: kwh} format that was zeroed by the monthly reset."""
+    return any(not isinstance(value, dict) for value in data.values())
+
+
+def legacy_period(last_reset_file):
+    """Period the flat usage belongs to: the month of the last reset, else the current month."""
+    try:
+        period = Path(last_reset_file).read_text().strip()
+        if period:
+            return period
+    except OSError:
+        pass
+    return current_period()
+
+
+def migrate_legacy(data, last_reset_file):
+    """Convert flat usage into a ledger with a single bucket for its period."""
+    if not data:
+        return {}
+    return {legacy_period(last_reset_file): {tag: float(kwh or 0) for tag, kwh in data.items()}}
+
+
+def closed_periods(ledger, period=None):
+    """Periods of the ledger other than the current one, to be moved to the history file."""
+    period = period or current_period()
+    return {key: usage for key, usage in ledger.items() if key != period}
+
+
+def period_usage(ledger, period=None):
+    """Per-user usage of one period ({} when nothing was recorded)."""
+    return ledger.get(period or current_period(), {})
+
+
+def period_totals(ledger):
+    """[{period, users, total_kwh}] for every recorded period, newest first."""
+    return [
+        {"period": period, "users": len(usage), "total_kwh": round(sum(usage.values()), 3)}
+        for period, usage in sorted(ledger.items(), reverse=True)
+    ]
@@ -0,0 +1,238 @@
+import csv
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+from shared_state import file_lock
+
+logger = logging.getLogger(__name__)
+
+FIELDNAMES = ["id_tag", "header name", "surname", "quota_kwh", "unlimited"]
+
+
+def _file_stamp(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class UserStore:
+    """
+    users1.csv as an in-memory index {id_tag: row}, shared by the dashboard and the
+    OCPP QuotaManager.
+
+    Mutations are appended to a journal next to the CSV (users1.journal, one JSON
+    entry per line), and once `compact_every` user changes have accumulated the CSV
+    is rewritten with an atomic rename and the journal emptied. Readers load the CSV
+    once and then only replay journal lines they have not seen.
+
+    By default every write batch is compacted right away, so users1.csv stays the
+    source of truth and can be edited by hand; the journal only bridges a crash
+    between the append and the rewrite. With a larger `compact_every` writes get
+    cheaper but the journal becomes the source of truth for the changes it holds:
+    they are replayed over the CSV, so call compact() before editing the CSV by hand.
+    """
+
+    def __init__(self, path, compact_every=1):
+        self.path = Path(path)
+        self.journal_path = self.path.with_name(self.path.stem + ".journal")
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self.compact_every = compact_every
+        self.users = {}  # id_tag -> row with FIELDNAMES keys, in file order
+        self._csv_stamp = None
+        self._journal_ino = None
+        self._journal_offset = 0  # bytes of the journal already applied
+        self._journal_entries = 0
+        self._thread_lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.users)
+
+    def __contains__(self, id_tag):
+        return id_tag in self.users
+
+    def get(self, id_tag):
+        return self.users.get(id_tag)
+
+    def rows(self):
+        return list(self.users.values())
+
+    @staticmethod
+    def normalize(row):
+        """Row with exactly the CSV columns, as stripped strings."""
+        return {field: str(row.get(field) if row.get(field) is not None else "").strip() for field in FIELDNAMES}
+
+    def _read_csv(self):
+        users = {}
+        try:
+            with open(self.path, "r", newline="") as f:
+                for row in csv.DictReader(f):
+                    row = self.normalize(row)
+                    if row["id_tag"]:
+                        users[row["id_tag"]] = row
+        except FileNotFoundError:
+            pass
+        return users
+
+    def _replay_journal(self, users, start):
+        """Apply journal entries from byte offset `start`. Returns (changed id_tags, new offset, entries)."""
+        changed = set()
+        offset = start
+        entries = 0
+        try:
+            f = open(self.journal_path, "rb")
+        except FileNotFoundError:
+            return changed, 0, 0
+        with f:
+            f.seek(start)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # entry still being written
+                offset += len(line)
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning(f"[USERS] Skipping unreadable journal line: {line[:80]!r}")
+                    continue
+                if entry["op"] in ("set", "set_many"):
+                    rows = entry["rows"] if entry["op"] == "set_many" else [entry["row"]]
+                    for row in rows:
+                        row = self.normalize(row)
+                        users[row["id_tag"]] = row
+                        changed.add(row["id_tag"])
+                    entries += len(rows)
+                elif entry["op"] == "delete":
+                    entries += 1
+                    if entry["id_tag"] in users:
+                        del users[entry["id_tag"]]
+                        changed.add(entry["id_tag"])
+        return changed, offset, entries
+
+    def refresh(self):
+        """Pick up changes made by other processes. Returns the set of id_tags that changed."""
+        with self._thread_lock:
+            csv_stamp = _file_stamp(self.path)
+            journal_stamp = _file_stamp(self.journal_path)
+            journal_ino = journal_stamp[2] if journal_stamp else None
+            journal_size = journal_stamp[1] if journal_stamp else 0
+
+            if csv_stamp == self._csv_stamp and journal_ino == self._journal_ino:
+                if journal_size == self._journal_offset:
+                    return set()
+                if journal_size > self._journal_offset:
+                    changed, self._journal_offset, entries = self._replay_journal(self.users, self._journal_offset)
+                    self._journal_entries += entries
+                    return changed
+
+            # CSV replaced (compaction or an edit by hand) or journal reset: rebuild the index
+            users = self._read_csv()
+            _, offset, entries = self._replay_journal(users, 0)
+            old = self.users
+            changed = {tag for tag in old.keys() | users.keys() if old.get(tag) != users.get(tag)}
+            self.users = users
+            self._csv_stamp = csv_stamp
+            self._journal_ino = journal_ino
+            self._journal_offset = offset
+            self._journal_entries = entries
+            return changed
+
+    @contextmanager
+    def _mutation(self):
+        with self._thread_lock, file_lock(self.lock_path):
+            self.refresh()
+            yield
+
+    def _append(self, entries, weight=None):
+        """
+        Journal entries (callers hold the lock and already applied them to self.users).
+        `weight` is the number of user changes they carry, counted towards compaction.
+        """
+        now = datetime.now(timezone.utc).isoformat()
+        data = "".join(json.dumps({"time": now, **entry}, ensure_ascii=False) + "\n" for entry in entries)
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            if f.tell() > self._journal_offset:
+                # Unterminated line of a writer that crashed mid-append: our entry must not extend it
+                logger.warning(f"[USERS] Dropping {f.tell() - self._journal_offset} bytes of an incomplete journal entry")
+                f.truncate(self._journal_offset)
+            f.write(data)
+        stamp = _file_stamp(self.journal_path)
+        self._journal_ino = stamp[2]
+        self._journal_offset = stamp[1]
+        self._journal_entries += len(entries) if weight is None else weight
+        if self._journal_entries >= self.compact_every:
+            self._compact()
+
+    def _compact(self):
+        """Rewrite the CSV from the index (atomic rename) and start an empty journal."""
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+            writer.writeheader()
+            writer.writerows(self.users.values())
+        os.replace(tmp_path, self.path)
+        # CSV first: a reader that sees the new CSV with the old journal replays entries it already has
+        tmp_path = self.journal_path.with_name(f"{self.journal_path.name}.{os.getpid()}.tmp")
+        open(tmp_path, "w").close()
+        os.replace(tmp_path, self.journal_path)
+        self._csv_stamp = _file_stamp(self.path)
+        self._journal_ino = _file_stamp(self.journal_path)[2]
+        self._journal_offset = 0
+        self._journal_entries = 0
+        logger.info(f"[USERS] Compacted {self.path.name}: {len(self.users)} users")
+
+    def compact(self):
+        with self._mutation():
+            self._compact()
+
+    def create(self, row):
+        """Add a user; raises KeyError if the id_tag exists."""
+        row = self.normalize(row)
+        with self._mutation():
+            if row["id_tag"] in self.users:
+                raise KeyError(row["id_tag"])
+            self.users[row["id_tag"]] = row
+            self._append([{"op": "set", "row": row}])
+        return row
+
+    def update(self, id_tag, changes):
+        """Change some columns of a user; raises KeyError if it does not exist."""
+        with self._mutation():
+            if id_tag not in self.users:
+                raise KeyError(id_tag)
+            row = self.normalize({**self.users[id_tag], **changes, "id_tag": id_tag})
+            self.users[id_tag] = row
+            self._append([{"op": "set", "row": row}])
+        return row
+
+    def delete(self, id_tag):
+        """Remove a user; returns False if it did not exist."""
+        with self._mutation():
+            if id_tag not in self.users:
+                return False
+            del self.users[id_tag]
+            self._append([{"op": "delete", "id_tag": id_tag}])
+        return True
+
+    def upsert_many(self, rows):
+        """
+        Insert or replace many users as one journal line, so other processes see all of them
+        or none. Large batches end up compacted straight into the CSV. Returns (created, updated).
+        """
+        rows = [self.normalize(row) for row in rows]
+        created = updated = 0
+        with self._mutation():
+            for row in rows:
+                if row["id_tag"] in self.users:
+                    updated += 1
+                else:
+                    created += 1
+                self.users[row["id_tag"]] = row
+            if rows:
+                self._append([{"op": "set_many", "rows": rows}], weight=len(rows))
+        return created, updated
@@ -0,0 +1,78 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+
+class ResultCache:
+    """
+    Cache of computed dashboard aggregates shared by all requests of one API process.
+
+    An entry is reused while it is younger than `ttl` seconds and the data revision it
+    was computed from (e.g. an ETag over the source files) is still current. Data that
+    changes constantly, like the meter log, is left out of the revision so its results
+    are reused for up to `ttl` seconds. Concurrent requests for a missing entry are
+    coalesced: one thread computes, the others wait for its result instead of
+    repeating the work.
+    """
+
+    def __init__(self, ttl=10.0, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (revision, expires_at, value), least recently used first
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self._counts = defaultdict(lambda: {"hits": 0, "misses": 0, "coalesced": 0})
+
+    def _lookup(self, key, revision):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != revision or entry[1] < time.monotonic():
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get_or_compute(self, key, revision_fn, compute):
+        """
+        Return the cached value for `key` (a tuple starting with the endpoint name) or
+        compute it. `revision_fn()` identifies the current data; the revision taken
+        before computing is stored, so a change during the computation is not missed.
+        """
+        name = key[0]
+        revision = revision_fn()
+        with self._lock:
+            entry = self._lookup(key, revision)
+            if entry is not None:
+                self._counts[name]["hits"] += 1
+                return entry[2]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            revision = revision_fn()
+            with self._lock:
+                # Somebody else may have computed it while we waited
+                entry = self._lookup(key, revision)
+                if entry is not None:
+                    self._counts[name]["coalesced"] += 1
+                    return entry[2]
+            value = compute()
+            with self._lock:
+                self._counts[name]["misses"] += 1
+                self._entries[key] = (revision, time.monotonic() + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    evicted, _ = self._entries.popitem(last=False)
+                    self._key_locks.pop(evicted, None)
+            return value
+
+    def stats(self):
+        """Hit/miss counts and hit ratio per endpoint ("coalesced" requests waited for another's result)."""
+        with self._lock:
+            result = {}
+            for name, counts in self._counts.items():
+                served = counts["hits"] + counts["coalesced"]
+                total = served + counts["misses"]
+                result[name] = {
+                    **counts,
+                    "entries": sum(1 for key in self._entries if key[0] == name),
+                    "hit_ratio": round(served / total, 4) if total else 0.0,
+                }
+            return result
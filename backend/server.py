@@ -1,18 +1,44 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta, timezone
 import jwt
+import hashlib
+import secrets
+import time
+import base64
+import aiohttp
+import asyncio
 import os
 import json
 import csv
+import io
+import math
+import codecs
+import re
+import sys
+import anyio
+from contextlib import contextmanager
 from pathlib import Path
-from collections import defaultdict
 
+# Data-access modules shared with the OCPP server live in backend/ocpp
+sys.path.append(str(Path(__file__).resolve().parent / "ocpp"))
+from shared_state import SharedJsonFile
+from meter_log import MeterLog
+from result_cache import ResultCache
+from performance_metrics import MetricsRegistry
+from analytics import BREAKDOWNS, MeterAnalytics, energy_unit
+from fast_response import CompressionMiddleware, FastJSONResponse, json_bytes
+from user_store import UserStore
+from session_archive import INDEXES as SESSION_INDEXES, SessionArchive
+from usage_ledger import current_period, is_legacy, migrate_legacy, period_usage, period_totals
 
-app = FastAPI(title="OCPP CMS Dashboard API")
+
+app = FastAPI(title="OCPP CMS Dashboard API", default_response_class=FastJSONResponse)
 
 # CORS configuration
 cors_origins = os.getenv("CORS_ORIGINS", "*").split(",")
@@ -23,6 +49,40 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# gzip (brotli with brotli-asgi installed) for larger bodies; the SSE stream goes out uncompressed
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.getenv("COMPRESS_MIN_SIZE", "1024")),
+                   exclude=("/api/events",))
+
+
+class RequestMetricsMiddleware:
+    """Count requests and time responses per route template (not per URL, to bound label values)."""
+
+    def __init__(self, app, exclude=()):
+        self.app = app
+        self.exclude = set(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude:
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            route = route.path if route is not None else "unmatched"
+            http_requests.labels(route, scope["method"], str(status)).inc()
+            http_request_seconds.labels(route, scope["method"]).record(time.perf_counter() - started)
+
+# Long-lived SSE streams would only skew the response times
+app.add_middleware(RequestMetricsMiddleware, exclude=("/api/events",))
 
 # JWT Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
@@ -48,9 +108,69 @@ print(f"✅ Unified backend DATA_DIR = {DATA_DIR}")
 # Define your data file paths
 USERS_CSV = DATA_DIR / "users1.csv"
 ENERGY_USAGE_JSON = DATA_DIR / "energy_usage.json"
+ENERGY_USAGE_HISTORY_JSON = DATA_DIR / "energy_usage_history.json"
 ACTIVE_TRANSACTIONS_JSON = DATA_DIR / "active_transactions.json"
-METER_DATA_LOG_JSON = DATA_DIR / "meter_data_log.json"
+METER_DATA_LOG = DATA_DIR / "meter_data_log.ndjson"
 CHARGER_STATUS_JSON = DATA_DIR / "charger_status.json"
+LAST_RESET_FILE = DATA_DIR / "last_reset.txt"
+SESSIONS_JSON = DATA_DIR / "sessions.json"
+SSE_TICKETS_JSON = DATA_DIR / "sse_tickets.json"
+
+# Admin APIs of the OCPP worker processes (one per worker: OCPP_ADMIN_PORT + worker id)
+OCPP_ADMIN_URLS = [url.strip().rstrip("/") for url in
+                   os.getenv("OCPP_ADMIN_URLS", "http://127.0.0.1:9100").split(",") if url.strip()]
+OCPP_ADMIN_TOKEN = os.getenv("OCPP_ADMIN_TOKEN")
+
+# energy_usage.json is a per-period ledger also written by the OCPP server, which moves
+# closed periods to energy_usage_history.json
+usage_store = SharedJsonFile(ENERGY_USAGE_JSON)
+usage_history_store = SharedJsonFile(ENERGY_USAGE_HISTORY_JSON)
+
+# One-use tickets opening /api/events, shared by the uvicorn workers
+sse_tickets = SharedJsonFile(SSE_TICKETS_JSON)
+SSE_TICKET_SECONDS = 30
+
+# users1.csv indexed by id_tag; changes go to users1.journal and are compacted into the CSV
+user_store = UserStore(USERS_CSV)
+USER_FILES = (USERS_CSV, user_store.journal_path)
+
+# meter_data_log.ndjson holds one reading per line, appended by the OCPP server
+# (which also migrates the old meter_data_log.json on startup)
+meter_log = MeterLog(METER_DATA_LOG)
+# Completed charging sessions archived by the OCPP server, indexed by user, charger and month
+session_archive = SessionArchive(SESSIONS_JSON)
+SESSION_PAGE_SIZE = 100
+SESSION_MAX_PAGE_SIZE = 1000
+
+# Typed columns of the meter log for energy breakdowns, extended as readings are appended
+analytics = MeterAnalytics(meter_log)
+# /api/stats, /api/usage/history and charger energy totals, reused until the files they read change
+result_cache = ResultCache(ttl=float(os.getenv("RESULT_CACHE_TTL", "10")))
+
+# Prometheus metrics of this API process, served on /metrics only when METRICS_TOKEN (bearer token) is set
+metrics = MetricsRegistry()
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+http_requests = metrics.counter("dashboard_http_requests_total", "API requests", ("route", "method", "status"))
+http_request_seconds = metrics.histogram(
+    "dashboard_http_request_seconds", "API response time, until the last body byte", ("route", "method"))
+
+LOG_PAGE_SIZE = 100
+LOG_MAX_PAGE_SIZE = 1000
+LOG_SCAN_LIMIT = 100_000  # records examined per /api/logs page when filters match little
+
+USER_IMPORT_MAX_ERRORS = 1000  # row errors listed in an import report (all are counted)
+USER_EXPORT_BATCH = 1000
+USER_EXPORT_FIELDS = ['id_tag', 'header name', 'surname', 'quota_kwh', 'unlimited', 'plan', 'used_kwh', 'remaining_kwh']
+TIMESERIES_POINTS = 500
+TIMESERIES_MAX_POINTS = 5000
+READING_EXPORT_FIELDS = ['ID', 'timestamp', 'chargerName', 'userName', 'idTag', 'totalPower', 'phase1Power',
+                         'phase2Power', 'phase3Power', 'phase1Voltage', 'phase2Voltage', 'phase3Voltage',
+                         'frequency', 'deliveredEnergy', 'suppliedEnergy', 'energyUnit']
+# How far charger clocks may put a reading out of log order. The export starts reading
+# the log this much before `from` and stops at the first reading later than `to` plus
+# this much, so a reading whose clock is skewed by more than that (logged among readings
+# past the end of the range) is left out of the export.
+READING_EXPORT_SLACK = timedelta(hours=1)
 
 print(f"✅ Data directory: {DATA_DIR}")
 
@@ -87,6 +207,19 @@ class UserUpdate(BaseModel):
     plan: Optional[str] = None
     quota_kwh: Optional[float] = None
 
+class ChargerCommand(BaseModel):
+    charger_id: str
+    action: str
+    params: Dict[str, Any] = {}
+
+class CommandRequest(BaseModel):
+    action: Optional[str] = None  # RemoteStopTransaction, TriggerMessage, ChangeConfiguration or Reset
+    params: Dict[str, Any] = {}
+    chargers: Optional[List[str]] = None  # None = every connected charger
+    commands: Optional[List[ChargerCommand]] = None  # per-charger commands instead of action/chargers
+    timeout: Optional[float] = None
+    retries: Optional[int] = None
+
 class DashboardStats(BaseModel):
     total_energy_today: float
     active_sessions: int
@@ -134,106 +267,110 @@ def load_json_file(filepath: Path, default=None):
             return json.load(f)
     return default if default is not None else {}
 
-def save_json_file(filepath: Path, data):
-    with open(filepath, 'w') as f:
-        json.dump(data, f, indent=2)
+# Dashboard polls revalidate with If-None-Match instead of reusing a stale copy
+CACHE_CONTROL = "private, no-cache"
+
+def data_etag(*paths, extra=()):
+    """Weak ETag from the files a response is built from (mtime, size, inode) plus its parameters."""
+    parts = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            parts.append(f"{st.st_mtime_ns}-{st.st_size}-{st.st_ino}")
+        except FileNotFoundError:
+            parts.append("missing")
+    parts.extend(str(value) for value in extra)
+    return 'W/"' + hashlib.sha1("|".join(parts).encode()).hexdigest()[:24] + '"'
+
+def etag_matches(request: Request, etag: str):
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = {tag.strip() for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates or etag[2:] in candidates
+
+def not_modified(etag: str):
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+def set_cache_headers(response: Response, etag: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+
+def json_response(content, etag: str):
+    """Encode a read endpoint's plain dicts/lists directly, with its cache headers."""
+    return FastJSONResponse(content, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+def load_usage_ledger():
+    """Per-period usage ledger {"YYYY-MM": {id_tag: kwh}} (old flat files are read as one period)."""
+    ledger = usage_store.load()
+    return migrate_legacy(ledger, LAST_RESET_FILE) if is_legacy(ledger) else ledger
+
+def load_usage_periods():
+    """Closed periods from the history file plus the periods still in energy_usage.json."""
+    return {**usage_history_store.load(), **load_usage_ledger()}
+
+def load_current_usage():
+    """Per-user usage of the current billing period."""
+    return period_usage(load_usage_ledger())
+
+@contextmanager
+def current_usage_for_update():
+    """Lock the usage ledger and yield the current period's usage for modification."""
+    with usage_store.locked() as ledger:
+        if is_legacy(ledger):
+            ledger = usage_store.data = migrate_legacy(ledger, LAST_RESET_FILE)
+        yield ledger.setdefault(current_period(), {})
 
 def load_users_csv():
-    users = []
-    if not USERS_CSV.exists():
-        return users
-    
-    with open(USERS_CSV, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            users.append(row)
-    return users
-
-def save_users_csv(users):
-    if not users:
-        return
-    
-    fieldnames = ['id_tag', 'header name', 'surname', 'quota_kwh', 'unlimited']
-    with open(USERS_CSV, 'w', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(users)
+    """Rows of users1.csv (with journaled changes applied), from the shared in-memory index."""
+    user_store.refresh()
+    return user_store.rows()
+
+def user_quota_row(user, energy_usage):
+    """UserQuota fields of a users1.csv row as a plain dict."""
+    id_tag = user['id_tag']
+    unlimited = user.get('unlimited', 'FALSE').upper() == 'TRUE'
+    quota_kwh = None if unlimited else float(user.get('quota_kwh') or 0)
+    used_kwh = energy_usage.get(id_tag, 0)
+    remaining_kwh = None if unlimited else max(0, quota_kwh - used_kwh) if quota_kwh else 0
+
+    return {
+        "id_tag": id_tag,
+        "header_name": user.get('header name', ''),
+        "surname": user.get('surname', ''),
+        "full_name": f"{user.get('header name', '')} {user.get('surname', '')}",
+        "plan": "unlimited" if unlimited else "limited",
+        "quota_kwh": quota_kwh,
+        "used_kwh": used_kwh,
+        "remaining_kwh": remaining_kwh,
+        "unlimited": unlimited
+    }
 
 def get_user_quota_info(id_tag: str):
-    users = load_users_csv()
-    energy_usage = load_json_file(ENERGY_USAGE_JSON, {})
-    
-    for user in users:
-        if user['id_tag'] == id_tag:
-            unlimited = user.get('unlimited', 'FALSE').upper() == 'TRUE'
-            quota_kwh = None if unlimited else float(user.get('quota_kwh', 0))
-            used_kwh = energy_usage.get(id_tag, 0)
-            remaining_kwh = None if unlimited else max(0, quota_kwh - used_kwh)
-            
-            return UserQuota(
-                id_tag=id_tag,
-                header_name=user.get('header name', ''),
-                surname=user.get('surname', ''),
-                full_name=f"{user.get('header name', '')} {user.get('surname', '')}",
-                plan="unlimited" if unlimited else "limited",
-                quota_kwh=quota_kwh,
-                used_kwh=used_kwh,
-                remaining_kwh=remaining_kwh,
-                unlimited=unlimited
-            )
-    return None
+    user_store.refresh()
+    user = user_store.get(id_tag)
+    if user is None:
+        return None
+    return UserQuota(**user_quota_row(user, load_current_usage()))
 
-def update_total_energy_delivered():
-    """Recalculate lifetime total energy for each charger and update charger_status.json"""
-    try:
-        logs = load_json_file(METER_DATA_LOG_JSON, [])
-        chargers = load_json_file(CHARGER_STATUS_JSON, {})
-        totals = defaultdict(float)
-
-        # Group by charger
-        readings_by_charger = defaultdict(list)
-
-        for rec in logs:
-            try:
-                charger_name = str(rec.get("chargerName", "UNKNOWN")).upper()
-                delivered = float(rec.get("deliveredEnergy", 0))
-                readings_by_charger[charger_name].append(delivered)
-            except Exception as e:
-                print(f"⚠️ Skipping invalid record: {e}")
-
-        for charger_name, readings in readings_by_charger.items():
-            if not readings:
-                continue
-
-            # Sort values in ascending order (older to newer)
-            readings.sort()
-
-            if "SCHNEIDER" in charger_name or "EVLINK" in charger_name:
-                # Schneider sends cumulative Wh — take delta between first & last
-                first_val = readings[0]
-                last_val = readings[-1]
-                delta_wh = max(0.0, last_val - first_val)
-                total_kwh = delta_wh / 1000.0  # convert Wh → kWh
-            elif "LIVOLTEK" in charger_name:
-                # Livoltek sends incremental kWh readings
-                total_kwh = sum(max(0.0, readings[i] - readings[i - 1])
-                                for i in range(1, len(readings))
-                                if readings[i] > readings[i - 1])
-            else:
-                total_kwh = 0.0
-
-            totals[charger_name] = round(total_kwh, 3)
-
-        # Write back updated totals into charger_status.json
-        for charger_id, charger_data in chargers.items():
-            name_upper = charger_id.upper()
-            charger_data["total_energy_delivered"] = totals.get(name_upper, 0.0)
+def delivered_energy_totals():
+    """
+    Lifetime kWh per charger (upper-case id) from the meter log. Reported in place of
+    total_energy_delivered of charger_status.json: only the OCPP server writes that file.
+    Cached until the meter log changes, so /api/chargers polls between readings are free.
+    """
+    def meter_log_revision():
+        return data_etag(METER_DATA_LOG)
 
-        save_json_file(CHARGER_STATUS_JSON, chargers)
-        print("✅ Updated total_energy_delivered (corrected for Schneider cumulative Wh)")
+    def compute():
+        # Register increments per charger in kWh (Schneider Wh converted, meter resets handled)
+        return analytics.totals("charger")
 
+    try:
+        return result_cache.get_or_compute(("charger_totals",), meter_log_revision, compute)
     except Exception as e:
-        print(f"⚠️ Failed to update total energy delivered: {e}")
+        print(f"⚠️ Failed to compute total energy delivered: {e}")
+        return {}
 
 
 
@@ -263,66 +400,56 @@ async def verify(username: str = Depends(verify_token)):
     return {"username": username, "authenticated": True}
 
 # --- Updated Endpoint ---
+# Cached results are recomputed when these change; the meter log (appended with every
+# reading) only through the cache TTL
+STATS_SOURCES = (ACTIVE_TRANSACTIONS_JSON, CHARGER_STATUS_JSON, *USER_FILES)
+STATS_FILES = (*STATS_SOURCES, METER_DATA_LOG)
+
 @app.get("/api/stats", response_model=DashboardStats)
-async def get_dashboard_stats():
+def get_dashboard_stats(request: Request, response: Response):
+    today = datetime.now(timezone.utc).date()
+    etag = data_etag(*STATS_FILES, extra=(today,))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    def stats_revision():
+        return data_etag(*STATS_SOURCES, extra=(today,))
+
+    def compute():
+        return etag, compute_dashboard_stats(today)
+
+    # A cached result keeps the ETag of the data it was computed from
+    etag, stats = result_cache.get_or_compute(("stats",), stats_revision, compute)
+    set_cache_headers(response, etag)
+    return stats
+
+def compute_dashboard_stats(today):
     """
-    Unified dashboard statistics with auto-updating total_energy_delivered.
+    Unified dashboard statistics.
     - Energy Today: computed from today's logs
-    - Total Energy Delivered: updated cumulatively across all chargers
+    - Total Energy Delivered: lifetime totals of all chargers, from the meter log
     """
-    from collections import defaultdict
-
-    # ✅ Step 1: Always refresh lifetime totals
-    update_total_energy_delivered()
+    # ✅ Step 1: Lifetime totals
+    totals = delivered_energy_totals()
 
     # ✅ Step 2: Load data
-    energy_usage = load_json_file(ENERGY_USAGE_JSON, {})
     active_transactions = load_json_file(ACTIVE_TRANSACTIONS_JSON, {})
     chargers = load_json_file(CHARGER_STATUS_JSON, {})
     users = load_users_csv()
-    logs = load_json_file(METER_DATA_LOG_JSON, [])
-
-    today = datetime.now(timezone.utc).date()
-    total_energy_today = 0.0
-    energy_by_charger = defaultdict(list)
 
-    # ✅ Step 3: Group today's readings per charger
-    for rec in logs:
-        try:
-            ts_str = rec.get("timestamp")
-            if not ts_str:
-                continue
-            ts = datetime.fromisoformat(ts_str.replace("Z", "+00:00"))
-            if ts.date() != today:
-                continue
-
-            delivered = float(rec.get("deliveredEnergy", 0))
-            charger_name = str(rec.get("chargerName", "UNKNOWN")).upper()
-
-            # Schneider → Wh → convert to kWh
-            if "SCHNEIDER" in charger_name or "EVLINK" in charger_name:
-                delivered /= 1000.0
-
-            energy_by_charger[charger_name].append((ts, delivered))
-        except Exception as e:
-            print(f"⚠️ Skipping invalid record: {e}")
+    # ✅ Step 3: Today's energy across all chargers
+    day_start = int(datetime.combine(today, datetime.min.time(), tzinfo=timezone.utc).timestamp())
+    total_energy_today = sum(analytics.totals("day", start=day_start, end=day_start + 86400).values())
 
-    # ✅ Step 4: Compute daily delta for each charger
-    for charger, readings in energy_by_charger.items():
-        readings.sort(key=lambda x: x[0])
-        first, last = readings[0][1], readings[-1][1]
-        delta = max(0.0, last - first)
-        total_energy_today += delta
-
-    # ✅ Step 5: Aggregate dashboard stats
+    # ✅ Step 4: Aggregate dashboard stats
     total_energy_delivered = sum(
-        c.get("total_energy_delivered", 0) for c in chargers.values()
+        totals.get(charger_id.upper(), 0.0) for charger_id in chargers
     )
     active_chargers = sum(
         1 for c in chargers.values() if c.get("status") == "Charging"
     )
 
-    # ✅ Step 6: Return response
+    # ✅ Step 5: Return response
     return DashboardStats(
         total_energy_today=round(total_energy_today, 3),
         active_sessions=len(active_transactions),
@@ -339,15 +466,20 @@ async def get_dashboard_stats():
 
 
 @app.get("/api/chargers")
-async def get_charger_status():
+def get_charger_status(request: Request):
+    etag = data_etag(CHARGER_STATUS_JSON, METER_DATA_LOG)
+    if etag_matches(request, etag):
+        return not_modified(etag)
     try:
         if CHARGER_STATUS_JSON.exists():
             with open(CHARGER_STATUS_JSON, "r", encoding="utf-8") as f:
                 data = json.load(f)
 
+            totals = delivered_energy_totals()
             chargers_list = []
             for charger_id, charger_data in data.items():
                 charger_data["id"] = charger_id
+                charger_data["total_energy_delivered"] = totals.get(charger_id.upper(), 0.0)
                 brand = charger_data.get("brand", "Unknown")
                 name_upper = charger_data["name"].upper()
                 if brand == "Unknown":
@@ -359,51 +491,70 @@ async def get_charger_status():
                 chargers_list.append(charger_data)
 
             # 👇 Return in a structure your frontend expects
-            return {"chargers": chargers_list}
+            return json_response({"chargers": chargers_list}, etag)
         else:
             print("⚠️ Charger status file missing, returning empty list.")
-            return {"chargers": []}
+            return json_response({"chargers": []}, etag)
     except Exception as e:
         print(f"Error reading charger_status.json: {e}")
         return {"chargers": []}
 
-
-@app.get("/api/users", response_model=List[UserQuota])
-async def get_users():
+@app.get("/api/chargers/{charger_id:path}/timeseries")
+def get_charger_timeseries(
+    charger_id: str,
+    request: Request,
+    username: str = Depends(verify_token),
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    points: int = TIMESERIES_POINTS,
+    mode: str = "minmax",
+):
+    """
+    Power (W) and energy register (kWh) of one charger for charts, at most `points` per range
+    (default: the last 24 hours). mode=minmax returns min/max/avg per interval, mode=lttb a
+    downsampled line of averages. Served from 1 min / 15 min / 1 h rollups of the meter log.
+    """
+    if mode not in ("minmax", "lttb"):
+        raise HTTPException(status_code=400, detail="mode must be minmax or lttb")
+    points = max(1, min(points, TIMESERIES_MAX_POINTS))
+    # Default window ends at the next full minute so repeated polls share an ETag
+    end = as_utc(end) or datetime.fromtimestamp(math.ceil(datetime.now(timezone.utc).timestamp() / 60) * 60, timezone.utc)
+    start = as_utc(start) or end - timedelta(hours=24)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="from must be before to")
+    etag = data_etag(METER_DATA_LOG, extra=(charger_id, start, end, points, mode))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    series = analytics.timeseries(charger_id, int(start.timestamp()), int(end.timestamp()), points, mode)
+    if series is None:
+        if charger_id not in load_json_file(CHARGER_STATUS_JSON, {}):
+            raise HTTPException(status_code=404, detail="Charger not found")
+        series = (None, [])
+    bucket_seconds, rows = series
+    return json_response({
+        "charger_id": charger_id,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "mode": mode,
+        "bucket_seconds": bucket_seconds,
+        "points": rows,
+    }, etag)
+
+
+# Rows are encoded directly (FastJSONResponse), not validated against UserQuota; the schema is documentation only
+@app.get("/api/users", responses={200: {"model": List[UserQuota]}})
+def get_users(request: Request):
+    etag = data_etag(*USER_FILES, ENERGY_USAGE_JSON, extra=(current_period(),))
+    if etag_matches(request, etag):
+        return not_modified(etag)
 
     users = load_users_csv()
-    energy_usage = load_json_file(ENERGY_USAGE_JSON, {})
-    
-    result = []
-    for user in users:
-        id_tag = user['id_tag']
-        unlimited = user.get('unlimited', 'FALSE').upper() == 'TRUE'
-        quota_kwh = None if unlimited else float(user.get('quota_kwh', 0))
-        used_kwh = energy_usage.get(id_tag, 0)
-        remaining_kwh = None if unlimited else max(0, quota_kwh - used_kwh) if quota_kwh else 0
-        
-        result.append(UserQuota(
-            id_tag=id_tag,
-            header_name=user.get('header name', ''),
-            surname=user.get('surname', ''),
-            full_name=f"{user.get('header name', '')} {user.get('surname', '')}",
-            plan="unlimited" if unlimited else "limited",
-            quota_kwh=quota_kwh,
-            used_kwh=used_kwh,
-            remaining_kwh=remaining_kwh,
-            unlimited=unlimited
-        ))
-    
-    return result
+    energy_usage = load_current_usage()
+    return json_response([user_quota_row(user, energy_usage) for user in users], etag)
 
 @app.post("/api/users", response_model=UserQuota)
-async def create_user(user: UserCreate, username: str = Depends(verify_token)):
-    users = load_users_csv()
-    
-    # Check if user already exists
-    if any(u['id_tag'] == user.id_tag for u in users):
-        raise HTTPException(status_code=400, detail="User with this ID tag already exists")
-    
+def create_user(user: UserCreate, username: str = Depends(verify_token)):
     unlimited = user.plan == "unlimited"
     new_user = {
         'id_tag': user.id_tag,
@@ -412,147 +563,764 @@ async def create_user(user: UserCreate, username: str = Depends(verify_token)):
         'quota_kwh': '0' if unlimited else str(user.quota_kwh),
         'unlimited': 'TRUE' if unlimited else 'FALSE'
     }
-    
-    users.append(new_user)
-    save_users_csv(users)
+    try:
+        user_store.create(new_user)
+    except KeyError:
+        raise HTTPException(status_code=400, detail="User with this ID tag already exists")
+    live_updates.announce("users", {"id_tag": user.id_tag, "action": "created"})
     
     return get_user_quota_info(user.id_tag)
 
-@app.put("/api/users/{id_tag}", response_model=UserQuota)
-async def update_user(id_tag: str, user_update: UserUpdate, username: str = Depends(verify_token)):
+def import_user_row(record):
+    """users1.csv row from an imported record (CSV column or API field names); raises ValueError."""
+    if not isinstance(record, dict):
+        raise ValueError("row must be an object")
+    id_tag = str(record.get('id_tag') or '').strip()
+    if not id_tag:
+        raise ValueError("id_tag is required")
+
+    plan = record.get('plan')
+    if plan not in (None, ''):
+        plan = str(plan).strip().lower()
+        if plan not in ("limited", "unlimited"):
+            raise ValueError(f"plan must be 'limited' or 'unlimited', got {plan!r}")
+        unlimited = plan == "unlimited"
+    else:
+        unlimited = str(record.get('unlimited', '')).strip().upper() in ('TRUE', '1', 'YES')
+
+    quota = '0'
+    if not unlimited:
+        value = record.get('quota_kwh')
+        try:
+            quota_kwh = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"quota_kwh must be a number for limited users, got {value!r}")
+        if not math.isfinite(quota_kwh) or quota_kwh < 0:
+            raise ValueError(f"quota_kwh must be a non-negative number, got {value!r}")
+        quota = str(quota_kwh)
+
+    return {
+        'id_tag': id_tag,
+        'header name': str(record.get('header name', record.get('header_name')) or '').strip(),
+        'surname': str(record.get('surname') or '').strip(),
+        'quota_kwh': quota,
+        'unlimited': 'TRUE' if unlimited else 'FALSE'
+    }
+
+class UserImport:
+    """
+    Validates an uploaded user file a chunk of lines at a time. Valid rows are kept by
+    id_tag (a tag repeated in the file keeps its last row); invalid ones are reported
+    with their line number. CSV fields must not contain line breaks.
+    """
+
+    def __init__(self, fmt: str):
+        self.fmt = fmt
+        self.header = None
+        self.line = 0
+        self.records = 0
+        self.rows = {}
+        self.errors = []
+        self.error_count = 0
+
+    def feed(self, lines):
+        for text in lines:
+            self.line += 1
+            text = text.rstrip("\r")
+            if not text.strip():
+                continue
+            try:
+                if self.fmt == "ndjson":
+                    record = json.loads(text)
+                else:
+                    values = next(csv.reader([text]))
+                    if self.header is None:
+                        self.header = [value.strip() for value in values]
+                        if 'id_tag' not in self.header:
+                            raise HTTPException(status_code=400, detail="CSV header must include an id_tag column")
+                        continue
+                    record = dict(zip(self.header, values))
+                self.records += 1
+                row = import_user_row(record)
+            except ValueError as e:
+                self.error_count += 1
+                if len(self.errors) < USER_IMPORT_MAX_ERRORS:
+                    self.errors.append({"line": self.line, "error": str(e)})
+                continue
+            self.rows[row['id_tag']] = row
+
+async def upload_lines(request: Request):
+    """Yield the request body as lists of complete text lines, one received chunk at a time."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    try:
+        async for chunk in request.stream():
+            pending += decoder.decode(chunk)
+            lines = pending.split("\n")
+            pending = lines.pop()
+            if lines:
+                yield lines
+        pending += decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Upload must be UTF-8 encoded")
+    if pending:
+        yield [pending]
+
+@app.post("/api/users/import")
+async def import_users(request: Request, format: Optional[str] = None, dry_run: bool = False,
+                       username: str = Depends(verify_token)):
+    """
+    Create or replace users from a CSV (users1.csv columns) or NDJSON upload. Valid rows
+    are committed together in one journal write; rows that fail validation are skipped
+    and listed in the report. With dry_run nothing is written.
+    """
+    content_type = request.headers.get("content-type", "")
+    fmt = format or ("ndjson" if "json" in content_type else "csv")
+    if fmt not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+
+    upload = UserImport(fmt)
+    async for lines in upload_lines(request):
+        # Validation is CPU-bound: keep it off the event loop
+        await run_in_threadpool(upload.feed, lines)
+
+    rows = list(upload.rows.values())
+    if dry_run:
+        user_store.refresh()
+        updated = sum(1 for row in rows if row['id_tag'] in user_store)
+        created = len(rows) - updated
+    else:
+        created, updated = await run_in_threadpool(user_store.upsert_many, rows)
+        if rows:
+            await live_updates.broadcast("users", {"action": "imported", "created": created, "updated": updated})
+
+    return {
+        "format": fmt,
+        "dry_run": dry_run,
+        "records": upload.records,
+        "created": created,
+        "updated": updated,
+        "error_count": upload.error_count,
+        "errors": upload.errors,
+    }
+
+def stream_user_export(users, energy_usage, fmt: str):
+    """Encode users joined with their current-period usage, USER_EXPORT_BATCH rows per chunk."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=USER_EXPORT_FIELDS)
+    if fmt == "csv":
+        writer.writeheader()
+    for start in range(0, len(users), USER_EXPORT_BATCH):
+        for user in users[start:start + USER_EXPORT_BATCH]:
+            quota = user_quota_row(user, energy_usage)
+            row = {**user, 'plan': quota['plan'], 'used_kwh': round(quota['used_kwh'], 3),
+                   'remaining_kwh': None if quota['remaining_kwh'] is None else round(quota['remaining_kwh'], 3)}
+            if fmt == "csv":
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps({field: row[field] for field in USER_EXPORT_FIELDS}, ensure_ascii=False) + "\n")
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+@app.get("/api/users/export")
+def export_users(format: str = "csv", username: str = Depends(verify_token)):
+    """All users with current-period usage as CSV (re-importable) or NDJSON, streamed."""
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
     users = load_users_csv()
-    
-    user_found = False
-    for user in users:
-        if user['id_tag'] == id_tag:
-            user_found = True
-            if user_update.header_name:
-                user['header name'] = user_update.header_name
-            if user_update.surname:
-                user['surname'] = user_update.surname
-            if user_update.plan:
-                unlimited = user_update.plan == "unlimited"
-                user['unlimited'] = 'TRUE' if unlimited else 'FALSE'
-                if unlimited:
-                    user['quota_kwh'] = '0'
-            if user_update.quota_kwh is not None and user_update.plan != "unlimited":
-                user['quota_kwh'] = str(user_update.quota_kwh)
-            break
-    
-    if not user_found:
+    energy_usage = load_current_usage()
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(stream_user_export(users, energy_usage, format), media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="users-{current_period()}.{format}"'})
+
+@app.put("/api/users/{id_tag}", response_model=UserQuota)
+def update_user(id_tag: str, user_update: UserUpdate, username: str = Depends(verify_token)):
+    changes = {}
+    if user_update.header_name:
+        changes['header name'] = user_update.header_name
+    if user_update.surname:
+        changes['surname'] = user_update.surname
+    if user_update.plan:
+        unlimited = user_update.plan == "unlimited"
+        changes['unlimited'] = 'TRUE' if unlimited else 'FALSE'
+        if unlimited:
+            changes['quota_kwh'] = '0'
+    if user_update.quota_kwh is not None and user_update.plan != "unlimited":
+        changes['quota_kwh'] = str(user_update.quota_kwh)
+
+    try:
+        user_store.update(id_tag, changes)
+    except KeyError:
         raise HTTPException(status_code=404, detail="User not found")
-    
-    save_users_csv(users)
+    live_updates.announce("users", {"id_tag": id_tag, "action": "updated"})
     return get_user_quota_info(id_tag)
 
 @app.delete("/api/users/{id_tag}")
-async def delete_user(id_tag: str, username: str = Depends(verify_token)):
-    users = load_users_csv()
+def delete_user(id_tag: str, username: str = Depends(verify_token)):
+    user_store.delete(id_tag)
     
-    users = [u for u in users if u['id_tag'] != id_tag]
-    save_users_csv(users)
-    
-    # Also remove from energy usage
-    energy_usage = load_json_file(ENERGY_USAGE_JSON, {})
-    if id_tag in energy_usage:
-        del energy_usage[id_tag]
-        save_json_file(ENERGY_USAGE_JSON, energy_usage)
+    # Also remove from the current period's usage (past periods are kept as history)
+    with current_usage_for_update() as energy_usage:
+        energy_usage.pop(id_tag, None)
+    live_updates.announce("users", {"id_tag": id_tag, "action": "deleted"})
     
     return {"message": "User deleted successfully"}
 
 @app.post("/api/users/{id_tag}/reset")
-async def reset_user_usage(id_tag: str, username: str = Depends(verify_token)):
-    energy_usage = load_json_file(ENERGY_USAGE_JSON, {})
-    
-    if id_tag in energy_usage:
-        energy_usage[id_tag] = 0
-        save_json_file(ENERGY_USAGE_JSON, energy_usage)
+def reset_user_usage(id_tag: str, username: str = Depends(verify_token)):
+    with current_usage_for_update() as energy_usage:
+        if id_tag in energy_usage:
+            energy_usage[id_tag] = 0
+    live_updates.announce("users", {"id_tag": id_tag, "action": "usage_reset"})
     
     return {"message": f"Usage reset for user {id_tag}", "user": get_user_quota_info(id_tag)}
 
-@app.get("/api/transactions")
-async def get_transactions(username: str = Depends(verify_token)):
-    transactions = load_json_file(ACTIVE_TRANSACTIONS_JSON, {})
-    return {"transactions": transactions}
+def encode_session_cursor(position: int):
+    token = json.dumps({"p": position, "f": session_archive.identity()})
+    return base64.urlsafe_b64encode(token.encode()).decode().rstrip("=")
 
-@app.get("/api/logs")
-async def get_logs(
+def decode_session_cursor(cursor: str):
+    """Archive position encoded in an opaque cursor from a previous page."""
+    try:
+        token = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        position, identity = int(token["p"]), token["f"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if identity != session_archive.identity():
+        raise HTTPException(status_code=400, detail="Cursor is no longer valid, start from the first page")
+    return position
+
+@app.get("/api/sessions")
+def get_sessions(
+    request: Request,
     username: str = Depends(verify_token),
+    user: Optional[str] = None,
     charger: Optional[str] = None,
-    limit: Optional[int] = None,
+    month: Optional[str] = None,
+    limit: int = SESSION_PAGE_SIZE,
+    cursor: Optional[str] = None,
 ):
-    logs = load_json_file(METER_DATA_LOG_JSON, [])
-    if charger:
-        logs = [log for log in logs if log.get('chargerName') == charger]
+    """
+    Completed sessions, newest first, filtered by id_tag, charger and start month ("YYYY-MM").
+    Pass the returned next_cursor to get the following page; it is null on the last one.
+    """
+    if month is not None and not re.fullmatch(r"\d{4}-\d{2}", month):
+        raise HTTPException(status_code=400, detail="Month must be formatted as YYYY-MM")
+    limit = max(1, min(limit, SESSION_MAX_PAGE_SIZE))
+    etag = data_etag(SESSIONS_JSON, extra=sorted(request.query_params.items()))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    before = decode_session_cursor(cursor) if cursor else None
+    sessions, next_position = session_archive.query(user=user, charger=charger, month=month,
+                                                    before=before, limit=limit)
+    return json_response({
+        "sessions": sessions,
+        "count": len(sessions),
+        "next_cursor": encode_session_cursor(next_position) if next_position is not None else None,
+    }, etag)
+
+@app.get("/api/sessions/summary")
+def get_session_summary(request: Request, response: Response, by: str = "user",
+                        username: str = Depends(verify_token)):
+    """Session count and energy per user, charger or start month, from the archive index."""
+    if by not in SESSION_INDEXES:
+        raise HTTPException(status_code=400, detail=f"by must be one of {', '.join(SESSION_INDEXES)}")
+    etag = data_etag(SESSIONS_JSON, extra=(by,))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_cache_headers(response, etag)
+    totals = session_archive.totals(by)
+    return {"by": by, "totals": [{"key": key, **values} for key, values in totals.items()]}
+
+@app.get("/api/usage/periods")
+def get_usage_periods(username: str = Depends(verify_token)):
+    """Billing periods with recorded usage, newest first."""
+    return {"current": current_period(), "periods": period_totals(load_usage_periods())}
+
+@app.get("/api/usage/periods/{period}")
+def get_period_usage(period: str, username: str = Depends(verify_token)):
+    """Per-user usage of one billing period ("YYYY-MM")."""
+    if not re.fullmatch(r"\d{4}-\d{2}", period):
+        raise HTTPException(status_code=400, detail="Period must be formatted as YYYY-MM")
+    ledger = load_usage_periods()
+    if period not in ledger and period != current_period():
+        raise HTTPException(status_code=404, detail="No usage recorded for this period")
+    usage = ledger.get(period, {})
+    return {"period": period, "total_kwh": round(sum(usage.values()), 3), "usage": usage}
+
+async def call_ocpp_admin(method: str, path: str, payload: Optional[dict] = None):
+    """Call every OCPP worker's admin API; returns the answers of the reachable ones."""
+    headers = {"X-Admin-Token": OCPP_ADMIN_TOKEN} if OCPP_ADMIN_TOKEN else {}
+
+    async def call_worker(session, base_url):
+        try:
+            async with session.request(method, base_url + path, json=payload, headers=headers) as response:
+                body = await response.json()
+                if response.status == 400:
+                    raise HTTPException(status_code=400, detail=body.get("detail"))
+                response.raise_for_status()
+                return body
+        except aiohttp.ClientError as e:
+            print(f"⚠️ OCPP admin API {base_url} unreachable: {e}")
+            return None
+
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None, connect=5)) as session:
+        answers = await asyncio.gather(*(call_worker(session, url) for url in OCPP_ADMIN_URLS))
+    answers = [answer for answer in answers if answer is not None]
+    if not answers:
+        raise HTTPException(status_code=503, detail="OCPP server admin API is not reachable")
+    return answers
+
+class LiveUpdates:
+    """
+    Fans out change-feed events of the OCPP workers (charger status, transactions,
+    usage, new log records) to /api/events clients. One long-poll per OCPP worker is
+    shared by every open browser tab. Dashboard-side user changes are broadcast
+    through the same feed so clients of every uvicorn worker see them.
+    """
 
-    if limit is not None and limit >= 0:
-        logs = logs[:limit] if limit > 0 else []
+    def __init__(self, urls, queue_size=1000):
+        self.urls = urls
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.followers = {}  # admin url -> task long-polling its /events
+        self.loop = None  # event loop owning the subscriber queues
+
+    def subscribe(self):
+        self.loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(self.queue_size)
+        self.subscribers.add(queue)
+        for url in self.urls:
+            if url not in self.followers:
+                self.followers[url] = asyncio.create_task(self.follow(url))
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def publish(self, event_type, data):
+        """Deliver an event to every subscriber; may be called from threadpool endpoints."""
+        if self.loop is None or not self.subscribers:
+            return
+        try:
+            on_loop = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._deliver(event_type, data)
+        else:
+            self.loop.call_soon_threadsafe(self._deliver, event_type, data)
 
-    return {"logs": logs}
-@app.get("/api/usage/history")
-async def get_usage_history(days: int = 7):
+    def _deliver(self, event_type, data):
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait((event_type, data))
+            except asyncio.QueueFull:
+                # Client can't keep up: drop its backlog and let it reload everything
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(("reset", {"reason": "client too slow"}))
+
+    async def broadcast(self, event_type, data):
+        """Publish an event on an OCPP change feed; delivered only locally when no feed is reachable."""
+        headers = {"X-Admin-Token": OCPP_ADMIN_TOKEN} if OCPP_ADMIN_TOKEN else {}
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5)) as session:
+            for url in self.urls:
+                try:
+                    async with session.post(url + "/events", json={"type": event_type, "data": data},
+                                            headers=headers) as response:
+                        response.raise_for_status()
+                        return
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    print(f"⚠️ Change feed {url} unavailable: {e}")
+        self.publish(event_type, data)
+
+    def announce(self, event_type, data):
+        """broadcast() from a threadpool endpoint."""
+        anyio.from_thread.run(self.broadcast, event_type, data)
+
+    async def follow(self, url):
+        """Long-poll one OCPP worker's change feed while anybody is listening."""
+        headers = {"X-Admin-Token": OCPP_ADMIN_TOKEN} if OCPP_ADMIN_TOKEN else {}
+        feed_id, seq = None, None
+        try:
+            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60)) as session:
+                while self.subscribers:
+                    params = {"timeout": "25"} if seq is None else {"since": str(seq), "timeout": "25"}
+                    try:
+                        async with session.get(url + "/events", params=params, headers=headers) as response:
+                            response.raise_for_status()
+                            answer = await response.json()
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        print(f"⚠️ Change feed {url} unavailable: {e}")
+                        await asyncio.sleep(5)
+                        continue
+                    if answer["feed"] != feed_id or answer["reset"]:
+                        if feed_id is not None:  # OCPP worker restarted or we fell behind
+                            self.publish("reset", {"reason": "change feed restarted"})
+                        feed_id = answer["feed"]
+                    for event in answer["events"]:
+                        self.publish(event["type"], event["data"])
+                    seq = answer["seq"]
+        finally:
+            self.followers.pop(url, None)
+
+live_updates = LiveUpdates(OCPP_ADMIN_URLS)
+
+@app.get("/api/admin/chargers")
+async def get_connected_chargers(username: str = Depends(verify_token)):
+    """Chargers connected to the OCPP server and their queued commands."""
+    answers = await call_ocpp_admin("GET", "/chargers")
+    chargers, pending = [], {}
+    for answer in answers:
+        chargers.extend(answer["chargers"])
+        pending.update(answer["pending"])
+    return {"chargers": sorted(chargers), "pending": pending}
+
+@app.post("/api/admin/commands")
+async def send_charger_commands(request: CommandRequest, username: str = Depends(verify_token)):
     """
-    ✅ General daily total across all chargers (Schneider + Livoltek)
-    - Schneider/EVlink: cumulative Wh → delta of first–last, convert to kWh
-    - Livoltek: incremental kWh → sum of positive differences
-    - Ignores user separation; sums all chargers' totals
-    - Prevents overcounting on reconnects
+    Send RemoteStopTransaction, TriggerMessage, ChangeConfiguration or Reset to many
+    chargers at once. Each OCPP worker commands the chargers connected to it.
+    """
+    if request.commands is None and not request.action:
+        raise HTTPException(status_code=400, detail="Either action or commands is required")
+    payload = request.model_dump(exclude_none=True)
+    answers = await call_ocpp_admin("POST", "/commands", payload)
+
+    results = [result for answer in answers for result in answer["results"]]
+    handled = {result["charger_id"] for result in results}
+    # A charger is offline only if no worker has it connected
+    offline = set.intersection(*(set(answer["not_connected"]) for answer in answers)) - handled
+    if request.commands is not None:
+        actions = {command.charger_id: command.action for command in request.commands}
+    else:
+        actions = dict.fromkeys(offline, request.action)
+    results.extend({"charger_id": charger_id, "action": actions.get(charger_id), "status": "NotConnected",
+                    "attempts": 0, "error": "charger is not connected", "elapsed": 0}
+                   for charger_id in sorted(offline))
+
+    accepted = sum(1 for result in results if result["status"] == "Accepted")
+    print(f"🛠️ {username} sent {len(results)} commands, {accepted} accepted")
+    return {"total": len(results), "accepted": accepted, "results": results}
+
+def ticket_key(ticket: str) -> str:
+    return hashlib.sha256(ticket.encode()).hexdigest()
+
+@app.post("/api/events/ticket")
+def create_events_ticket(username: str = Depends(verify_token)):
+    """
+    One-use ticket for opening /api/events, valid for SSE_TICKET_SECONDS. EventSource
+    can't send headers, and a ticket in the URL is harmless in access logs where the JWT is not.
+    """
+    ticket = secrets.token_urlsafe(32)
+    now = time.time()
+    with sse_tickets.locked() as tickets:
+        for key in [key for key, entry in tickets.items() if entry["expires"] < now]:
+            del tickets[key]
+        tickets[ticket_key(ticket)] = {"user": username, "expires": now + SSE_TICKET_SECONDS}
+    return {"ticket": ticket, "expires_in": SSE_TICKET_SECONDS}
+
+def redeem_events_ticket(ticket: str) -> str:
+    """Consume a ticket and return its user; 401 when it is unknown, used or expired."""
+    with sse_tickets.locked() as tickets:
+        entry = tickets.pop(ticket_key(ticket), None)
+    if entry is None or entry["expires"] < time.time():
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired ticket")
+    return entry["user"]
+
+@app.get("/api/events")
+async def stream_events(ticket: str):
     """
-    from collections import defaultdict
+    Server-Sent Events stream of dashboard changes, opened with a ticket from
+    POST /api/events/ticket. Event types: charger, transaction, usage, log,
+    users, and reset (reload everything).
+    """
+    await run_in_threadpool(redeem_events_ticket, ticket)
+    queue = live_updates.subscribe()
+
+    async def event_stream():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event_type, data = await asyncio.wait_for(queue.get(), 15)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"  # keeps proxies from closing an idle stream
+                    continue
+                yield f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            live_updates.unsubscribe(queue)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/api/cache/stats")
+def get_cache_stats(username: str = Depends(verify_token)):
+    """Hit ratios of the aggregate result cache, per endpoint."""
+    return {"ttl_seconds": result_cache.ttl, "endpoints": result_cache.stats()}
+
+cache_requests = metrics.counter(
+    "dashboard_cache_requests_total", "Result cache lookups (hit, coalesced or miss)", ("endpoint", "result"))
+cache_hit_ratio = metrics.gauge("dashboard_cache_hit_ratio", "Share of lookups served from the cache", ("endpoint",))
+cache_entries = metrics.gauge("dashboard_cache_entries", "Cached results", ("endpoint",))
+sse_clients = metrics.gauge("dashboard_sse_clients", "Open /api/events streams")
+sse_queued = metrics.gauge("dashboard_sse_queued_events", "Events waiting to be sent to /api/events clients")
+meter_readings = metrics.gauge("dashboard_meter_readings", "Meter readings loaded for analytics")
+store_writes = metrics.counter("dashboard_store_writes_total", "Writes of a shared data file by this process", ("file",))
+store_write_seconds = metrics.counter(
+    "dashboard_store_write_seconds_total", "Time spent writing a shared data file", ("file",))
+
+def collect_metrics():
+    """Copy cache, SSE and persistence statistics into the registry (once per scrape)."""
+    for endpoint, counts in result_cache.stats().items():
+        for result in ("hits", "coalesced", "misses"):
+            cache_requests.labels(endpoint, result).value = counts[result]
+        cache_hit_ratio.labels(endpoint).set(counts["hit_ratio"])
+        cache_entries.labels(endpoint).set(counts["entries"])
+    subscribers = list(live_updates.subscribers)
+    sse_clients.labels().set(len(subscribers))
+    sse_queued.labels().set(sum(queue.qsize() for queue in subscribers))
+    meter_readings.labels().set(len(analytics))
+    store_writes.labels(usage_store.path.name).value = usage_store.writes
+    store_write_seconds.labels(usage_store.path.name).value = usage_store.write_seconds
+
+metrics.add_collector(collect_metrics)
+
+@app.get("/metrics")
+def get_metrics(request: Request):
+    """Prometheus text format metrics of this API process, disabled until METRICS_TOKEN is set."""
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Metrics are disabled, set METRICS_TOKEN")
+    authorization = request.headers.get("Authorization", "").encode()
+    if not secrets.compare_digest(authorization, f"Bearer {METRICS_TOKEN}".encode()):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/transactions")
+def get_transactions(request: Request, username: str = Depends(verify_token)):
+    etag = data_etag(ACTIVE_TRANSACTIONS_JSON)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    transactions = load_json_file(ACTIVE_TRANSACTIONS_JSON, {})
+    return json_response({"transactions": transactions}, etag)
 
-    if not METER_DATA_LOG_JSON.exists():
-        return {"history": []}
+def encode_log_cursor(offset: int, order: str):
+    token = json.dumps({"o": offset, "d": order, "f": meter_log.identity()})
+    return base64.urlsafe_b64encode(token.encode()).decode().rstrip("=")
 
+def decode_log_cursor(cursor: str, order: str):
+    """Byte offset in the meter log encoded in an opaque cursor from a previous page."""
     try:
-        with open(METER_DATA_LOG_JSON, "r", encoding="utf-8") as f:
-            content = f.read().strip()
-            if not content:
-                return {"history": []}
+        token = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        offset, cursor_order, identity = int(token["o"]), token["d"], token["f"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if cursor_order != order or identity != meter_log.identity():
+        raise HTTPException(status_code=400, detail="Cursor is no longer valid, start from the first page")
+    return offset
+
+def as_utc(value: Optional[datetime]):
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+def log_filter(charger, user, since, until, min_power, max_power, min_energy, max_energy):
+    """Predicate for meter log records; cheap checks first, timestamps parsed only when needed."""
+    user = user.lower() if user else None
+
+    def matches(log):
+        if charger and log.get('chargerName') != charger:
+            return False
+        if user and str(log.get('userName', '')).lower() != user:
+            return False
+        power = log.get('totalPower', 0) or 0
+        if (min_power is not None and power < min_power) or (max_power is not None and power > max_power):
+            return False
+        energy = log.get('deliveredEnergy', 0) or 0
+        if (min_energy is not None and energy < min_energy) or (max_energy is not None and energy > max_energy):
+            return False
+        if since or until:
             try:
-                records = json.loads(content)
-            except json.JSONDecodeError:
-                records = [json.loads(line) for line in content.splitlines() if line.strip()]
-    except Exception as e:
-        print(f"⚠️ Could not read meter_data_log.json: {e}")
-        return {"history": []}
+                ts = datetime.fromisoformat(str(log.get('timestamp', '')).replace("Z", "+00:00"))
+            except ValueError:
+                return False
+            ts = as_utc(ts)
+            if (since and ts < since) or (until and ts >= until):
+                return False
+        return True
+
+    return matches
+
+def stream_log_page(records, matches, limit: int, order: str, chunk_size: int = 64 * 1024):
+    """Encode one page as JSON while reading it, so memory stays bounded by the page size."""
+    parts = [b'{"logs": [']
+    buffered = 0
+    count = scanned = 0
+    next_cursor = None
+    for position, log in (records if limit else ()):
+        scanned += 1
+        if matches(log):
+            part = (b"," if count else b"") + json_bytes(log)
+            parts.append(part)
+            buffered += len(part)
+            if buffered >= chunk_size:
+                yield b"".join(parts)
+                parts, buffered = [], 0
+            count += 1
+            if count == limit:
+                next_cursor = encode_log_cursor(position, order)
+                break
+        if scanned >= LOG_SCAN_LIMIT:
+            # Sparse filter: hand back what we have and let the client continue from here
+            next_cursor = encode_log_cursor(position, order)
+            break
+    parts.append(f'], "next_cursor": {json.dumps(next_cursor)}, "order": "{order}", "count": {count}, "scanned": {scanned}}}'.encode())
+    yield b"".join(parts)
 
-    grouped = defaultdict(list)
+@app.get("/api/logs")
+def get_logs(
+    request: Request,
+    username: str = Depends(verify_token),
+    charger: Optional[str] = None,
+    user: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    min_power: Optional[float] = None,
+    max_power: Optional[float] = None,
+    min_energy: Optional[float] = None,
+    max_energy: Optional[float] = None,
+    order: str = "desc",
+    limit: int = LOG_PAGE_SIZE,
+    cursor: Optional[str] = None,
+):
+    """
+    One page of meter readings, newest first by default (order=asc for oldest first).
+    Pass the returned next_cursor to get the following page; it is null on the last one.
+    """
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be 'asc' or 'desc'")
+    limit = max(0, min(limit, LOG_MAX_PAGE_SIZE))
+    etag = data_etag(METER_DATA_LOG, extra=sorted(request.query_params.items()))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    offset = decode_log_cursor(cursor, order) if cursor else None
+    if order == "desc":
+        records = meter_log.reverse(offset)
+    else:
+        records = meter_log.records(offset or 0)
+    matches = log_filter(charger, user, as_utc(since), as_utc(until), min_power, max_power, min_energy, max_energy)
+    return StreamingResponse(stream_log_page(records, matches, limit, order), media_type="application/json",
+                             headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
 
-    for rec in records:
-        try:
-            ts_raw = rec.get("timestamp")
-            if not ts_raw:
-                continue
-            ts = datetime.fromisoformat(ts_raw.replace("Z", "+00:00"))
-            date_key = ts.date().isoformat()
-
-            charger = str(rec.get("chargerName", "UNKNOWN")).upper()
-            delivered = float(rec.get("deliveredEnergy", 0.0))
-
-            grouped[(date_key, charger)].append((ts, delivered))
-        except Exception as e:
-            print(f"⚠️ Skipping record: {e}")
-
-    # --- Calculate daily energy per charger ---
-    daily_totals = defaultdict(float)
-    for (date_key, charger), readings in grouped.items():
-        readings.sort(key=lambda x: x[0])
-
-        if "SCHNEIDER" in charger or "EVLINK" in charger:
-            first, last = readings[0][1], readings[-1][1]
-            delta_kwh = max(0.0, (last - first) / 1000.0)
-        elif "LIVOLTEK" in charger:
-            delta_kwh = 0.0
-            for i in range(1, len(readings)):
-                if readings[i][1] > readings[i - 1][1]:
-                    delta_kwh += readings[i][1] - readings[i - 1][1]
+def reading_time(record):
+    try:
+        return as_utc(datetime.fromisoformat(str(record.get('timestamp', '')).replace("Z", "+00:00")))
+    except ValueError:
+        return None
+
+def stream_readings_export(start, end, charger, fmt: str, units: str, chunk_size: int = 64 * 1024):
+    """
+    Encode readings with start <= timestamp < end, oldest first. Reading starts at the
+    log offset found by bisecting on timestamps and stops once readings are past `end`,
+    so only the requested part of the log is read, one line at a time.
+    """
+    offset = meter_log.bisect(start - READING_EXPORT_SLACK, reading_time) if start else 0
+    stop = end + READING_EXPORT_SLACK if end else None
+    charger = charger.upper() if charger else None
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=READING_EXPORT_FIELDS, extrasaction="ignore")
+    if fmt == "csv":
+        writer.writeheader()
+    for _, record in meter_log.records(offset):
+        ts = reading_time(record)
+        if ts is None:
+            continue
+        if stop and ts >= stop:
+            break
+        if (start and ts < start) or (end and ts >= end):
+            continue
+        name = str(record.get('chargerName', 'UNKNOWN')).upper()
+        if charger and name != charger:
+            continue
+        unit = energy_unit(name)
+        if units == "kwh":
+            for field in ('deliveredEnergy', 'suppliedEnergy'):
+                if isinstance(record.get(field), (int, float)):
+                    record[field] = round(record[field] * unit, 6)
+            record['energyUnit'] = "kWh"
+        else:
+            record['energyUnit'] = "Wh" if unit != 1.0 else "kWh"
+        if fmt == "csv":
+            writer.writerow(record)
         else:
-            delta_kwh = 0.0
+            buffer.write(json.dumps(record, ensure_ascii=False) + "\n")
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+@app.get("/api/export/readings")
+def export_readings(
+    username: str = Depends(verify_token),
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    charger: Optional[str] = None,
+    format: str = "csv",
+    units: str = "kwh",
+):
+    """
+    Meter readings in [from, to) as CSV or NDJSON, streamed oldest first. units=kwh converts
+    Schneider/EVlink Wh registers to kWh; units=raw keeps them as sent, with energyUnit saying which.
+    Compressed on the fly for clients that accept gzip/brotli.
+    """
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+    if units not in ("kwh", "raw"):
+        raise HTTPException(status_code=400, detail="units must be kwh or raw")
+    start, end = as_utc(start), as_utc(end)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    name = "-".join(part for part in ("readings", charger, start and start.date().isoformat(),
+                                      end and end.date().isoformat()) if part)
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+    return StreamingResponse(stream_readings_export(start, end, charger, format, units), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{name}.{format}"'})
+
+@app.get("/api/usage/history")
+def get_usage_history(request: Request, response: Response, days: int = Query(7, ge=1, le=365)):
+    today = datetime.now(timezone.utc).date()
+    etag = data_etag(METER_DATA_LOG, extra=(today, days))
+    if etag_matches(request, etag):
+        return not_modified(etag)
 
-        daily_totals[date_key] += delta_kwh
+    def history_revision():
+        return today
 
-    # --- Build last N days history ---
+    def compute():
+        return etag, compute_usage_history(days)
+
+    etag, history = result_cache.get_or_compute(("usage_history", days), history_revision, compute)
+    set_cache_headers(response, etag)
+    return history
+
+def compute_usage_history(days: int):
+    """
+    ✅ General daily total across all chargers (Schneider + Livoltek)
+    - Register increments per charger, Schneider/EVlink Wh converted to kWh
+    - Meter resets and new sessions count from zero instead of going negative
+    - Ignores user separation; sums all chargers' totals
+    """
     today = datetime.now(timezone.utc).date()
+    first_day = today - timedelta(days=days - 1)
+    start = int(datetime.combine(first_day, datetime.min.time(), tzinfo=timezone.utc).timestamp())
+    daily_totals = analytics.totals("day", start=start)
+
+    # --- Build last N days history ---
     history = []
     for i in range(days):
         d = (today - timedelta(days=days - i - 1)).isoformat()
@@ -564,6 +1332,49 @@ async def get_usage_history(days: int = 7):
     print("✅ Corrected general daily energy history:", history)
     return {"history": history}
 
+@app.get("/api/analytics/energy")
+def get_energy_breakdown(
+    request: Request,
+    response: Response,
+    username: str = Depends(verify_token),
+    by: str = "day",
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    charger: Optional[str] = None,
+    user: Optional[str] = None,
+):
+    """Delivered energy per day, hour, charger or user from the meter log, with meter reset counts."""
+    if by not in BREAKDOWNS:
+        raise HTTPException(status_code=400, detail=f"by must be one of {', '.join(BREAKDOWNS)}")
+    start, end = as_utc(start), as_utc(end)
+    etag = data_etag(METER_DATA_LOG, extra=sorted(request.query_params.items()))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    def breakdown_revision():
+        return None  # only the meter log, reused for the cache TTL
+
+    def compute():
+        rows = analytics.breakdown(
+            by,
+            start=int(start.timestamp()) if start else None,
+            end=int(end.timestamp()) if end else None,
+            charger=charger,
+            user=user,
+        )
+        return etag, {
+            "by": by,
+            "from": start.isoformat() if start else None,
+            "to": end.isoformat() if end else None,
+            "total_kwh": round(sum(row["energy_kwh"] for row in rows), 3),
+            "rows": rows,
+        }
+
+    etag, breakdown = result_cache.get_or_compute(
+        ("analytics", by, start, end, charger, user), breakdown_revision, compute)
+    set_cache_headers(response, etag)
+    return breakdown
+
 
 
 
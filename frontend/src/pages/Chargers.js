@@ -4,6 +4,7 @@ import { Badge } from '../components/ui/badge';
 import { Button } from '../components/ui/button';
 import { Tabs, TabsContent, TabsList, TabsTrigger } from '../components/ui/tabs';
 import api from '../utils/api';
+import { useLiveEvents, upsertBy } from '../utils/liveEvents';
 import { Zap, Clock, Activity, Filter } from 'lucide-react';
 
 const Chargers = () => {
@@ -22,11 +23,19 @@ const Chargers = () => {
     }
   };
 
+  const live = useLiveEvents({
+    charger: (charger) => setChargers((prev) => upsertBy(prev, charger, 'id')),
+    reset: fetchChargers,
+  });
+
   useEffect(() => {
     fetchChargers();
+    if (live) {
+      return undefined; // updates arrive through /api/events
+    }
     const interval = setInterval(fetchChargers, 10000);
     return () => clearInterval(interval);
-  }, []);
+  }, [live]);
 
   const getStatusColor = (status) => {
     switch (status) {
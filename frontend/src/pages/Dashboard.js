@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { Card } from '../components/ui/card';
 import { Badge } from '../components/ui/badge';
 import api from '../utils/api';
+import { useLiveEvents } from '../utils/liveEvents';
 import { Zap, Users, Battery, TrendingUp, Activity, BarChart3 } from 'lucide-react';
 import { LineChart, Line, BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer, Legend } from 'recharts';
 
@@ -32,11 +33,21 @@ const Dashboard = () => {
     }
   };
 
+  const live = useLiveEvents({
+    transaction: ({ transaction_id, state, ...tx }) =>
+      setTransactions((prev) => {
+        const others = prev.filter(([txId]) => txId !== transaction_id);
+        return state === 'started' ? [...others, [transaction_id, tx]] : others;
+      }),
+    reset: fetchData,
+  });
+
   useEffect(() => {
     fetchData();
-    const interval = setInterval(fetchData, 10000); // Poll every 10 seconds
+    // Active sessions are pushed live; stats and history are aggregates, refreshed less often
+    const interval = setInterval(fetchData, live ? 60000 : 10000); // Poll every 10 seconds without live updates
     return () => clearInterval(interval);
-  }, []);
+  }, [live]);
 
   if (loading) {
     return (
@@ -18,8 +18,12 @@ import {
   TableRow,
 } from '../components/ui/table';
 import api from '../utils/api';
+import { useLiveEvents, upsertBy } from '../utils/liveEvents';
+import { Button } from '../components/ui/button';
 import { ScrollText, Search, Filter } from 'lucide-react';
 
+const PAGE_SIZE = 200;
+
 const Logs = () => {
   const [logs, setLogs] = useState([]);
   const [filteredLogs, setFilteredLogs] = useState([]);
@@ -27,15 +31,24 @@ const Logs = () => {
   const [chargerFilter, setChargerFilter] = useState('all');
   const [loading, setLoading] = useState(true);
   const [chargers, setChargers] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+
+  // Newest readings first; older pages are loaded on demand
+  const logParams = () => ({
+    limit: PAGE_SIZE,
+    ...(chargerFilter !== 'all' ? { charger: chargerFilter } : {}),
+  });
 
   const fetchLogs = async () => {
     try {
       const [logsRes, chargersRes] = await Promise.all([
-        api.get('/api/logs'),
+        api.get('/api/logs', { params: logParams() }),
         api.get('/api/chargers')
       ]);
       setLogs(logsRes.data.logs || []);
       setFilteredLogs(logsRes.data.logs || []);
+      setNextCursor(logsRes.data.next_cursor);
       setChargers(chargersRes.data.chargers || []);
       setLoading(false);
     } catch (error) {
@@ -44,11 +57,36 @@ const Logs = () => {
     }
   };
 
+  const fetchOlderLogs = async () => {
+    setLoadingMore(true);
+    try {
+      const response = await api.get('/api/logs', { params: { ...logParams(), cursor: nextCursor } });
+      setLogs((prev) => [...prev, ...(response.data.logs || [])]);
+      setNextCursor(response.data.next_cursor);
+    } catch (error) {
+      console.error('Error fetching older logs:', error);
+    }
+    setLoadingMore(false);
+  };
+
+  const live = useLiveEvents({
+    log: (log) => {
+      if (chargerFilter === 'all' || log.chargerName === chargerFilter) {
+        setLogs((prev) => [log, ...prev]);
+      }
+    },
+    charger: (charger) => setChargers((prev) => upsertBy(prev, charger, 'id')),
+    reset: fetchLogs,
+  });
+
   useEffect(() => {
     fetchLogs();
+    if (live) {
+      return undefined; // new records arrive through /api/events
+    }
     const interval = setInterval(fetchLogs, 10000);
     return () => clearInterval(interval);
-  }, []);
+  }, [live, chargerFilter]);
 
   useEffect(() => {
     let filtered = logs;
@@ -140,7 +178,7 @@ const Logs = () => {
         </div>
         <div className="mt-4 flex items-center justify-between">
           <p className="text-sm text-slate-600 dark:text-slate-400">
-            Showing {filteredLogs.length} of {logs.length} logs
+            Showing {filteredLogs.length} of {logs.length} loaded logs
           </p>
           <Badge variant="secondary">{filteredLogs.length} Results</Badge>
         </div>
@@ -192,6 +230,13 @@ const Logs = () => {
             <p>No logs found matching your criteria</p>
           </div>
         )}
+        {nextCursor && (
+          <div className="flex justify-center py-4">
+            <Button variant="outline" onClick={fetchOlderLogs} disabled={loadingMore} data-testid="logs-load-more">
+              {loadingMore ? 'Loading...' : 'Load older logs'}
+            </Button>
+          </div>
+        )}
       </Card>
     </div>
   );
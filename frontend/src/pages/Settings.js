@@ -127,7 +127,7 @@ const Settings = () => {
             <p className="text-xs text-slate-600 dark:text-slate-400 mt-1">Currently active charging sessions</p>
           </div>
           <div className="p-3 bg-slate-50 dark:bg-slate-800 rounded-lg">
-            <code className="text-xs text-slate-700 dark:text-slate-300">meter_data_log.json</code>
+            <code className="text-xs text-slate-700 dark:text-slate-300">meter_data_log.ndjson</code>
             <p className="text-xs text-slate-600 dark:text-slate-400 mt-1">Formatted energy readings history</p>
           </div>
         </div>
@@ -30,6 +30,7 @@ import {
   TableRow,
 } from '../components/ui/table';
 import api from '../utils/api';
+import { useLiveEvents } from '../utils/liveEvents';
 import { Users, UserPlus, Edit, Trash2, RotateCcw, AlertTriangle } from 'lucide-react';
 import { useToast } from '../hooks/use-toast';
 
@@ -67,11 +68,23 @@ const UsersPage = () => {
     }
   };
 
+  const live = useLiveEvents({
+    usage: ({ id_tag, used_kwh, remaining_kwh }) =>
+      setUsers((prev) =>
+        prev.map((u) => (u.id_tag === id_tag ? { ...u, used_kwh, remaining_kwh } : u))
+      ),
+    users: fetchUsers,
+    reset: fetchUsers,
+  });
+
   useEffect(() => {
     fetchUsers();
+    if (live) {
+      return undefined; // updates arrive through /api/events
+    }
     const interval = setInterval(fetchUsers, 10000);
     return () => clearInterval(interval);
-  }, []);
+  }, [live]);
 
   const handleAddUser = async () => {
     try {
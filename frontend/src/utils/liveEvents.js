@@ -0,0 +1,84 @@
+import { useEffect, useRef, useState } from 'react';
+import api from './api';
+
+const API_URL = process.env.REACT_APP_BACKEND_URL;
+
+const EVENT_TYPES = ['charger', 'transaction', 'usage', 'log', 'users', 'reset'];
+const RECONNECT_DELAY = 5000;
+
+// Subscribe to /api/events (Server-Sent Events). `handlers` maps event types to callbacks.
+// Returns true while the stream is open; pages fall back to polling when it is not.
+// Every connection is opened with a fresh one-use ticket, so the JWT never appears in a URL.
+export const useLiveEvents = (handlers) => {
+  const [connected, setConnected] = useState(false);
+  const handlersRef = useRef(handlers);
+  handlersRef.current = handlers;
+
+  useEffect(() => {
+    if (!localStorage.getItem('token') || typeof EventSource === 'undefined') {
+      return undefined;
+    }
+
+    let source = null;
+    let retryTimer = null;
+    let closed = false;
+
+    const reconnect = () => {
+      if (!closed) {
+        retryTimer = setTimeout(connect, RECONNECT_DELAY);
+      }
+    };
+
+    const connect = async () => {
+      let ticket;
+      try {
+        ({ ticket } = (await api.post('/api/events/ticket')).data);
+      } catch (error) {
+        reconnect();
+        return;
+      }
+      if (closed) {
+        return;
+      }
+      source = new EventSource(`${API_URL || ''}/api/events?ticket=${encodeURIComponent(ticket)}`);
+      source.onopen = () => setConnected(true);
+      // The ticket is spent: instead of letting EventSource retry with it, poll and reconnect with a new one
+      source.onerror = () => {
+        setConnected(false);
+        source.close();
+        reconnect();
+      };
+      EVENT_TYPES.forEach((type) => {
+        source.addEventListener(type, (event) => {
+          const handler = handlersRef.current[type];
+          if (handler) {
+            handler(JSON.parse(event.data));
+          }
+        });
+      });
+    };
+
+    connect();
+
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      if (source) {
+        source.close();
+      }
+    };
+  }, []);
+
+  return connected;
+};
+
+// Insert or replace the item whose `key` matches
+export const upsertBy = (items, item, key) => {
+  const index = items.findIndex((existing) => existing[key] === item[key]);
+  if (index === -1) {
+    return [...items, item];
+  }
+  const next = [...items];
+  next[index] = { ...items[index], ...item };
+  return next;
+};
@@ -0,0 +1,37 @@
+import importlib.util
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND = Path(__file__).resolve().parents[1] / "backend"
+
+# The OCPP modules import each other as top-level scripts; backend/ goes last so that
+# backend/ocpp does not shadow the installed `ocpp` library
+sys.path.insert(0, str(BACKEND / "ocpp"))
+sys.path.append(str(BACKEND))
+
+
+@pytest.fixture
+def dashboard(tmp_path):
+    """
+    A fresh import of server.py whose DATA_DIR is tmp_path/backend/data (the module
+    resolves it next to its own file), with the login dependency skipped.
+    """
+    backend = tmp_path / "backend"
+    (backend / "data").mkdir(parents=True)
+    shutil.copy(BACKEND / "server.py", backend / "server.py")
+    spec = importlib.util.spec_from_file_location("dashboard_server", backend / "server.py")
+    server = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(server)
+    server.app.dependency_overrides[server.verify_token] = lambda: "admin"
+    return server
+
+
+@pytest.fixture
+def client(dashboard):
+    from fastapi.testclient import TestClient
+
+    with TestClient(dashboard.app) as client:
+        yield client
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from analytics import MeterAnalytics
+from meter_log import MeterLog
+
+
+def reading(charger, minute, energy, user="Ada Lovelace", id_tag=None, power=7000):
+    record = {"timestamp": f"2025-01-15T10:{minute:02d}:00Z", "userName": user, "chargerName": charger,
+              "totalPower": power, "deliveredEnergy": energy}
+    if id_tag:
+        record["idTag"] = id_tag
+    return record
+
+
+@pytest.fixture
+def write(tmp_path):
+    path = tmp_path / "meter_data_log.ndjson"
+
+    def write_records(records, separators=None, mode="a"):
+        with open(path, mode, encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, separators=separators) + "\n")
+        return MeterLog(path)
+    return write_records
+
+
+def test_register_reset_counts_from_zero(write):
+    log = write([reading("LIVOLTEK_01", m, e) for m, e in enumerate([10.0, 12.0, 15.0, 1.5, 4.0])])
+    rows = MeterAnalytics(log).breakdown("charger")
+    # 2 + 3 before the reset, then 1.5 since the restart and 2.5 more
+    assert rows == [{"key": "LIVOLTEK_01", "energy_kwh": 9.0, "readings": 5, "resets": 1}]
+
+
+def test_wh_registers_are_converted_and_unknown_brands_not_counted(write):
+    log = write([reading("SCHNEIDER/EVlinkProAC", 0, 1000.0), reading("SCHNEIDER/EVlinkProAC", 1, 3500.0),
+                 reading("BEDAS01", 0, 10.0), reading("BEDAS01", 1, 20.0)])
+    assert MeterAnalytics(log).totals("charger") == {"SCHNEIDER/EVLINKPROAC": 2.5, "BEDAS01": 0.0}
+
+
+def test_user_breakdown_is_keyed_by_id_tag(write):
+    log = write([reading("LIVOLTEK_01", 0, 1.0, user="Unknown"),
+                 reading("LIVOLTEK_01", 1, 2.0, id_tag="RFID001"),
+                 reading("LIVOLTEK_01", 2, 4.0, id_tag="RFID001"),
+                 reading("LIVOLTEK_01", 3, 5.0, user="Old Name")])  # logged before idTag existed
+    analytics = MeterAnalytics(log)
+    assert analytics.totals("user") == {"RFID001": 3.0, "Old Name": 1.0, "Unknown": 0.0}
+    assert analytics.breakdown("day", user="RFID001")[0]["energy_kwh"] == 3.0
+
+
+def test_compact_json_separators_are_parsed(write):
+    log = write([reading("LIVOLTEK_01", m, float(m)) for m in range(4)], separators=(",", ":"))
+    analytics = MeterAnalytics(log)
+    assert analytics.refresh() == 4
+    assert analytics.totals("charger") == {"LIVOLTEK_01": 3.0}
+
+
+def test_appends_are_read_incrementally_and_rewrites_reload(write):
+    log = write([reading("LIVOLTEK_01", 0, 1.0), reading("LIVOLTEK_01", 1, 2.0)])
+    analytics = MeterAnalytics(log)
+    assert analytics.refresh() == 2
+    write([reading("LIVOLTEK_01", 2, 4.0)])
+    assert analytics.refresh() == 1
+    assert analytics.totals("charger") == {"LIVOLTEK_01": 3.0}
+
+    # Rewritten in place with more data: not an append of the old content
+    write([reading("LIVOLTEK_02", m, float(m)) for m in range(5)], mode="w")
+    assert analytics.refresh() == 5
+    assert analytics.totals("charger") == {"LIVOLTEK_02": 4.0}
@@ -0,0 +1,143 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+import websockets
+
+import ocpp_server
+from ocpp.v16.enums import AuthorizationStatus
+from server_config import ServerConfig
+from user_store import UserStore
+
+
+class FakeConnection:
+    """Websocket stand-in: recv() blocks until close(), which takes `close_delay` seconds."""
+
+    def __init__(self, close_delay=0.0):
+        self.open = True
+        self.close_delay = close_delay
+        self.messages = []
+        self._closed = asyncio.Event()
+
+    async def recv(self):
+        await self._closed.wait()
+        raise websockets.exceptions.ConnectionClosed(None, None)
+
+    async def close(self, code=1000, reason=""):
+        await asyncio.sleep(self.close_delay)
+        self.open = False
+        self._closed.set()
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(ocpp_server, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(ocpp_server, "SESSIONS_JSON", tmp_path / "sessions.json")
+    monkeypatch.setattr(ocpp_server, "METER_LOG_NDJSON", tmp_path / "meter_data_log.ndjson")
+    (tmp_path / "users1.csv").write_text("id_tag,header name,surname,quota_kwh,unlimited\n"
+                                         "AAAA0001,Ada,Lovelace,10,FALSE\n")
+    return tmp_path
+
+
+@pytest.fixture
+def central(data_dir):
+    return ocpp_server.CentralSystem(ServerConfig(idle_timeout=60, local_list_interval=None))
+
+
+def add_charger(central, charge_point_id, idle_seconds=0.0, close_delay=0.0):
+    cp = ocpp_server.ChargePoint(charge_point_id, FakeConnection(close_delay), central.meter_formatter,
+                                 central.api_sender, central.quota_manager, central.charger_status_manager)
+    cp.last_message_time -= idle_seconds
+    central.chargers[charge_point_id] = cp
+    return cp
+
+
+def test_reaper_closes_idle_sessions_concurrently(central):
+    async def scenario():
+        for n in range(5):
+            add_charger(central, f"DEAD_{n}", idle_seconds=120, close_delay=0.2)
+        add_charger(central, "LIVE", idle_seconds=5)
+        started = time.monotonic()
+        reaped = await central.reap_idle_chargers()
+        return reaped, time.monotonic() - started
+
+    reaped, elapsed = asyncio.run(scenario())
+    assert reaped == 5
+    assert elapsed < 0.6  # one close_delay, not five
+    assert [cp.id for cp in central.chargers.values() if cp._connection.open] == ["LIVE"]
+    # Closed sessions stay until on_connect releases them, but no longer count as live
+    assert central.connection_stats() == {"open_sockets": 0, "sessions": 6, "live_sessions": 1}
+
+
+def test_reaper_is_off_without_an_idle_timeout(central):
+    central.config = ServerConfig(idle_timeout=None)
+    add_charger(central, "SILENT", idle_seconds=10 ** 6)
+    assert asyncio.run(central.reap_idle_chargers()) == 0
+    assert central.connection_stats()["live_sessions"] == 1
+
+
+def test_reconnect_releases_the_stale_session(central):
+    def status():
+        return central.charger_status_manager.chargers["CP1"]["status"]
+
+    async def scenario():
+        first, second = FakeConnection(), FakeConnection()
+        old = asyncio.create_task(central.on_connect(first, "/CP1"))
+        await asyncio.sleep(0.05)
+        stale = central.chargers["CP1"]
+        new = asyncio.create_task(central.on_connect(second, "/CP1"))
+        await asyncio.wait_for(old, 1)  # closed on behalf of the new connection
+        assert not first.open
+        assert central.chargers["CP1"] is not stale and central.chargers["CP1"]._connection is second
+        assert status() == "Available"  # the stale session did not mark it Offline
+
+        await second.close()
+        await asyncio.wait_for(new, 1)
+        assert "CP1" not in central.chargers
+        assert status() == "Offline"
+
+    asyncio.run(scenario())
+    assert central.metrics.disconnects.labels("CP1").value == 2
+
+
+def test_user_edits_are_reloaded_and_refresh_the_local_list(data_dir):
+    central = ocpp_server.CentralSystem(ServerConfig(user_reload_interval=0.01))
+    assert central.local_list.entries == {"AAAA0001": AuthorizationStatus.accepted}
+    dashboard = UserStore(data_dir / "users1.csv")
+    dashboard.refresh()
+
+    async def scenario():
+        task = asyncio.create_task(central.run_user_reload())
+        central.local_list.changed.clear()
+        dashboard.delete("AAAA0001")
+        dashboard.create({"id_tag": "BBBB0002", "header name": "Bob", "surname": "Blocked",
+                          "quota_kwh": "0", "unlimited": "FALSE"})
+        await asyncio.wait_for(central.local_list.changed.wait(), 1)
+        task.cancel()
+
+    asyncio.run(scenario())
+    assert set(central.quota_manager.users) == {"BBBB0002"}
+    central.local_list.refresh()
+    assert central.local_list.entries == {"BBBB0002": AuthorizationStatus.blocked}
+
+
+def test_failed_remote_stop_clears_the_pending_flag(central):
+    errors = []
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        loop.set_exception_handler(lambda loop, context: errors.append(context))
+        cp = add_charger(central, "CP1")
+        cp.dispatcher = SimpleNamespace(submit=lambda *args: loop.create_future())
+        pending = central.quota_manager.stop_pending
+
+        pending.update({"7", "8", "9"})
+        cp.stop_transaction_remotely(7).set_exception(ConnectionError("CP1 is not connected"))
+        cp.stop_transaction_remotely(8).cancel()
+        cp.stop_transaction_remotely(9).set_result({"status": "Accepted", "error": None})
+        await asyncio.sleep(0)
+        return set(pending)
+
+    assert asyncio.run(scenario()) == {"9"}  # only the accepted stop stays pending
+    assert errors == []
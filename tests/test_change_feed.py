@@ -0,0 +1,34 @@
+import asyncio
+
+from change_feed import ChangeFeed
+
+
+def test_since_returns_events_after_the_sequence_number():
+    feed = ChangeFeed()
+    for n in range(3):
+        feed.publish("charger", {"n": n})
+    assert [event["seq"] for event in feed.since(1)] == [2, 3]
+    assert feed.since(3) == []
+    assert [event["data"]["n"] for event in feed.since(0)] == [0, 1, 2]
+
+
+def test_since_reports_dropped_and_unknown_sequence_numbers():
+    feed = ChangeFeed(maxlen=2)
+    for n in range(5):
+        feed.publish("usage", {"n": n})
+    assert [event["seq"] for event in feed.since(3)] == [4, 5]
+    assert feed.since(2) is None  # event 3 was dropped
+    assert feed.since(6) is None  # from a feed that restarted
+
+
+def test_wait_wakes_up_on_publish():
+    async def scenario():
+        feed = ChangeFeed()
+        waiter = asyncio.create_task(feed.wait(0, timeout=5))
+        await asyncio.sleep(0)
+        feed.publish("users", {"action": "created"})
+        events = await waiter
+        assert [event["type"] for event in events] == ["users"]
+        assert await feed.wait(1, timeout=0.01) == []
+
+    asyncio.run(scenario())
@@ -0,0 +1,141 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from ocpp.v16 import call
+
+from command_dispatcher import CommandDispatcher
+
+
+class FakeChargePoint:
+    """Answers calls from a script: a status string, None (CallError) or "hang" (no answer)."""
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.calls = []
+
+    async def call(self, payload):
+        self.calls.append(payload)
+        answer = self.answers.pop(0) if self.answers else "Accepted"
+        if answer == "hang":
+            await asyncio.sleep(3600)
+        if answer is None:
+            return None
+        return SimpleNamespace(status=answer, list_version=7)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def make(chargers, **kwargs):
+    return CommandDispatcher(chargers, timeout=0.05, retries=2, retry_delay=0.01, **kwargs)
+
+
+def test_answer_is_final():
+    cp = FakeChargePoint("Rejected")
+
+    async def main():
+        return await make({"CP1": cp}).submit("CP1", "Reset", {"type": "Soft"})
+
+    result = run(main())
+    assert (result["status"], result["attempts"]) == ("Rejected", 1)
+    assert len(cp.calls) == 1
+
+
+def test_idempotent_action_is_retried_after_a_timeout():
+    cp = FakeChargePoint("hang", "Accepted")
+
+    async def main():
+        return await make({"CP1": cp}).submit("CP1", "RemoteStopTransaction", {"transaction_id": 1})
+
+    result = run(main())
+    assert (result["status"], result["attempts"]) == ("Accepted", 2)
+
+
+@pytest.mark.parametrize("action, params", [
+    ("Reset", {"type": "Hard"}),
+    ("ChangeConfiguration", {"key": "HeartbeatInterval", "value": "60"}),
+])
+def test_unsafe_action_is_not_resent_after_a_timeout(action, params):
+    cp = FakeChargePoint("hang", "Accepted")
+
+    async def main():
+        return await make({"CP1": cp}).submit("CP1", action, params)
+
+    result = run(main())
+    assert (result["status"], result["attempts"]) == ("Timeout", 1)
+    assert len(cp.calls) == 1
+
+
+def test_offline_charger_is_retried_until_it_connects():
+    chargers = {}
+    cp = FakeChargePoint("Accepted")
+
+    async def main():
+        dispatcher = make(chargers)
+        future = dispatcher.submit("CP1", "Reset", {"type": "Soft"})
+        await asyncio.sleep(0.005)
+        chargers["CP1"] = cp  # reconnects before the first retry
+        return await future
+
+    result = run(main())
+    assert (result["status"], result["attempts"]) == ("Accepted", 2)
+
+
+def test_gives_up_after_the_retries():
+    async def main():
+        return await make({}).submit("CP1", "TriggerMessage", {"requested_message": "Heartbeat"})
+
+    result = run(main())
+    assert (result["status"], result["attempts"]) == ("NotConnected", 3)
+
+
+def test_full_queue_rejects_new_commands():
+    cp = FakeChargePoint("hang")
+
+    async def main():
+        dispatcher = make({"CP1": cp}, max_queue=1)
+        dispatcher.submit("CP1", "Reset", {"type": "Soft"})  # being sent
+        await asyncio.sleep(0)
+        dispatcher.submit("CP1", "Reset", {"type": "Soft"})  # queued
+        return await dispatcher.submit("CP1", "Reset", {"type": "Soft"})
+
+    result = run(main())
+    assert result["status"] == "QueueFull"
+
+
+def test_commands_of_one_charger_are_sent_in_order():
+    cp = FakeChargePoint()
+
+    async def main():
+        dispatcher = make({"CP1": cp})
+        return await dispatcher.dispatch([
+            ("CP1", "TriggerMessage", {"requested_message": "Heartbeat"}),
+            ("CP1", "Reset", {"type": "Soft"}),
+        ])
+
+    results = run(main())
+    assert [r["action"] for r in results] == ["TriggerMessage", "Reset"]
+    assert [type(p).__name__ for p in cp.calls] == ["TriggerMessagePayload", "ResetPayload"]
+
+
+def test_unknown_action_is_rejected():
+    with pytest.raises(ValueError):
+        CommandDispatcher.build_payload("RemoteStartTransaction", {"id_tag": "A"})
+
+
+def test_call_returns_the_raw_response_and_raises_on_errors():
+    cp = FakeChargePoint("Accepted", "hang")
+
+    async def main():
+        dispatcher = make({"CP1": cp})
+        response = await dispatcher.call("CP1", call.GetLocalListVersionPayload())
+        with pytest.raises(asyncio.TimeoutError):
+            await dispatcher.call("CP1", call.GetLocalListVersionPayload())
+        with pytest.raises(ConnectionError):
+            await dispatcher.call("CP2", call.GetLocalListVersionPayload())
+        return response
+
+    assert run(main()).list_version == 7
+    assert len(cp.calls) == 2
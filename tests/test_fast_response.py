@@ -0,0 +1,123 @@
+import gzip
+import json
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+import fast_response
+from fast_response import CompressionMiddleware, FastJSONResponse, json_bytes
+
+LARGE = {"rows": [{"id_tag": f"TAG{n:05d}", "quota_kwh": 10.0} for n in range(200)]}
+
+
+class Reading(BaseModel):
+    charger: str
+    kwh: float
+
+
+@pytest.fixture
+def client():
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.add_middleware(CompressionMiddleware, minimum_size=1024, exclude=("/events",))
+
+    @app.get("/large")
+    def large():
+        return LARGE
+
+    @app.get("/small")
+    def small():
+        return {"ok": True}
+
+    @app.get("/events")
+    def events():
+        chunks = ["retry: 5000\n\n"] + [f"event: log\ndata: {json.dumps(LARGE)}\n\n"] * 3
+        return StreamingResponse(iter(chunks), media_type="text/event-stream")
+
+    @app.get("/export")
+    def export():
+        return StreamingResponse((json.dumps(row) + "\n" for row in LARGE["rows"]), media_type="application/x-ndjson")
+
+    with TestClient(app) as client:
+        yield client
+
+
+def get(client, path, encoding):
+    # The test client decodes gzip bodies; read the raw stream to see what was sent
+    with client.stream("GET", path, headers={"Accept-Encoding": encoding}) as response:
+        return response, b"".join(response.iter_raw())
+
+
+def test_json_bytes_is_compact_utf8_with_and_without_orjson(monkeypatch):
+    content = {"name": "Şükrü", "at": datetime(2025, 3, 1, 12, tzinfo=timezone.utc), "reading": Reading(charger="CP1", kwh=1.5)}
+    encoded = json_bytes(content)
+    assert encoded.startswith('{"name":"Şükrü","at":'.encode("utf-8"))  # no spaces, no \u escapes
+    monkeypatch.setattr(fast_response, "orjson", None)
+    assert json.loads(json_bytes(content)) == json.loads(encoded) == {
+        "name": "Şükrü", "at": "2025-03-01T12:00:00+00:00", "reading": {"charger": "CP1", "kwh": 1.5}}
+    with pytest.raises(TypeError):
+        json_bytes({"value": object()})
+
+
+def test_fast_json_response_renders_non_string_keys():
+    response = FastJSONResponse({1: "a", "b": [1, 2]})
+    assert json.loads(response.body) == {"1": "a", "b": [1, 2]}
+    assert response.headers["content-type"] == "application/json"
+
+
+def test_large_responses_are_gzipped_for_clients_that_accept_it(client):
+    response, raw = get(client, "/large", "gzip, deflate")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) == len(raw) < len(json_bytes(LARGE))
+    assert json.loads(gzip.decompress(raw)) == LARGE
+
+
+def test_responses_below_the_minimum_size_are_sent_as_they_are(client):
+    response, raw = get(client, "/small", "gzip")
+    assert "content-encoding" not in response.headers
+    assert raw == b'{"ok":true}'
+
+
+def test_no_compression_without_a_supported_encoding(client):
+    for encoding in ("identity", ""):
+        response, raw = get(client, "/large", encoding)
+        assert "content-encoding" not in response.headers and json.loads(raw) == LARGE
+
+
+@pytest.mark.skipif(fast_response.BrotliMiddleware is not None, reason="brotli-asgi is installed")
+def test_brotli_only_clients_get_identity_without_brotli_asgi(client):
+    response, raw = get(client, "/large", "br")
+    assert "content-encoding" not in response.headers and json.loads(raw) == LARGE
+
+
+@pytest.mark.skipif(fast_response.BrotliMiddleware is None, reason="brotli-asgi is not installed")
+def test_brotli_is_preferred_when_brotli_asgi_is_installed(client):
+    import brotli
+
+    response, raw = get(client, "/large", "gzip, br")
+    assert response.headers["content-encoding"] == "br"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert json.loads(brotli.decompress(raw)) == LARGE
+
+
+def test_event_stream_is_never_compressed(client):
+    response, raw = get(client, "/events", "gzip, br")
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert "content-encoding" not in response.headers
+    assert raw.startswith(b"retry: 5000\n\n") and raw.count(b"event: log\n") == 3
+
+
+def test_streamed_responses_are_compressed_incrementally(client):
+    response, raw = get(client, "/export", "gzip")
+    assert response.headers["content-encoding"] == "gzip" and "content-length" not in response.headers
+    assert [json.loads(line) for line in gzip.decompress(raw).splitlines()] == LARGE["rows"]
+
+
+def test_dashboard_excludes_its_event_stream(dashboard):
+    [compression] = [m for m in dashboard.app.user_middleware if m.cls is CompressionMiddleware]
+    assert compression.kwargs["exclude"] == ("/api/events",)
+    assert compression.kwargs["minimum_size"] == 1024
@@ -0,0 +1,161 @@
+import asyncio
+from types import SimpleNamespace
+
+from ocpp.v16.enums import AuthorizationStatus, UpdateStatus, UpdateType
+
+from local_auth_list import LocalAuthListManager
+
+
+class FakeQuotaManager:
+    def __init__(self, users):
+        self.users = dict(users)  # id_tag -> can start
+        self.active_transactions = {}
+        self._usage_store = SimpleNamespace(refresh=lambda: False)
+
+    def get_budget(self, id_tag):
+        if id_tag not in self.users:
+            return None
+        return SimpleNamespace(can_start=lambda: self.users[id_tag])
+
+
+class FakeChargePoint:
+    def __init__(self, id="CP1", list_version=0, reject=None):
+        self.id = id
+        self.list_version = list_version
+        self.reject = reject  # UpdateStatus answered to SendLocalList
+        self.sent = []
+
+    async def call(self, payload):
+        if type(payload).__name__.startswith("GetLocalListVersion"):
+            return SimpleNamespace(list_version=self.list_version)
+        if self.reject is not None:
+            return SimpleNamespace(status=self.reject)
+        # A conforming charger only accepts a Differential with a higher version
+        if payload.update_type == UpdateType.differential and payload.list_version <= self.list_version:
+            return SimpleNamespace(status=UpdateStatus.version_mismatch)
+        self.sent.append(payload)
+        self.list_version = payload.list_version
+        return SimpleNamespace(status=UpdateStatus.accepted)
+
+
+def make_manager(users, chunk_size=1000):
+    return LocalAuthListManager(FakeQuotaManager(users), chunk_size=chunk_size)
+
+
+def test_entries_follow_quota_state():
+    quota = FakeQuotaManager({"A": True, "B": False})
+    manager = LocalAuthListManager(quota)
+    assert manager.entries == {"A": AuthorizationStatus.accepted, "B": AuthorizationStatus.blocked}
+
+    version = manager.version
+    quota.users["B"] = True
+    del quota.users["A"]
+    assert manager.refresh() == {"B": AuthorizationStatus.accepted, "A": None}
+    assert manager.version == version + 1
+    assert manager.refresh() == {}
+    assert manager.version == version + 1
+
+
+def test_changes_since_merges_history_and_rejects_unknown_versions():
+    quota = FakeQuotaManager({"A": True})
+    manager = LocalAuthListManager(quota, history_size=2)
+    base = manager.version
+    for tag in ("B", "C", "D"):
+        quota.users[tag] = True
+        manager.refresh()
+
+    assert manager.changes_since(manager.version) == {}
+    assert manager.changes_since(manager.version - 1) == {"D": AuthorizationStatus.accepted}
+    assert manager.changes_since(base) is None  # older than the kept history
+    assert manager.changes_since(manager.version + 1) is None
+    assert manager.changes_since(None) is None
+
+
+def test_large_full_list_is_sent_with_increasing_versions():
+    manager = make_manager({f"TAG{i:03}": True for i in range(25)}, chunk_size=10)
+    cp = FakeChargePoint()
+    asyncio.run(manager.sync_charger(cp, full=True))
+
+    versions = [payload.list_version for payload in cp.sent]
+    assert [payload.update_type for payload in cp.sent] == [UpdateType.full] + [UpdateType.differential] * 2
+    assert versions == sorted(set(versions))
+    assert versions[-1] == manager.version
+    assert manager.charger_versions["CP1"] == manager.version
+    assert sum(len(payload.local_authorization_list) for payload in cp.sent) == 25
+
+
+def test_charger_left_on_a_partial_version_gets_a_full_list():
+    manager = make_manager({f"TAG{i:03}": True for i in range(25)}, chunk_size=10)
+    partial = manager._reserve_versions(3)[0]
+    assert manager.changes_since(partial) is None
+    assert manager.changes_since(manager.version) == {}
+
+
+def test_differential_update_after_a_change():
+    quota = FakeQuotaManager({"A": True, "B": True})
+    manager = LocalAuthListManager(quota)
+    cp = FakeChargePoint()
+    asyncio.run(manager.sync_charger(cp, full=True))
+
+    quota.users["B"] = False
+    manager.refresh()
+    asyncio.run(manager.sync_charger(cp))
+
+    assert cp.sent[-1].update_type == UpdateType.differential
+    assert cp.sent[-1].local_authorization_list == [
+        {"id_tag": "B", "id_tag_info": {"status": AuthorizationStatus.blocked}}]
+    assert manager.charger_versions["CP1"] == manager.version
+
+
+def test_unsupported_and_rejecting_chargers():
+    manager = make_manager({"A": True})
+    unsupported = FakeChargePoint("CP1", list_version=-1)
+    asyncio.run(manager.sync_charger(unsupported))
+    assert "CP1" in manager.unsupported
+
+    failing = FakeChargePoint("CP2", reject=UpdateStatus.failed)
+    manager.charger_versions["CP2"] = manager.version - 1
+    asyncio.run(manager.sync_charger(failing, full=True))
+    assert "CP2" not in manager.charger_versions  # full sync next time
+
+
+def test_updates_go_through_the_command_queue():
+    from command_dispatcher import CommandDispatcher
+
+    cp = FakeChargePoint()
+    manager = make_manager({"A": True})
+
+    async def main():
+        manager.dispatcher = CommandDispatcher({"CP1": cp})
+        await manager.sync_charger(cp)
+        return manager.dispatcher
+
+    dispatcher = asyncio.run(main())
+    assert manager.charger_versions["CP1"] == manager.version
+    assert cp.sent[0].update_type == UpdateType.full
+    assert dispatcher.queues == {}  # drained
+
+
+def test_charger_moving_to_another_worker_gets_that_workers_full_list(tmp_path):
+    version_file = tmp_path / "local_list_version.json"
+    quota_a, quota_b = FakeQuotaManager({"A": True, "B": True}), FakeQuotaManager({"A": True, "B": True})
+    worker_a = LocalAuthListManager(quota_a, version_file=version_file)
+    worker_b = LocalAuthListManager(quota_b, version_file=version_file)
+    assert worker_a.version != worker_b.version  # started in the same second
+
+    cp = FakeChargePoint()
+    asyncio.run(worker_a.sync_charger(cp, full=True))
+    quota_a.users["B"] = False  # quota ran out on worker A
+    worker_a.refresh()
+    asyncio.run(worker_a.sync_charger(cp))
+    quota_b.users["A"] = False
+    worker_b.refresh()
+    issued = {payload.list_version for payload in cp.sent} | {worker_b.version}
+    assert len(issued) == 3  # one counter for both workers: no version is issued twice
+
+    # Reconnected to worker B: A's version means nothing there, so B replaces the whole list
+    assert worker_b.changes_since(cp.list_version) is None
+    asyncio.run(worker_b.sync_charger(cp))
+    assert cp.sent[-1].update_type == UpdateType.full
+    assert cp.sent[-1].list_version == worker_b.version > worker_a.version
+    assert worker_b.charger_versions["CP1"] == worker_b.version
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+from meter_log import MeterLog
+
+
+def write_log(path, records, tail=""):
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+        f.write(tail)
+
+
+@pytest.fixture
+def log(tmp_path):
+    path = tmp_path / "meter_data_log.ndjson"
+    write_log(path, [{"n": n} for n in range(50)], tail='{"n": 50')  # last line still being written
+    return MeterLog(path, block_size=64)
+
+
+def test_reverse_yields_newest_first_and_skips_the_partial_line(log):
+    assert [record["n"] for _, record in log.reverse()] == list(range(49, -1, -1))
+
+
+def test_reverse_cursor_continues_where_the_page_ended(log):
+    page = []
+    for offset, record in log.reverse():
+        page.append(record["n"])
+        if len(page) == 10:
+            cursor = offset
+            break
+    rest = [record["n"] for _, record in log.reverse(end=cursor)]
+    assert page == list(range(49, 39, -1))
+    assert rest == list(range(39, -1, -1))
+
+
+def test_records_resume_from_an_offset(log):
+    offsets = [offset for offset, _ in log.records()]
+    assert len(offsets) == 50
+    assert [record["n"] for _, record in log.records(start=offsets[46])] == [47, 48, 49]
+
+
+def test_migrate_converts_the_json_array_once(tmp_path):
+    legacy = tmp_path / "meter_data_log.json"
+    legacy.write_text(json.dumps([{"n": 1}, {"n": 2}]))
+    log = MeterLog(tmp_path / "meter_data_log.ndjson")
+    assert log.migrate(legacy) == 2
+    assert [record["n"] for record in log] == [1, 2]
+    assert not legacy.exists() and (tmp_path / "meter_data_log.json.migrated").exists()
+
+    legacy.write_text(json.dumps([{"n": 3}]))
+    assert log.migrate(legacy) == 0  # the new log is authoritative once it exists
+    assert [record["n"] for record in log] == [1, 2]
+
+
+def test_migrate_accepts_a_log_already_in_lines(tmp_path):
+    legacy = tmp_path / "meter_data_log.json"
+    write_log(legacy, [{"n": 1}, {"n": 2}], tail="\n")
+    log = MeterLog(tmp_path / "meter_data_log.ndjson")
+    assert log.migrate(legacy) == 2
+    assert [record["n"] for record in log] == [1, 2]
+
+
+def test_bisect_finds_the_first_reading_at_or_after_the_target(tmp_path):
+    path = tmp_path / "meter_data_log.ndjson"
+    write_log(path, [{"t": n} for n in range(0, 2000, 2)])
+    log = MeterLog(path, block_size=256)
+
+    def key(record):
+        return record.get("t")
+
+    offset = log.bisect(1001, key)
+    read = [record["t"] for _, record in log.records(offset)]
+    assert read[-1] == 1998
+    assert 1002 in read and read[0] < 1002
+    assert read[0] > 900  # starts within about one block of the target
+    # Anything before the offset is older than the target
+    assert all(record["t"] < 1001 for offset_after, record in log.records() if offset_after <= offset)
+
+    assert log.bisect(-5, key) == 0
+    assert [record["t"] for _, record in log.records(log.bisect(5000, key))][-1] == 1998
+
+
+def test_bisect_skips_records_without_a_key(tmp_path):
+    path = tmp_path / "meter_data_log.ndjson"
+    write_log(path, [{"t": n} if n % 3 else {"other": n} for n in range(600)])
+    log = MeterLog(path, block_size=128)
+    offset = log.bisect(300, lambda record: record.get("t"))
+    assert all(record.get("t", 0) < 300 for after, record in log.records() if after <= offset)
+    assert 301 in [record.get("t") for _, record in log.records(offset)]
+
+
+def test_bisect_of_a_missing_log_starts_at_zero(tmp_path):
+    assert MeterLog(tmp_path / "missing.ndjson").bisect(10, lambda record: record["t"]) == 0
@@ -0,0 +1,177 @@
+import json
+import random
+
+import pytest
+
+from performance_metrics import (
+    OVERFLOW_LABEL, MetricsRegistry, MetricsReporter, PerformanceMetrics, StreamingHistogram, WindowedHistogram,
+    bucket_index, bucket_value,
+)
+
+
+def test_bucket_value_is_within_three_percent():
+    for value in (0.0004, 0.37, 1.0, 12.5, 999.0, 86400.0):
+        assert bucket_value(bucket_index(value)) == pytest.approx(value, rel=0.03)
+
+
+def test_percentiles_are_close_to_the_exact_ones():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(0, 1) for _ in range(20000)]
+    histogram = StreamingHistogram()
+    for value in values:
+        histogram.record(value)
+    values.sort()
+    for percent in (50, 90, 99):
+        exact = values[int(len(values) * percent / 100) - 1]
+        assert histogram.percentile(percent) == pytest.approx(exact, rel=0.03)
+    summary = histogram.summary()
+    assert summary["count"] == 20000
+    assert summary["min"] == values[0] and summary["max"] == values[-1]
+    assert summary["avg"] == pytest.approx(sum(values) / len(values))
+
+
+def test_merge_and_since():
+    first, second = StreamingHistogram(), StreamingHistogram()
+    for value in (1.0, 2.0, 3.0):
+        first.record(value)
+    snapshot = first.copy()
+    for value in (10.0, 20.0):
+        first.record(value)
+        second.record(value)
+
+    delta = first.since(snapshot)
+    assert delta.count == 2 and delta.total == 30.0
+    assert delta.min == pytest.approx(10.0, rel=0.03) and delta.max == 20.0
+    assert delta.percentile(50) == pytest.approx(10.0, rel=0.03)
+
+    merged = snapshot.copy().merge(second)
+    assert merged.count == first.count and merged.buckets == first.buckets
+    assert (merged.min, merged.max) == (1.0, 20.0)
+
+
+def test_empty_histogram_summary():
+    assert StreamingHistogram().summary() == {"count": 0, "avg": 0, "min": 0, "max": 0.0,
+                                              "p50": 0, "p90": 0, "p99": 0}
+
+
+def test_windows_forget_old_slots():
+    now = [1000.0]
+    histogram = WindowedHistogram(clock=lambda: now[0])
+    histogram.record(5.0)
+    now[0] += 120
+    histogram.record(1.0)
+    assert histogram.window(60).count == 1
+    assert histogram.window(300).count == 2
+    now[0] += 3600
+    summary = histogram.summary()
+    assert summary["all"]["count"] == 2
+    assert summary["1m"]["count"] == summary["1h"]["count"] == 0
+
+
+def test_label_values_beyond_the_cap_share_one_series():
+    registry = MetricsRegistry(max_series=3)
+    messages = registry.counter("ocpp_messages_total", "OCPP messages", ("charger", "action"))
+    for n in range(5):
+        messages.labels(f"CP{n}", "Heartbeat").inc()
+    messages.labels("CP0", "Heartbeat").inc()  # known series keep counting
+    assert len(messages.series) == 4
+    assert messages.labels("CP0", "Heartbeat").value == 2
+    assert messages.series[(OVERFLOW_LABEL, OVERFLOW_LABEL)].value == 2
+    assert ("CP3", "Heartbeat") not in messages.series and ("CP4", "Heartbeat") not in messages.series
+
+
+def test_registration_is_idempotent_and_checks_kind_and_labels():
+    registry = MetricsRegistry()
+    counter = registry.counter("requests_total", "Requests", ("route",))
+    assert registry.counter("requests_total", "Requests", ("route",)) is counter
+    with pytest.raises(ValueError):
+        registry.gauge("requests_total", "Requests", ("route",))
+    with pytest.raises(ValueError):
+        registry.counter("requests_total", "Requests", ("route", "method"))
+
+
+def test_render_prometheus_text_format():
+    registry = MetricsRegistry()
+    registry.counter("requests_total", "Requests handled", ("route",)).labels('/a "b"\\c\nd').inc(3)
+    registry.gauge("queue_size", "Queued messages").labels().set(2.5)
+    latency = registry.histogram("latency_seconds", "Latency", ("charger",), buckets=(0.01, 0.1, 1))
+    for value in (0.004, 0.05, 0.06, 0.5, 7.0):
+        latency.labels("CP1").record(value)
+    registry.add_collector(lambda: registry.gauge("connected", "Connected chargers").labels().set(4))
+
+    assert registry.render().splitlines() == [
+        "# HELP requests_total Requests handled",
+        "# TYPE requests_total counter",
+        'requests_total{route="/a \\"b\\"\\\\c\\nd"} 3',
+        "# HELP queue_size Queued messages",
+        "# TYPE queue_size gauge",
+        "queue_size 2.5",
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{charger="CP1",le="0.01"} 1',
+        'latency_seconds_bucket{charger="CP1",le="0.1"} 3',
+        'latency_seconds_bucket{charger="CP1",le="1"} 4',
+        'latency_seconds_bucket{charger="CP1",le="+Inf"} 5',
+        f'latency_seconds_sum{{charger="CP1"}} {repr(0.004 + 0.05 + 0.06 + 0.5 + 7.0)}',
+        'latency_seconds_count{charger="CP1"} 5',
+        "# HELP connected Connected chargers",
+        "# TYPE connected gauge",
+        "connected 4",
+    ]
+
+
+def test_a_failing_collector_does_not_break_render():
+    registry = MetricsRegistry()
+    registry.counter("up", "Up").labels().inc()
+
+    def broken():
+        raise RuntimeError("gone")
+
+    registry.add_collector(broken)
+    assert registry.render() == "# HELP up Up\n# TYPE up counter\nup 1\n"
+
+
+def test_reporter_deltas_and_rates_cover_one_interval(tmp_path):
+    now = [100.0]
+    metrics = PerformanceMetrics()
+    reporter = MetricsReporter(metrics, path=tmp_path / "metrics.ndjson", labels={"worker": 1}, clock=lambda: now[0])
+    for latency in (0.01, 0.02):
+        metrics.record_message_metrics(latency, is_sent=False)
+    metrics.update_api_timing(0.2, True)
+    metrics.update_api_timing(0.4, False)
+
+    now[0] += 10
+    first = reporter.report()
+    assert first["worker"] == 1 and first["interval_seconds"] == 10
+    assert first["deltas"]["messages_received"] == 2 and first["rates"]["messages_received"] == 0.2
+    assert first["api_success_rate"] == 50.0
+    assert first["message_latency"]["count"] == 2
+
+    for latency in (0.03, 0.04, 0.05, 0.06):
+        metrics.record_message_metrics(latency, is_sent=False)
+    metrics.record_message_metrics(0.1, is_sent=True)
+    metrics.update_api_timing(0.3, True)
+
+    now[0] += 4
+    second = reporter.report()
+    assert second["interval_seconds"] == 4
+    assert second["totals"]["messages_received"] == 6
+    assert second["deltas"]["messages_received"] == 4 and second["rates"]["messages_received"] == 1.0
+    assert second["deltas"]["messages_sent"] == 1 and second["rates"]["messages_sent"] == 0.25
+    assert (second["deltas"]["api_success"], second["deltas"]["api_failure"]) == (1, 0)
+    assert second["api_success_rate"] == 100.0
+    # Histograms only summarize the interval's values
+    assert second["message_latency"]["count"] == 5
+    assert second["message_latency"]["min"] == pytest.approx(0.03, rel=0.03)  # from the interval's buckets
+    assert second["api_response"]["count"] == 1
+
+    reporter.emit(first)
+    reporter.emit(second)
+    lines = (tmp_path / "metrics.ndjson").read_text().splitlines()
+    assert [json.loads(line)["interval_seconds"] for line in lines] == [10, 4]
+
+
+def test_reporter_without_activity_or_elapsed_time():
+    reporter = MetricsReporter(PerformanceMetrics(), clock=lambda: 5.0)
+    record = reporter.report()
+    assert set(record["rates"].values()) == {0} and record["api_success_rate"] is None
@@ -0,0 +1,148 @@
+import csv
+import json
+
+import pytest
+
+from ocpp_server import ChargePoint, QuotaManager
+from usage_ledger import current_period
+from user_store import UserStore
+
+USERS = [
+    {"id_tag": "AAAA0001", "header name": "Ada", "surname": "Limited", "quota_kwh": "10", "unlimited": "FALSE"},
+    {"id_tag": "BBBB0002", "header name": "Bob", "surname": "Unlimited", "quota_kwh": "", "unlimited": "TRUE"},
+]
+
+
+@pytest.fixture
+def manager(tmp_path):
+    csv_path = tmp_path / "users1.csv"
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(USERS[0]))
+        writer.writeheader()
+        writer.writerows(USERS)
+    return QuotaManager(csv_path=csv_path, usage_file=tmp_path / "energy_usage.json",
+                        tx_file=tmp_path / "active_transactions.json", sessions_file=tmp_path / "sessions.json",
+                        usage_history_file=tmp_path / "energy_usage_history.json")
+
+
+def test_budget_tracks_added_usage(manager):
+    assert manager.get_budget("AAAA0001").remaining_kwh == 10
+    manager.add_usage("AAAA0001", 4.0)
+    manager.add_usage("AAAA0001", 2.5)
+    budget = manager.get_budget("AAAA0001")
+    assert budget.used_kwh == pytest.approx(6.5)
+    assert budget.remaining_kwh == pytest.approx(3.5)
+
+
+def test_budget_resyncs_after_a_locked_write(manager):
+    manager.add_usage("AAAA0001", 10.0)
+    assert not manager.can_start_transaction("AAAA0001")[0]
+
+    # e.g. a usage reset written through the same store
+    with manager._usage_store.locked() as ledger:
+        ledger[current_period()]["AAAA0001"] = 0.0
+
+    assert manager.get_budget("AAAA0001").used_kwh == 0
+    assert manager.can_start_transaction("AAAA0001")[0]
+
+
+
+def test_projection_uses_combined_power_of_the_users_sessions(manager):
+    manager.add_usage("AAAA0001", 6.0)
+    first = manager.start_transaction("AAAA0001", 0.0, "CP1")
+    second = manager.start_transaction("AAAA0001", 0.0, "CP2")
+    assert manager.project_quota_exhaustion(first, 4000.0) == pytest.approx(3600.0)
+    # 4 kWh left at 4 kW + 4 kW
+    assert manager.project_quota_exhaustion(second, 4000.0) == pytest.approx(1800.0)
+
+
+def test_no_projection_for_unlimited_users(manager):
+    transaction_id = manager.start_transaction("BBBB0002", 0.0, "CP1")
+    assert manager.project_quota_exhaustion(transaction_id, 7000.0) is None
+
+
+@pytest.mark.parametrize("sample, watts", [
+    ({"value": "7400"}, 7400.0),
+    ({"value": "7400", "unit": "W"}, 7400.0),
+    ({"value": "7.4", "unit": "kW"}, 7400.0),
+    ({"value": "7.4", "unit": "kVA"}, None),
+    ({"value": "n/a", "unit": "W"}, None),
+])
+def test_power_samples_are_normalized_to_watts(sample, watts):
+    result = ChargePoint.convert_to_watts({"measurand": "Power.Active.Import", **sample})
+    assert result == (pytest.approx(watts) if watts is not None else None)
+
+
+def test_meter_progress_is_written_at_most_every_interval(manager, tmp_path):
+    tx_file = tmp_path / "active_transactions.json"
+    manager.progress_interval = 3600
+    transaction_id = str(manager.start_transaction("AAAA0001", 0.0, "CP1"))
+    writes = manager._tx_store.writes
+    for meter in (1.0, 2.0, 3.0):
+        manager.update_transaction_usage(transaction_id, meter, 7000.0)
+    assert manager._tx_store.writes == writes
+    assert json.loads(tx_file.read_text())[transaction_id]["last_meter"] == 0.0
+    assert manager.energy_usage["AAAA0001"] == pytest.approx(3.0)  # usage itself is never held back
+
+    manager.flush_progress()  # e.g. the charger disconnected
+    saved = json.loads(tx_file.read_text())[transaction_id]
+    assert (saved["last_meter"], saved["max_power_w"]) == (3.0, 7000.0)
+    manager.flush_progress()
+    assert manager._tx_store.writes == writes + 1
+
+
+def test_edited_and_removed_users_drop_their_cached_budget(manager, tmp_path):
+    limited = manager.get_budget("AAAA0001")
+    assert manager.get_budget("BBBB0002") is not None
+    dashboard = UserStore(tmp_path / "users1.csv")  # the dashboard's write path
+    dashboard.refresh()
+    dashboard.update("AAAA0001", {"quota_kwh": "25"})
+    dashboard.delete("BBBB0002")
+
+    changes = manager.read_user_changes()
+    assert changes["BBBB0002"] is None and changes["AAAA0001"]["quota_kwh"] == 25.0
+    assert manager.apply_user_changes(changes) == (set(), {"BBBB0002"}, {"AAAA0001"})
+    assert manager.get_budget("AAAA0001") is not limited
+    assert manager.get_budget("AAAA0001").remaining_kwh == 25
+    assert manager.get_budget("BBBB0002") is None
+    assert manager.can_start_transaction("BBBB0002") == (False, "User not found")
+    assert manager.read_user_changes() == {}
+
+
+def test_closed_periods_move_to_the_history_file(manager, tmp_path):
+    usage_file, history_file = tmp_path / "energy_usage.json", tmp_path / "energy_usage_history.json"
+    history_file.write_text(json.dumps({"2024-12": {"AAAA0001": 1.0}}))
+    usage_file.write_text(json.dumps({"2025-01": {"AAAA0001": 7.0}, current_period(): {"AAAA0001": 2.0}}))
+
+    assert manager.add_usage("AAAA0001", 0.5) == pytest.approx(2.5)
+    assert json.loads(usage_file.read_text()) == {current_period(): {"AAAA0001": 2.5}}
+    assert json.loads(history_file.read_text()) == {"2024-12": {"AAAA0001": 1.0}, "2025-01": {"AAAA0001": 7.0}}
+
+    # Crash between the two writes: the period is in both files and is moved again unchanged
+    usage_file.write_text(json.dumps({"2025-01": {"AAAA0001": 7.0}, current_period(): {"AAAA0001": 2.5}}))
+    manager.add_usage("AAAA0001", 0.5)
+    assert json.loads(history_file.read_text())["2025-01"] == {"AAAA0001": 7.0}
+    assert list(json.loads(usage_file.read_text())) == [current_period()]
+
+
+def test_ended_transactions_are_archived_per_user_and_charger(manager):
+    quota_stopped = manager.start_transaction("AAAA0001", 100.0, "CP1")
+    manager.update_transaction_usage(quota_stopped, 105.0, power_w=7400.0)
+    manager.update_transaction_usage(quota_stopped, 111.0, power_w=3700.0)  # over the 10 kWh quota
+    manager.end_transaction(quota_stopped, 111.5, reason="DeAuthorized")
+    local = manager.start_transaction("BBBB0002", 20.0, "CP2")
+    manager.end_transaction(local, 22.25)
+
+    sessions, before = manager.sessions.query(limit=10)
+    assert before is None
+    assert [session["transaction_id"] for session in sessions] == [str(local), str(quota_stopped)]
+    assert sessions[1]["energy_kwh"] == 11.5 and sessions[1]["max_power_w"] == 7400.0
+    assert (sessions[1]["stop_reason"], sessions[1]["quota_stop"]) == ("DeAuthorized", True)
+    assert (sessions[0]["stop_reason"], sessions[0]["quota_stop"]) == ("Local", False)
+    assert sessions[0]["full_name"] == "Bob Unlimited" and sessions[0]["duration_s"] == 0
+
+    assert manager.sessions.query(user="AAAA0001", charger="CP2") == ([], None)
+    assert manager.sessions.totals("user") == {"AAAA0001": {"sessions": 1, "energy_kwh": 11.5},
+                                               "BBBB0002": {"sessions": 1, "energy_kwh": 2.25}}
+    assert manager.sessions.totals("charger") == {"CP1": {"sessions": 1, "energy_kwh": 11.5},
+                                                  "CP2": {"sessions": 1, "energy_kwh": 2.25}}
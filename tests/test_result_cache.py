@@ -0,0 +1,68 @@
+import threading
+import time
+
+from result_cache import ResultCache
+
+
+def test_concurrent_misses_compute_once():
+    cache = ResultCache(ttl=60)
+    calls = []
+    started = threading.Event()
+
+    def compute():
+        calls.append(1)
+        started.set()
+        time.sleep(0.1)  # the other threads arrive while this runs
+        return {"total": 42}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute(("stats",), lambda: 1, compute)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{"total": 42}] * 8
+    counts = cache.stats()["stats"]
+    assert counts["misses"] == 1 and counts["hits"] + counts["coalesced"] == 7
+
+
+def test_revision_change_and_ttl_expiry_recompute(monkeypatch):
+    cache = ResultCache(ttl=10)
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    revision = ["a"]
+    values = iter(range(10))
+
+    def get():
+        return cache.get_or_compute(("history", 7), lambda: revision[0], lambda: next(values))
+
+    assert get() == 0
+    assert get() == 0
+    revision[0] = "b"
+    assert get() == 1
+    now[0] += 11
+    assert get() == 2
+    assert cache.stats()["history"]["hit_ratio"] == 0.25
+
+
+def test_revision_is_taken_before_computing():
+    cache = ResultCache(ttl=60)
+    revision = ["a"]
+
+    def compute():
+        revision[0] = "b"  # data changed while computing
+        return "old"
+
+    assert cache.get_or_compute(("stats",), lambda: revision[0], compute) == "old"
+    assert cache.get_or_compute(("stats",), lambda: revision[0], lambda: "new") == "new"
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ResultCache(ttl=60, max_entries=2)
+    for days in (1, 2, 3):
+        cache.get_or_compute(("history", days), lambda: None, lambda: days)
+    assert cache.stats()["history"]["entries"] == 2
+    assert cache.get_or_compute(("history", 1), lambda: None, lambda: "again") == "again"
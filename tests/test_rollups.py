@@ -0,0 +1,71 @@
+import numpy as np
+
+import analytics
+from analytics import Rollups, RollupSeries, lttb
+
+T0 = 1_700_000_000 // 3600 * 3600
+
+
+def add(rollups, ts, power, energy=None, charger=0):
+    ts = np.asarray(ts, dtype=np.int64)
+    energy = np.zeros(len(ts)) if energy is None else np.asarray(energy, dtype=np.float64)
+    rollups.add(ts, np.full(len(ts), charger, dtype=np.int32), np.asarray(power, dtype=np.float64), energy)
+
+
+def test_buckets_merge_across_appends():
+    rollups = Rollups()
+    add(rollups, [T0, T0 + 30], [100, 300], [1.0, 2.0])
+    add(rollups, [T0 + 50, T0 + 70], [200, 50], [3.0, 4.0])  # T0 + 50 falls in the first minute
+    seconds, starts, stats = rollups.query(0, T0, T0 + 120, points=500)
+    assert seconds == 60
+    assert starts.tolist() == [T0, T0 + 60]
+    count, psum, pmin, pmax, esum, emin, emax = stats[0]
+    assert (count, psum, pmin, pmax) == (3, 600, 100, 300)
+    assert (emin, emax) == (1.0, 3.0)
+
+
+def test_out_of_order_readings_are_sorted_in():
+    rollups = Rollups()
+    add(rollups, [T0 + 600, T0 + 660], [1, 1])
+    add(rollups, [T0, T0 + 610], [1, 1])
+    _, starts, stats = rollups.query(0, T0, T0 + 3600, points=500)
+    assert starts.tolist() == [T0, T0 + 600, T0 + 660]
+    assert stats[:, 0].tolist() == [1, 2, 1]
+
+
+def test_series_grows_in_place_and_expires_old_buckets():
+    series = RollupSeries(retention=100 * 60, capacity=4)
+    for minute in range(1000):
+        series.extend(np.array([T0 + minute * 60]), np.ones((1, 7)))
+    starts, _ = series.view()
+    assert starts[-1] == T0 + 999 * 60
+    assert len(series) <= 100 * 5 // 4 + 1  # at most a quarter of expired buckets linger
+    assert series.complete_from == starts[0] and starts[0] >= T0 + 999 * 60 - 100 * 60 * 5 // 4
+
+
+def test_query_falls_back_to_a_coarser_rollup_past_the_retention(monkeypatch):
+    monkeypatch.setitem(analytics.ROLLUP_RETENTION, 60, 3600)
+    rollups = Rollups()
+    minutes = np.arange(0, 6 * 60)
+    add(rollups, T0 + minutes * 60, np.ones(len(minutes)))
+    # The last hour is still in the 1 min rollup, the first hour only in the coarser ones
+    assert rollups.query(0, T0 + 5 * 3600, T0 + 6 * 3600, points=100)[0] == 60
+    seconds, starts, _ = rollups.query(0, T0, T0 + 3600, points=100)
+    assert seconds == 900 and starts.tolist() == [T0 + q * 900 for q in range(4)]
+
+
+def test_lttb_keeps_the_ends_and_the_peak():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.zeros(1000)
+    y[437] = 50.0
+    picked = lttb(x, y, 20)
+    assert len(picked) == 20
+    assert picked[0] == 0 and picked[-1] == 999
+    assert 437 in picked
+    assert np.all(np.diff(picked) > 0)
+
+
+def test_lttb_small_inputs():
+    x = np.arange(5, dtype=np.float64)
+    assert lttb(x, x, 10).tolist() == [0, 1, 2, 3, 4]
+    assert lttb(x, x, 2).tolist() == [0, 4]
@@ -0,0 +1,30 @@
+import json
+
+
+def test_charger_totals_are_recomputed_only_when_the_meter_log_changes(dashboard, client, monkeypatch):
+    dashboard.CHARGER_STATUS_JSON.write_text(json.dumps({"LIVOLTEK_01": {"name": "LIVOLTEK_01"}}))
+    calls = []
+    totals = dashboard.analytics.totals
+
+    def counting_totals(by, *args, **kwargs):
+        calls.append(by)
+        return totals(by, *args, **kwargs)
+
+    monkeypatch.setattr(dashboard.analytics, "totals", counting_totals)
+
+    def append_reading(minute, energy):
+        with open(dashboard.METER_DATA_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"timestamp": f"2025-01-15T10:{minute:02d}:00Z", "chargerName": "LIVOLTEK_01",
+                                "userName": "Ada", "totalPower": 7000, "deliveredEnergy": energy}) + "\n")
+
+    append_reading(0, 1.0)
+    append_reading(1, 3.0)
+    for _ in range(3):
+        charger, = client.get("/api/chargers").json()["chargers"]
+    assert charger["total_energy_delivered"] == 2.0
+    assert calls == ["charger"]
+
+    append_reading(2, 4.5)
+    charger, = client.get("/api/chargers").json()["chargers"]
+    assert charger["total_energy_delivered"] == 3.5
+    assert calls == ["charger", "charger"]
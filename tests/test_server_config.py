@@ -0,0 +1,34 @@
+from server_config import READINGS_API_URL, ServerConfig
+
+
+def test_defaults_leave_the_side_apis_off():
+    config = ServerConfig()
+    assert (config.admin_port, config.metrics_port, config.api_url) == (None, None, None)
+    assert config.port == 9000 and config.workers == 1
+
+
+def test_from_env_reads_the_ocpp_variables():
+    config = ServerConfig.from_env({
+        "OCPP_ADMIN_PORT": "9300", "OCPP_ADMIN_TOKEN": "secret", "OCPP_METRICS_PORT": "0",
+        "OCPP_METRICS_REPORT_INTERVAL": "15", "OCPP_OPEN_CHARGERS": " BEDAS01, ,LIVOLTEK_01",
+        "OCPP_WORKERS": "4", "OCPP_EVENT_LOOP": "uvloop",
+    })
+    assert (config.admin_port, config.admin_token) == (9300, "secret")
+    assert config.metrics_port is None  # 0 disables it
+    assert config.metrics_report_interval == 15.0
+    assert config.open_chargers == ("BEDAS01", "LIVOLTEK_01")
+    assert (config.workers, config.event_loop) == (4, "uvloop")
+    assert config.api_url == READINGS_API_URL
+
+
+def test_from_env_defaults_match_production():
+    config = ServerConfig.from_env({})
+    assert (config.admin_port, config.metrics_port, config.metrics_report_interval) == (9100, 9200, 60.0)
+    assert config.open_chargers == ("BEDAS01",)
+
+
+def test_each_worker_gets_its_own_side_ports():
+    config = ServerConfig(admin_port=9100, metrics_port=None)
+    worker = config.for_worker(3)
+    assert (worker.admin_port, worker.metrics_port) == (9103, None)
+    assert config.admin_port == 9100
@@ -0,0 +1,52 @@
+import json
+from types import SimpleNamespace
+
+
+def write_chargers(dashboard, chargers):
+    dashboard.CHARGER_STATUS_JSON.write_text(json.dumps(chargers))
+
+
+def request_with(if_none_match):
+    return SimpleNamespace(headers={"if-none-match": if_none_match} if if_none_match is not None else {})
+
+
+def test_matching_if_none_match_gets_a_304(dashboard, client):
+    write_chargers(dashboard, {"CP1": {"name": "CP1", "status": "Available"}})
+    first = client.get("/api/chargers")
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and etag.startswith('W/"')
+
+    cached = client.get("/api/chargers", headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and cached.content == b""
+    assert cached.headers["etag"] == etag and cached.headers["cache-control"] == "private, no-cache"
+
+
+def test_etag_changes_when_a_source_file_is_written(dashboard, client):
+    write_chargers(dashboard, {"CP1": {"name": "CP1", "status": "Available"}})
+    etag = client.get("/api/chargers").headers["etag"]
+    write_chargers(dashboard, {"CP1": {"name": "CP1", "status": "Charging"}})
+
+    fresh = client.get("/api/chargers", headers={"If-None-Match": etag})
+    assert fresh.status_code == 200
+    assert fresh.headers["etag"] != etag
+    assert fresh.json()["chargers"][0]["status"] == "Charging"
+
+
+def test_data_etag_covers_every_file_and_the_parameters(dashboard, tmp_path):
+    first, second = tmp_path / "a.json", tmp_path / "b.json"
+    first.write_text("{}")
+    etag = dashboard.data_etag(first, second)
+    assert etag == dashboard.data_etag(first, second)
+    assert etag != dashboard.data_etag(first, second, extra=(7,))
+    second.write_text("{}")  # a missing file that appears changes the tag
+    assert etag != dashboard.data_etag(first, second)
+
+
+def test_weak_comparison_of_if_none_match(dashboard):
+    etag = 'W/"abc123"'
+    assert dashboard.etag_matches(request_with('W/"abc123"'), etag)
+    assert dashboard.etag_matches(request_with('"abc123"'), etag)  # strong form of the same tag
+    assert dashboard.etag_matches(request_with('"other", W/"abc123"'), etag)
+    assert dashboard.etag_matches(request_with("*"), etag)
+    assert not dashboard.etag_matches(request_with('W/"abc124"'), etag)
+    assert not dashboard.etag_matches(request_with(None), etag)
@@ -0,0 +1,18 @@
+def test_metrics_are_disabled_without_a_token(dashboard, client, monkeypatch):
+    monkeypatch.setattr(dashboard, "METRICS_TOKEN", None)
+    assert client.get("/metrics").status_code == 404
+    assert client.get("/metrics", headers={"Authorization": "Bearer "}).status_code == 404
+
+
+def test_metrics_require_the_bearer_token(dashboard, client, monkeypatch):
+    monkeypatch.setattr(dashboard, "METRICS_TOKEN", "scrape-secret")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer sécret".encode("latin-1")}).status_code == 401
+
+    client.get("/api/health")
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE dashboard_http_requests_total counter" in response.text
+    assert 'dashboard_http_requests_total{route="/api/health",method="GET",status="200"} 1' in response.text
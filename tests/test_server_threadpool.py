@@ -0,0 +1,32 @@
+import asyncio
+import inspect
+
+# Endpoints that only proxy, stream or authenticate; everything else reads data files
+ASYNC_ROUTES = {"/api/health", "/api/auth/login", "/api/auth/verify", "/api/users/import",
+                "/api/admin/chargers", "/api/admin/commands", "/api/events"}
+
+
+def test_data_file_endpoints_are_plain_functions(dashboard):
+    # FastAPI runs plain def endpoints in its threadpool
+    routes = [route for route in dashboard.app.routes if route.path.startswith("/api/") or route.path == "/metrics"]
+    blocking = {route.path for route in routes if route.path not in ASYNC_ROUTES}
+    assert {"/api/stats", "/api/chargers", "/api/logs", "/api/usage/history", "/api/transactions"} <= blocking
+    assert [route.path for route in routes if route.path in blocking and inspect.iscoroutinefunction(route.endpoint)] == []
+
+
+def test_file_reads_happen_off_the_event_loop(dashboard, client, monkeypatch):
+    threads = []
+    load_json_file = dashboard.load_json_file
+
+    def recording_load(*args, **kwargs):
+        try:
+            asyncio.get_running_loop()
+            threads.append("event loop")
+        except RuntimeError:
+            threads.append("worker thread")
+        return load_json_file(*args, **kwargs)
+
+    monkeypatch.setattr(dashboard, "load_json_file", recording_load)
+    assert client.get("/api/stats").status_code == 200
+    assert client.get("/api/transactions").status_code == 200
+    assert threads and set(threads) == {"worker thread"}
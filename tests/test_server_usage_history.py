@@ -0,0 +1,13 @@
+import pytest
+
+
+@pytest.mark.parametrize("days", [0, -3, 366])
+def test_days_out_of_range_are_rejected(client, days):
+    assert client.get("/api/usage/history", params={"days": days}).status_code == 422
+
+
+def test_history_has_one_entry_per_day(dashboard, client):
+    history = client.get("/api/usage/history", params={"days": 30}).json()["history"]
+    assert len(history) == 30 and all(day["energy"] == 0 for day in history)
+    assert len(client.get("/api/usage/history").json()["history"]) == 7
+    assert dashboard.result_cache.stats()["usage_history"]["entries"] == 2
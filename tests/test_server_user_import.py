@@ -0,0 +1,113 @@
+import asyncio
+import csv
+import io
+import json
+from types import SimpleNamespace
+
+import pytest
+
+HEADER = "id_tag,header name,surname,quota_kwh,unlimited\n"
+
+
+@pytest.fixture
+def users_csv(dashboard):
+    dashboard.USERS_CSV.write_text(HEADER + "AAAA0001,Ada,Lovelace,10,FALSE\n", encoding="utf-8")
+    return dashboard.USERS_CSV
+
+
+def import_users(client, body, **params):
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    response = client.post("/api/users/import", params=params, content=body, headers={"Content-Type": "text/csv"})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def stored_users(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return {row["id_tag"]: row for row in csv.DictReader(f)}
+
+
+def test_invalid_rows_are_reported_with_their_line_numbers(client, users_csv):
+    report = import_users(client, HEADER + "\n".join([
+        "BBBB0002,Bob,Valid,5,FALSE",
+        "CCCC0003,Cem,Quota,lots,FALSE",
+        "",
+        ",No,Tag,5,FALSE",
+        "DDDD0004,Dee,Infinite,inf,FALSE",
+        "EEEE0005,Eve,Unlimited,,TRUE",
+    ]))
+    assert report["records"] == 5  # the blank line is not a record
+    assert (report["created"], report["updated"], report["error_count"]) == (2, 0, 3)
+    assert [error["line"] for error in report["errors"]] == [3, 5, 6]
+    assert "quota_kwh must be a number" in report["errors"][0]["error"]
+    assert report["errors"][1]["error"] == "id_tag is required"
+    assert sorted(stored_users(users_csv)) == ["AAAA0001", "BBBB0002", "EEEE0005"]
+
+
+def test_ndjson_plan_field_and_errors(client, users_csv):
+    lines = [{"id_tag": "BBBB0002", "header_name": "Bob", "surname": "Json", "plan": "Unlimited"},
+             {"id_tag": "CCCC0003", "plan": "gold"}, ["not", "an", "object"]]
+    response = client.post("/api/users/import", content="\n".join(json.dumps(line) for line in lines) + "\n{oops",
+                           headers={"Content-Type": "application/x-ndjson"})
+    report = response.json()
+    assert report["format"] == "ndjson" and report["created"] == 1
+    assert [error["line"] for error in report["errors"]] == [2, 3, 4]
+    assert stored_users(users_csv)["BBBB0002"]["unlimited"] == "TRUE"
+
+
+def test_a_repeated_tag_keeps_its_last_row(client, users_csv):
+    report = import_users(client, HEADER + "AAAA0001,Ada,First,20,FALSE\nAAAA0001,Ada,Last,30,FALSE\n")
+    assert (report["records"], report["created"], report["updated"]) == (2, 0, 1)
+    ada = stored_users(users_csv)["AAAA0001"]
+    assert (ada["surname"], float(ada["quota_kwh"])) == ("Last", 30.0)
+
+
+def test_dry_run_counts_without_writing(client, users_csv):
+    before = users_csv.read_bytes()
+    report = import_users(client, HEADER + "AAAA0001,Ada,Changed,50,FALSE\nBBBB0002,Bob,New,5,FALSE\n",
+                          dry_run="true")
+    assert report["dry_run"] is True
+    assert (report["created"], report["updated"], report["error_count"]) == (1, 1, 0)
+    assert users_csv.read_bytes() == before
+    assert client.get("/api/users").json()[0]["surname"] == "Lovelace"
+
+
+def test_utf8_with_a_bom_and_invalid_encodings(client, users_csv):
+    report = import_users(client, "\ufeff".encode("utf-8") + (HEADER + "BBBB0002,Şükrü,Çelik,5,FALSE\n").encode("utf-8"))
+    assert report["created"] == 1 and report["error_count"] == 0  # the BOM is not part of the id_tag header
+    assert stored_users(users_csv)["BBBB0002"]["header name"] == "Şükrü"
+
+    response = client.post("/api/users/import", content=(HEADER + "CCCC0003,J\xf6rg,Latin1,5,FALSE\n").encode("latin-1"),
+                           headers={"Content-Type": "text/csv"})
+    assert response.status_code == 400 and "UTF-8" in response.json()["detail"]
+
+
+def test_lines_split_across_chunks_inside_a_character(dashboard):
+    body = (HEADER + "BBBB0002,Şükrü,Çelik,5,FALSE\nCCCC0003,Ö,Z,1,FALSE").encode("utf-8")
+    split = body.index("ü".encode("utf-8")) + 1  # in the middle of a two-byte character
+
+    async def stream():
+        for chunk in (body[:split], body[split:]):
+            yield chunk
+
+    async def collect():
+        return [line async for lines in dashboard.upload_lines(SimpleNamespace(stream=stream)) for line in lines]
+
+    assert asyncio.run(collect()) == body.decode("utf-8").split("\n")
+
+
+@pytest.mark.parametrize("fmt, content_type", [("csv", "text/csv"), ("ndjson", "application/x-ndjson")])
+def test_export_can_be_imported_again(client, users_csv, fmt, content_type):
+    import_users(client, HEADER + "BBBB0002,Şükrü,Çelik,0,TRUE\nCCCC0003,\"Cem, Jr.\",Quote,7.5,FALSE\n")
+    before = client.get("/api/users").json()
+    exported = client.get("/api/users/export", params={"format": fmt})
+    assert exported.status_code == 200 and exported.headers["content-type"].startswith(content_type)
+    if fmt == "csv":
+        assert [row["id_tag"] for row in csv.DictReader(io.StringIO(exported.text))] == [
+            "AAAA0001", "BBBB0002", "CCCC0003"]
+
+    report = client.post("/api/users/import", content=exported.content,
+                         headers={"Content-Type": content_type}).json()
+    assert (report["records"], report["created"], report["updated"], report["error_count"]) == (3, 0, 3, 0)
+    assert client.get("/api/users").json() == before
@@ -0,0 +1,76 @@
+import pytest
+
+from session_archive import SessionArchive
+
+USERS = ("AAAA0001", "BBBB0002")
+CHARGERS = ("CP1", "CP2", "CP3")
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = SessionArchive(tmp_path / "sessions.json")
+    for n in range(30):
+        archive.append({
+            "transaction_id": str(n),
+            "id_tag": USERS[n % 2],
+            "charger_id": CHARGERS[n % 3],
+            "start_time": f"2025-{1 + n // 15:02d}-10T08:00:00+00:00",
+            "energy_kwh": 1.5,
+        })
+    return archive
+
+
+def ids(sessions):
+    return [int(session["transaction_id"]) for session in sessions]
+
+
+def pages(archive, limit, **filters):
+    result, before = [], None
+    while True:
+        sessions, before = archive.query(before=before, limit=limit, **filters)
+        result.append(ids(sessions))
+        if before is None:
+            return result
+
+
+def test_filters_intersect_the_indexes(archive):
+    sessions, cursor = archive.query(user="AAAA0001", charger="CP2", limit=100)
+    # Even positions that are 1 modulo 3
+    assert ids(sessions) == [28, 22, 16, 10, 4] and cursor is None
+    assert ids(archive.query(user="BBBB0002", charger="CP1", month="2025-02")[0]) == [27, 21, 15]
+    assert archive.query(user="AAAA0001", charger="CP9") == ([], None)
+
+
+def test_before_cursor_pages_through_filtered_sessions(archive):
+    assert pages(archive, 2, user="AAAA0001", charger="CP2") == [[28, 22], [16, 10], [4]]
+    assert pages(archive, 4, charger="CP3", month="2025-01") == [[14, 11, 8, 5], [2]]
+    # Unfiltered pages cover every session once, newest first
+    assert sum(pages(archive, 7), []) == list(range(29, -1, -1))
+
+
+def test_cursor_stays_valid_while_sessions_are_appended(archive):
+    first, cursor = archive.query(user="AAAA0001", limit=5)
+    archive.append({"transaction_id": "30", "id_tag": "AAAA0001", "charger_id": "CP1",
+                    "start_time": "2025-02-11T08:00:00+00:00", "energy_kwh": 2.0})
+    second, _ = archive.query(user="AAAA0001", before=cursor, limit=5)
+    assert ids(first) == [28, 26, 24, 22, 20]
+    assert ids(second) == [18, 16, 14, 12, 10]
+    assert ids(archive.query(user="AAAA0001", limit=1)[0]) == [30]
+
+
+def test_totals_per_user_charger_and_month(archive):
+    assert archive.totals("user") == {"AAAA0001": {"sessions": 15, "energy_kwh": 22.5},
+                                      "BBBB0002": {"sessions": 15, "energy_kwh": 22.5}}
+    assert archive.totals("charger") == {charger: {"sessions": 10, "energy_kwh": 15.0} for charger in CHARGERS}
+    assert archive.totals("month") == {"2025-01": {"sessions": 15, "energy_kwh": 22.5},
+                                       "2025-02": {"sessions": 15, "energy_kwh": 22.5}}
+
+
+def test_partial_last_line_is_indexed_once_complete(tmp_path):
+    path = tmp_path / "sessions.json"
+    path.write_text('{"transaction_id": "1", "id_tag": "A", "energy_kwh": 1}\n{"transaction_id": "2", "id_')
+    archive = SessionArchive(path)
+    assert len(archive) == 1
+    with open(path, "a") as f:
+        f.write('tag": "A", "energy_kwh": 2}\n')
+    assert archive.totals("user") == {"A": {"sessions": 2, "energy_kwh": 3.0}}
@@ -0,0 +1,79 @@
+import json
+
+from shared_state import SharedJsonFile, SharedJsonMap
+
+
+def read(path):
+    return json.loads(path.read_text())
+
+
+def test_merge_keeps_keys_of_other_workers(tmp_path):
+    path = tmp_path / "active_transactions.json"
+    a, b = SharedJsonMap(path), SharedJsonMap(path)
+    local_a, local_b = a.load(), b.load()
+
+    local_a["1"] = {"charger_id": "A"}
+    a.merge(local_a)
+    local_b["2"] = {"charger_id": "B"}
+    merged = b.merge(local_b)
+
+    assert merged == {"1": {"charger_id": "A"}, "2": {"charger_id": "B"}}
+    assert read(path) == merged
+
+
+def test_merge_publishes_only_changed_keys(tmp_path):
+    path = tmp_path / "active_transactions.json"
+    a, b = SharedJsonMap(path), SharedJsonMap(path)
+    local_a = a.merge({"1": {"last_meter": 1.0}, "2": {"last_meter": 2.0}})
+    local_b = b.load()
+
+    local_b["2"] = dict(local_b["2"], last_meter=2.5)
+    b.merge(local_b)
+    local_a["1"] = dict(local_a["1"], last_meter=1.5)
+    a.merge(local_a)
+
+    assert a.merged_keys == ["1"]
+    assert read(path) == {"1": {"last_meter": 1.5}, "2": {"last_meter": 2.5}}
+
+
+def test_merge_removes_keys_deleted_locally(tmp_path):
+    path = tmp_path / "active_transactions.json"
+    a = SharedJsonMap(path)
+    local = a.merge({"1": {}, "2": {}})
+    del local["1"]
+    a.merge(local)
+    assert read(path) == {"2": {}}
+
+
+def test_insert_never_hands_out_the_same_id_twice(tmp_path):
+    path = tmp_path / "active_transactions.json"
+    a, b = SharedJsonMap(path), SharedJsonMap(path)
+    local_a, local_b = a.load(), b.load()
+
+    # Both workers start a session in the same second
+    id_a = a.insert(local_a, 1700000000, {"charger_id": "A"})
+    id_b = b.insert(local_b, 1700000000, {"charger_id": "B"})
+
+    assert id_a != id_b
+    assert read(path) == {str(id_a): {"charger_id": "A"}, str(id_b): {"charger_id": "B"}}
+    assert str(id_b) in b.data and str(id_a) in b.data
+
+
+def test_version_changes_on_every_write_and_external_change(tmp_path):
+    path = tmp_path / "energy_usage.json"
+    path.write_text("{}")
+    store, other = SharedJsonFile(path), SharedJsonFile(path)
+    store.load()
+
+    version = store.version
+    with store.locked() as data:
+        data["A"] = 1.0
+    assert store.version == version + 1
+    assert store.load() == {"A": 1.0}
+    assert store.version == version + 1  # our own write is not re-read
+
+    with other.locked() as data:
+        data["A"] = 0.0
+    version = store.version
+    assert store.load() == {"A": 0.0}
+    assert store.version == version + 1
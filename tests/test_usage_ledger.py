@@ -0,0 +1,44 @@
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+import usage_ledger
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    def set_time(dt, tz):
+        monkeypatch.setattr(usage_ledger, "BILLING_TZ", tz)
+        monkeypatch.setattr(usage_ledger, "_period_end", 0.0)
+        monkeypatch.setattr(usage_ledger.time, "time", lambda: dt.timestamp())
+    return set_time
+
+
+def test_period_rolls_over_at_midnight_of_the_billing_time_zone(clock):
+    istanbul = ZoneInfo("Europe/Istanbul")
+    # 1 March 01:30 in Istanbul is still February in UTC
+    clock(datetime(2025, 2, 28, 22, 30, tzinfo=timezone.utc), istanbul)
+    assert usage_ledger.current_period() == "2025-03"
+    clock(datetime(2025, 2, 28, 22, 30, tzinfo=timezone.utc), timezone.utc)
+    assert usage_ledger.current_period() == "2025-02"
+
+
+def test_period_is_cached_until_the_month_ends(clock, monkeypatch):
+    clock(datetime(2025, 12, 31, 23, 59, tzinfo=timezone.utc), timezone.utc)
+    assert usage_ledger.current_period() == "2025-12"
+    assert usage_ledger._period_end == datetime(2026, 1, 1, tzinfo=timezone.utc).timestamp()
+    monkeypatch.setattr(usage_ledger.time, "time", lambda: usage_ledger._period_end)
+    assert usage_ledger.current_period() == "2026-01"
+
+
+def test_migrate_legacy_and_totals(tmp_path):
+    reset_file = tmp_path / "last_reset.txt"
+    reset_file.write_text("2025-10\n")
+    ledger = usage_ledger.migrate_legacy({"A": 1.5, "B": None}, reset_file)
+    assert ledger == {"2025-10": {"A": 1.5, "B": 0.0}}
+    assert usage_ledger.is_legacy({"A": 1.5}) and not usage_ledger.is_legacy(ledger)
+    assert usage_ledger.period_totals({**ledger, "2025-11": {"A": 2.0}}) == [
+        {"period": "2025-11", "users": 1, "total_kwh": 2.0},
+        {"period": "2025-10", "users": 2, "total_kwh": 1.5},
+    ]
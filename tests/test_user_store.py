@@ -0,0 +1,84 @@
+import csv
+
+from user_store import UserStore
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="") as f:
+        f.write("id_tag,header name,surname,quota_kwh,unlimited\n")
+        for row in rows:
+            f.write(",".join(row) + "\n")
+
+
+def read_csv(path):
+    with open(path, newline="") as f:
+        return {row["id_tag"]: row for row in csv.DictReader(f)}
+
+
+def user(id_tag, quota="100"):
+    return {"id_tag": id_tag, "header name": "Ada", "surname": "Lovelace", "quota_kwh": quota, "unlimited": "FALSE"}
+
+
+def test_every_write_batch_lands_in_the_csv(tmp_path):
+    path = tmp_path / "users1.csv"
+    write_csv(path, [("A", "Ann", "One", "10", "FALSE")])
+    store = UserStore(path)
+    store.refresh()
+    store.create(user("B"))
+    store.update("A", {"quota_kwh": "20"})
+    assert store.upsert_many([user("C"), user("B", "50")]) == (1, 1)
+    store.delete("C")
+
+    on_disk = read_csv(path)
+    assert sorted(on_disk) == ["A", "B"]
+    assert on_disk["A"]["quota_kwh"] == "20" and on_disk["B"]["quota_kwh"] == "50"
+    assert store.journal_path.read_text() == ""
+
+
+def test_hand_edit_of_the_csv_is_picked_up(tmp_path):
+    path = tmp_path / "users1.csv"
+    write_csv(path, [("A", "Ann", "One", "10", "FALSE")])
+    store = UserStore(path)
+    store.refresh()
+    store.update("A", {"quota_kwh": "20"})
+
+    write_csv(path, [("A", "Ann", "One", "30", "FALSE"), ("D", "Dan", "Two", "5", "TRUE")])
+    assert store.refresh() == {"A", "D"}
+    assert store.get("A")["quota_kwh"] == "30"
+
+
+def test_deferred_compaction_replays_the_journal_in_other_processes(tmp_path):
+    path = tmp_path / "users1.csv"
+    write_csv(path, [("A", "Ann", "One", "10", "FALSE")])
+    writer, reader = UserStore(path, compact_every=3), UserStore(path, compact_every=3)
+    reader.refresh()
+
+    writer.create(user("B"))
+    writer.delete("A")
+    assert sorted(read_csv(path)) == ["A"]  # still only in the journal
+    assert reader.refresh() == {"A", "B"}
+    assert sorted(reader.users) == ["B"]
+
+    writer.create(user("C"))  # third change: compacted
+    assert sorted(read_csv(path)) == ["B", "C"]
+    assert writer.journal_path.read_text() == ""
+    assert reader.refresh() == {"C"}
+    assert sorted(reader.users) == ["B", "C"]
+
+
+def test_incomplete_journal_entry_of_a_crashed_writer_is_dropped(tmp_path):
+    path = tmp_path / "users1.csv"
+    write_csv(path, [("A", "Ann", "One", "10", "FALSE")])
+    store = UserStore(path, compact_every=100)
+    store.create(user("B"))
+    with open(store.journal_path, "a") as f:
+        f.write('{"op": "set", "row": {"id_tag": "X"')  # crashed mid-append
+
+    fresh = UserStore(path, compact_every=100)
+    fresh.refresh()
+    assert sorted(fresh.users) == ["A", "B"]
+    fresh.create(user("C"))
+
+    other = UserStore(path, compact_every=100)
+    other.refresh()
+    assert sorted(other.users) == ["A", "B", "C"]